@@ -0,0 +1,36 @@
+import os
+
+from flask import Flask
+from wordstree.graphics.bench import load_results, save_results, result_key, TREE_STAGES, ZOOM_STAGES
+
+
+def test_bench_render(app: Flask):
+    """Test if benchmark results cover every stage, and runs fail on regressions compared to a baseline"""
+    runner = app.test_cli_runner()
+    out = os.path.join(app.config['CACHE_DIR'], 'bench_results.json')
+
+    result = runner.invoke(args=['bench-render', '-d', '8-9', '-z', '0-1', '-o', out])
+    assert result.exception is None
+
+    results = load_results(out)
+    for depth in [8, 9]:
+        for stage in TREE_STAGES:
+            assert results['results'][result_key(depth, stage)] >= 0
+        for zoom in [0, 1]:
+            for stage in ZOOM_STAGES:
+                assert results['results'][result_key(depth, stage, zoom)] >= 0
+    assert not os.path.exists(os.path.join(app.config['CACHE_DIR'], 'bench'))
+
+    # baseline much slower than any run
+    baseline = os.path.join(app.config['CACHE_DIR'], 'baseline.json')
+    results['results'] = {key: 100.0 for key in results['results']}
+    save_results(results, baseline)
+    result = runner.invoke(args=['bench-render', '-d', '8', '-z', '0', '-b', baseline])
+    assert result.exit_code == 0
+
+    # baseline much faster than any run
+    results['results'][result_key(8, 'rasterize', 0)] = 0.0
+    save_results(results, baseline)
+    result = runner.invoke(args=['bench-render', '-d', '8', '-z', '0', '-b', baseline, '-t', '0.5',
+                                 '--min-seconds', '0'])
+    assert result.exit_code != 0
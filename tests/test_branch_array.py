@@ -0,0 +1,97 @@
+import math
+
+import pytest
+from flask import Flask
+
+from wordstree.graphics.arrays import BranchArray, branch_array
+from wordstree.graphics.generate import generate_tree
+from wordstree.graphics.index import BranchIndex
+from wordstree.graphics.loader import DBLoader, FileLoader
+
+
+def _assert_same_branches(branches, expected, num_branches):
+    for k in range(num_branches):
+        branch, other = branches[k], expected[k]
+        assert branch.index == other.index and branch.depth == other.depth and branch.text == other.text
+        assert (branch.pos.x, branch.pos.y, branch.length, branch.width, branch.angle) == \
+            (other.pos.x, other.pos.y, other.length, other.width, other.angle)
+
+
+def test_generate_branch_array():
+    """Test if a tree generated into a branch array is the same as one generated as a list of branches"""
+    branches, layers, num_branches = generate_tree(max_depth=9)
+    array, array_layers, array_num_branches = generate_tree(max_depth=9, array=True)
+
+    assert isinstance(array, BranchArray)
+    assert array_layers == layers
+    assert array_num_branches == len(array) == num_branches
+    _assert_same_branches(array, branches, num_branches)
+
+    # children are positioned at the end of their parent
+    assert array.parent[0] == -1
+    for k in range(1, num_branches):
+        parent = array[int(array.parent[k])]
+        assert parent.depth == array.depth[k] - 1
+        assert array.pos_x[k] == pytest.approx(parent.pos.x + math.cos(parent.angle) * parent.length)
+        assert array.pos_y[k] == pytest.approx(parent.pos.y + math.sin(parent.angle) * parent.length)
+
+
+def test_branch_array_geometry():
+    """Test if the corners and bounding boxes computed for a whole array match those of the branch rectangles"""
+    branches, layers, num_branches = generate_tree(max_depth=8)
+    array = branch_array(branches, num_branches)
+    _assert_same_branches(array, branches, num_branches)
+
+    corners, bounds = array.corners(), array.bounds()
+    assert corners.shape == (num_branches, 4, 2) and bounds.shape == (num_branches, 4)
+    for k in range(num_branches):
+        for corner, point in zip(corners[k], branches[k].rect.points):
+            assert tuple(corner) == pytest.approx((point.x, point.y))
+        assert tuple(bounds[k]) == pytest.approx(branches[k].rect.bounds)
+
+    # queries of an index over the array find the same branches
+    index, array_index = BranchIndex(branches, num_branches), BranchIndex(array)
+    assert array_index.num_branches == num_branches
+    for row in range(12):
+        for col in range(12):
+            expected = index.query_tile(row, col, 12, max_depth=5)
+            assert [branch.index for branch in array_index.query_tile(row, col, 12, max_depth=5)] == \
+                [branch.index for branch in expected]
+
+
+def test_branch_array_text_and_resize():
+    """Test if text is stored per row, and kept for the rows left after resizing"""
+    array = BranchArray(3, columns={'depth': [0, 1, 1], 'length': [0.4, 0.2, 0.2]})
+    array.set_text(2, 'leaf')
+    assert [branch.text for branch in array] == ['', '', 'leaf']
+    assert array.texts == {2: 'leaf'}
+
+    array.resize(5)
+    assert len(array) == 5 and list(array.index) == [0, 1, 2, 3, 4] and list(array.parent) == [-1] * 5
+    assert array[-1].length == 0 and array[2].text == 'leaf'
+
+    array.resize(2)
+    assert len(array) == 2 and array.texts == {}
+    assert [branch.depth for branch in array[0:2]] == [0, 1]
+    with pytest.raises(IndexError):
+        array.set_text(2, 'gone')
+
+
+def test_load_branch_array(app: Flask):
+    """Test if the database and file loaders load the same branches into an array as into a list"""
+    tree_id = app.config['TEST_TREE_ID']
+    loader, array_loader = DBLoader(app), DBLoader(app)
+    loader.load_branches(tree_id=tree_id)
+    array_loader.load_branches(tree_id=tree_id, array=True)
+
+    assert isinstance(array_loader.branches, BranchArray)
+    assert array_loader.layers == loader.layers and array_loader.num_branches == loader.num_branches
+    _assert_same_branches(array_loader.branches, loader.branches, loader.num_branches)
+
+    file_loader = FileLoader()
+    file_loader.save_branches(file='array_tree.json', branches=loader.branches, num_branches=loader.num_branches)
+    file_loader.load_branches(file='array_tree.json', array=True)
+    assert isinstance(file_loader.branches, BranchArray)
+    assert file_loader.layers == loader.layers
+    for branch, other in zip(file_loader.branches, loader.branches):
+        assert branch.index == other.index and branch.pos.x == other.pos.x and branch.angle == other.angle
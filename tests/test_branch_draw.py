@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+from wordstree.graphics.branch import Branch, draw_branches, _get_depth_color
+from wordstree.graphics.util import Vec
+
+
+class RecordingContext:
+    """Records the path and fill calls made by `draw_branches()`"""
+
+    def __init__(self):
+        self.polygons = []
+        self.fills = []
+        self.__source = None
+
+    def new_path(self):
+        pass
+
+    def move_to(self, x, y):
+        self.polygons.append([(x, y)])
+
+    def line_to(self, x, y):
+        self.polygons[-1].append((x, y))
+
+    def close_path(self):
+        pass
+
+    def set_source_rgba(self, r, g, b, a):
+        self.__source = (r, g, b, a)
+
+    def fill(self):
+        self.fills.append((self.__source, len(self.polygons)))
+
+
+def test_draw_branches_batches_by_depth():
+    branches = [
+        Branch(0, Vec(0.5, 1.0), depth=0, length=0.2, width=0.02),
+        Branch(1, Vec(0.5, 0.8), depth=1, length=0.1, width=0.01, angle=math.pi * 1.25),
+        Branch(2, Vec(0.5, 0.8), depth=1, length=0.1, width=0.01, angle=math.pi * 1.75),
+        Branch(3, Vec(0.4, 0.7), depth=2, length=0.05, width=0.005, angle=math.pi * 1.4),
+    ]
+    ctx = RecordingContext()
+
+    num_drawn = draw_branches(ctx, branches, {0: 1.0, 1: 0.5, 2: 0.0})
+    assert num_drawn == 3
+
+    # one fill per visible depth, with the color of the depth
+    assert len(ctx.fills) == 2
+    (color0, count0), (color1, count1) = ctx.fills
+    assert count0 == 1 and count1 == 3
+    assert color0 == pytest.approx(tuple(_get_depth_color(0)) + (1.0,))
+    assert color1 == pytest.approx(tuple(_get_depth_color(1)) + (0.5,))
+
+    # polygons are the rectangles of the branches
+    for polygon, branch in zip(ctx.polygons, branches):
+        for (x, y), point in zip(polygon, branch.rect.points):
+            assert x == pytest.approx(point.x) and y == pytest.approx(point.y)
+
+    assert draw_branches(ctx, branches, {}) == 0
+
+
+def test_branch_rect_is_lazy():
+    """Test if the rectangle of a branch is built on first access, kept, and placed around the branch"""
+    branch = Branch(3, Vec(0.5, 0.5), depth=2, length=0.1, width=0.02, angle=math.pi / 2)
+    assert not hasattr(branch, '__dict__')
+
+    rect = branch.rect
+    assert branch.rect is rect and rect.points is rect.points
+    assert rect.bounds == pytest.approx((0.49, 0.5, 0.51, 0.6))
+    assert branch.hit_test(0.5, 0.55) and not branch.hit_test(0.52, 0.55)
@@ -0,0 +1,82 @@
+import json
+import threading
+
+from flask import Flask
+
+from wordstree.graphics import render
+from wordstree.graphics.generate import generate_tree
+from wordstree.graphics.index import BranchIndex
+from wordstree.services import tile_service
+
+
+def test_index_hit():
+    """Test if a hit-test of the index finds the same branches as testing every branch"""
+    branches, layers, num_branches = generate_tree(max_depth=8)
+    index = BranchIndex(branches, num_branches)
+
+    for x, y in [(0.5, 0.8), (0.45, 0.6), (0.3, 0.4), (0.7, 0.35), (0.05, 0.05)]:
+        expected = [branch.index for branch in branches[:num_branches] if branch.hit_test(x, y)]
+        assert [branch.index for branch in index.hit(x, y)] == expected
+        assert all(branch.depth <= 3 for branch in index.hit(x, y, max_depth=3))
+
+
+def test_hit_api(app: Flask, client):
+    """Test if points are resolved to the topmost branch at them, alone and in batches"""
+    tree_id = app.config['TEST_TREE_ID']
+
+    response = client.get('/api/hit?tree-id={}&x=0.5&y=0.8'.format(tree_id))
+    assert response.status_code == 200
+    trunk = json.loads(response.data)
+    assert trunk['x'] == 0.5 and trunk['branch'] is not None
+    assert 'owner_id' in trunk['branch'] and 'text' in trunk['branch']
+
+    response = client.get('/api/hit?tree-id={}&x=0.5&y=0.8&zoom=0'.format(tree_id))
+    assert json.loads(response.data)['branch']['depth'] == 0
+
+    # no branch at the corner of the tree
+    response = client.get('/api/hit?tree-id={}&x=0.01&y=0.99'.format(tree_id))
+    assert json.loads(response.data)['branch'] is None
+
+    response = client.post('/api/hit', json={'tree-id': tree_id, 'points': [[0.01, 0.99], [0.5, 0.8]]})
+    assert response.status_code == 200
+    hits = json.loads(response.data)
+    assert [hit['branch'] is None for hit in hits] == [True, False]
+    assert hits[1]['branch']['index'] == trunk['branch']['index']
+
+    assert client.get('/api/hit?x=0.5&y=0.8').status_code == 500
+    assert client.get('/api/hit?tree-id={}&x=a&y=0.8'.format(tree_id)).status_code == 500
+    assert client.get('/api/hit?tree-id={}&x=0.5&y=0.8&zoom=20'.format(tree_id)).status_code == 404
+    assert client.get('/api/hit?tree-id=12345&x=0.5&y=0.8').status_code == 404
+
+
+def test_hit_while_rendering(app: Flask, client):
+    """Test if hit-tests are answered while a tile is being rendered"""
+    tree_id = app.config['TEST_TREE_ID']
+    response = []
+
+    def hit():
+        response.append(client.get('/api/hit?tree-id={}&x=0.5&y=0.8'.format(tree_id)))
+
+    # hold the lock tiles are rendered under
+    with tile_service.__lock:
+        thread = threading.Thread(target=hit)
+        thread.start()
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+    assert response[0].status_code == 200
+    assert json.loads(response[0].data)['branch'] is not None
+
+
+def test_index_built_with_tree(app: Flask, client, monkeypatch):
+    """Test if the spatial index of a tree is built when the tree is read, and not again by tiles or hit-tests"""
+    tree_id = app.config['TEST_TREE_ID']
+    app.config['LAZY_TILES'] = True
+    # reads the tree without looking up any branch
+    assert client.get('/api/tile-strings?tree-id={}&zoom=1'.format(tree_id)).status_code == 200
+
+    def build_index(*args, **kwargs):
+        raise Exception('index built again')
+
+    monkeypatch.setattr(render, 'BranchIndex', build_index)
+    assert client.get('/api/tile?tree-id={}&zoom=1&row=7&col=5'.format(tree_id)).status_code == 200
+    assert client.get('/api/hit?tree-id={}&x=0.5&y=0.8'.format(tree_id)).status_code == 200
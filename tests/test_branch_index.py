@@ -0,0 +1,44 @@
+import math
+import random
+
+from wordstree.graphics.arrays import branch_array
+from wordstree.graphics.generate import generate_tree
+from wordstree.graphics.index import BranchIndex
+from wordstree.graphics.util import Vec, Rect, rectangle_intersect, rectangles_intersect
+
+
+def test_index_matches_brute_force():
+    """Test if branches returned by the spatial index are the same as those found by checking every branch"""
+    branches, layers, num_branches = generate_tree(max_depth=9)
+    index = BranchIndex(branches, num_branches)
+
+    for grid in [4, 12, 21]:
+        dx = 1 / grid
+        for row in range(grid):
+            for col in range(grid):
+                rect = Rect(Vec(col * dx, row * dx), dx, dx)
+                expected = [branches[i] for i in range(num_branches)
+                            if branches[i].depth <= 5 and rectangle_intersect(rect, branches[i].rect)]
+
+                assert index.query_tile(row, col, grid, max_depth=5) == expected
+
+
+def test_rectangles_intersect_matches_pairwise():
+    """Test if the batch intersection test agrees with testing each pair of rectangles"""
+    random.seed(7)
+    branches, layers, num_branches = generate_tree(max_depth=9)
+    array = branch_array(branches, num_branches)
+
+    queries = [Rect(Vec(col / 12, row / 12), 1 / 12, 1 / 12) for row in range(12) for col in range(12)]
+    queries += [Rect(Vec(random.random(), random.random()), random.random() / 4, random.random() / 4,
+                     random.random() * 2 * math.pi) for i in range(20)]
+    for rect in queries:
+        mask = rectangles_intersect(rect, array.corners(), array.angle)
+        assert mask.tolist() == [rectangle_intersect(rect, branches[k].rect) for k in range(num_branches)]
+        assert (array.intersect(rect) == mask).all()
+
+    # a tile lying inside of a branch, neither rectangle has a corner inside of the other
+    trunk = branches[0]
+    tile = Rect(Vec(trunk.pos.x - 0.01, trunk.pos.y - 0.2), 0.02, 0.02)
+    assert rectangle_intersect(tile, trunk.rect)
+    assert rectangles_intersect(tile, array.corners()[:1], array.angle[:1]).tolist() == [True]
@@ -0,0 +1,145 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from wordstree.db import get_db
+from wordstree.graphics import generate, profile
+from wordstree.graphics.arrays import BranchArray
+from wordstree.graphics.generate import generate_tree, generate_branches, generate_layer, grow_layer, iter_layers, \
+    layer_rng, regenerate_layer, _layer_columns
+from wordstree.graphics.loader import DBLoader, FileLoader
+
+
+def test_grow_layer_matches_generate_branches():
+    """Test if a layer generated at once has the same branches as generating the children of each branch"""
+    branches, layers, num_branches = generate_tree(max_depth=6)
+    parents = branches[layers[-1]:num_branches]
+
+    children = grow_layer(**_layer_columns(parents), layer=6)
+    expected = [child for k, parent in enumerate(parents) for child in generate_branches(parent, 2 * k, 6)]
+    assert len(children['parent']) == len(expected) == 2 * len(parents)
+    assert children['parent'].tolist() == [k for k in range(len(parents)) for _ in range(2)]
+    for name in ['length', 'width', 'angle', 'depth']:
+        assert children[name].tolist() == pytest.approx([getattr(child, name) for child in expected])
+    assert children['pos_x'].tolist() == pytest.approx([child.pos.x for child in expected])
+    assert children['pos_y'].tolist() == pytest.approx([child.pos.y for child in expected])
+
+    new_branches, added = generate_layer(branches[:num_branches], 6, layers[-1], num_branches)
+    assert added == len(expected)
+    assert [branch.index for branch in new_branches] == list(range(num_branches, num_branches + added))
+
+
+def test_grow_layer_seeded():
+    """Test if the number of children past layer 10 is drawn from the given random number generator"""
+    columns = {name: np.full(1000, value) for name, value in
+               [('pos_x', 0.5), ('pos_y', 0.5), ('length', 0.01), ('width', 0.001), ('angle', 1.0)]}
+
+    first = grow_layer(**columns, layer=11, rng=np.random.default_rng(5))
+    second = grow_layer(**columns, layer=11, rng=np.random.default_rng(5))
+    assert first['parent'].tolist() == second['parent'].tolist()
+    assert (np.bincount(first['parent'], minlength=1000) <= 2).all()
+
+
+def test_generate_layers_into_storage(app: Flask):
+    """Test if a tree saved a layer at a time as it is generated is the same as a tree generated at once"""
+    branches, layers, num_branches = generate_tree(max_depth=9)
+    chunks = list(iter_layers(max_depth=9))
+    assert [len(chunk) for chunk in chunks] == [2 ** depth for depth in range(9)]
+    assert [int(chunk.index[0]) for chunk in chunks[:-1]] == layers
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['generate', '-d', '9', '-o', 'db', '--name', 'layered_tree'])
+    assert result.exit_code == 0
+    result = runner.invoke(args=['generate', '-d', '9', '-o', 'layered_tree.json'])
+    assert result.exit_code == 0
+
+    with app.app_context():
+        tree_id = get_db().execute('SELECT tree_id FROM tree WHERE tree_name=?', ['layered_tree']).fetchone()[0]
+    db_loader, file_loader = DBLoader(app), FileLoader()
+    db_loader.load_branches(tree_id=tree_id)
+    with app.app_context():
+        file_loader.load_branches(file='layered_tree.json')
+
+    for loader in [db_loader, file_loader]:
+        assert loader.num_branches == num_branches
+        for branch, other in zip(loader.branches, branches):
+            assert (branch.index, branch.depth, branch.pos.x, branch.pos.y, branch.angle) == \
+                (other.index, other.depth, other.pos.x, other.pos.y, other.angle)
+
+
+def test_generate_layers_not_timed_as_writes(app: Flask):
+    """Test if the time spent producing layers saved as they are generated is left out of the write timers"""
+    def slow_layers():
+        for layer in iter_layers(max_depth=4):
+            time.sleep(0.05)
+            yield layer
+
+    profiler = profile.start_profile()
+    try:
+        DBLoader(app).save_branches(branch_layers=slow_layers(), tree_name='slow_tree')
+        with app.app_context():
+            FileLoader().save_branches(file='slow_tree.json', branch_layers=slow_layers())
+    finally:
+        profile.stop_profile()
+
+    timers = profiler.report()['timers']
+    for name in ['db_write', 'file_write']:
+        assert timers[name]['calls'] >= 4
+        assert timers[name]['seconds'] < 0.2
+
+
+def test_seeded_generation(app: Flask):
+    """Test if trees and layers generated with the same seed are the same, and the seed is saved with the tree"""
+    assert layer_rng(3, 11).random() == layer_rng(3, 11).random() != layer_rng(3, 12).random()
+
+    first, layers, num_branches = generate_tree(max_depth=13, array=True, seed=42)
+    second, _, _ = generate_tree(max_depth=13, array=True, seed=42)
+    assert len(first) == len(second) and (first.parent == second.parent).all()
+
+    layer = regenerate_layer(42, 9)
+    assert layer.index.tolist() == list(range(511, 1023))
+    assert layer.angle.tolist() == first.angle[511:1023].tolist()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['render', '-d', '9', '-z', '0', '--no-cache-tiles', '--seed', '42', '-o', 'db',
+                                 '--name', 'seeded_tree'])
+    assert result.exit_code == 0
+    with app.app_context():
+        tree_id, seed = get_db().execute('SELECT tree_id, seed FROM tree WHERE tree_name=?', ['seeded_tree']).fetchone()
+    assert seed == 42
+
+    result = runner.invoke(args=['add-layer', '-f', 'db:{}'.format(tree_id)])
+    assert result.exit_code == 0
+    loader = DBLoader(app)
+    loader.load_branches(tree_id=tree_id)
+    assert loader.input_tree('seed') == 42 and loader.num_branches == 1023
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='requires fork start method')
+def test_parallel_generation(monkeypatch):
+    """Test if subtrees generated in worker processes are merged into the same tree as generated serially"""
+    num_children = generate._num_children
+
+    def random_children(layer, size, rng=None):
+        # let subtrees grow below the split depth
+        if layer > 4:
+            return rng.integers(0, 3, size)
+        return num_children(layer, size, rng)
+
+    monkeypatch.setattr(generate, '_num_children', random_children)
+    # workers only see the patched function if they are forked from this process
+    monkeypatch.setattr(generate, 'ProcessPoolExecutor',
+                        partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('fork')))
+    for split_depth in [0, 5]:
+        serial, layers, num_branches = generate_tree(max_depth=12, array=True, seed=8, split_depth=split_depth)
+        parallel, parallel_layers, parallel_num = generate_tree(max_depth=12, array=True, seed=8, workers=3,
+                                                                split_depth=split_depth)
+        assert parallel_layers == layers and parallel_num == num_branches
+        for name in BranchArray.COLUMNS:
+            assert getattr(parallel, name).tolist() == getattr(serial, name).tolist()
+        assert (parallel.depth[1:] == parallel.depth[parallel.parent[1:]] + 1).all()
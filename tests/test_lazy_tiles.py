@@ -0,0 +1,112 @@
+import os
+
+from flask import Flask
+from wordstree.db import get_db
+from wordstree.services.tile_service import evict
+
+
+def _count_tiles(tree_id, zoom_level):
+    cur = get_db().cursor()
+    cur.execute('SELECT COUNT(tile_id) FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=?', [tree_id, zoom_level])
+    return cur.fetchone()[0]
+
+
+def _tile_sizes(tree_id, zoom_level):
+    cur = get_db().cursor()
+    cur.execute('SELECT tile_row, tile_col, num_bytes FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=?', [tree_id, zoom_level])
+    return {(tile['tile_row'], tile['tile_col']): tile['num_bytes'] for tile in cur.fetchall()}
+
+
+def test_render_on_miss(app: Flask, client):
+    """Test if tiles that have not been rendered are rendered when requested with LAZY_TILES set"""
+    tree_id = app.config['TEST_TREE_ID']
+
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=2&col=3'.format(tree_id))
+    assert response.status_code == 404
+
+    app.config['LAZY_TILES'] = True
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=2&col=3'.format(tree_id))
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert _count_tiles(tree_id, 1) == 1
+
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=2&col=3&type=json'.format(tree_id))
+    assert response.status_code == 200
+    assert _count_tiles(tree_id, 1) == 1
+
+    # tile outside of the grid
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=200&col=3'.format(tree_id))
+    assert response.status_code == 404
+
+
+def test_evict_least_recently_used(app: Flask, client):
+    """Test if least recently requested tiles are evicted once tiles exceed the byte budget"""
+    tree_id = app.config['TEST_TREE_ID']
+    app.config['LAZY_TILES'] = True
+    app.config['TILE_CACHE_MIN_ZOOM'] = 1
+
+    # blank tile, then tiles with branches of different sizes
+    tile_url = '/api/tile?tree-id={}&zoom=1&row={}&col={}'
+    response = client.get(tile_url.format(tree_id, 0, 0))
+    assert response.status_code == 200
+    cur = get_db().cursor()
+    cur.execute('SELECT img_file, num_bytes FROM tiles')
+    first = cur.fetchone()
+    assert first['num_bytes'] > 0
+
+    # a new tile larger than the whole budget is kept, older tiles are evicted
+    app.config['TILE_CACHE_BYTES'] = first['num_bytes'] + 1
+    response = client.get(tile_url.format(tree_id, 7, 5))
+    assert response.status_code == 200
+    sizes = _tile_sizes(tree_id, 1)
+    assert list(sizes) == [(7, 5)] and sizes[(7, 5)] > app.config['TILE_CACHE_BYTES']
+    assert not os.path.exists(first['img_file'])
+    assert client.get(tile_url.format(tree_id, 7, 5)).status_code == 200
+
+    # budget with headroom for two of the tiles, but not three
+    app.config['TILE_CACHE_BYTES'] = sizes[(7, 5)] + sizes[(7, 5)] // 2
+    assert client.get(tile_url.format(tree_id, 8, 5)).status_code == 200
+    assert set(_tile_sizes(tree_id, 1)) == {(7, 5), (8, 5)}
+
+    assert client.get(tile_url.format(tree_id, 7, 6)).status_code == 200
+    sizes = _tile_sizes(tree_id, 1)
+    assert set(sizes) == {(8, 5), (7, 6)}
+    assert sum(sizes.values()) <= app.config['TILE_CACHE_BYTES']
+
+
+
+
+def test_evict_shared_files(app: Flask, client):
+    """Test if files shared by deduplicated tiles count towards the byte budget once"""
+    tree_id = app.config['TEST_TREE_ID']
+    app.config['LAZY_TILES'] = True
+    app.config['TILE_DEDUP'] = True
+    app.config['TILE_CACHE_MIN_ZOOM'] = 1
+
+    tile_url = '/api/tile?tree-id={}&zoom=1&row={}&col={}'
+    assert client.get(tile_url.format(tree_id, 7, 5)).status_code == 200
+
+    # another tile with the same contents, sharing the files of the first one
+    db = get_db()
+    db.execute('INSERT INTO tiles (tile_index, zoom_id, img_file, json_file, tile_col, tile_row, tile_pos_x, '
+               'tile_pos_y, num_bytes, content_hash, tree_version) SELECT 1, zoom_id, img_file, json_file, 1, 0, '
+               'tile_pos_x, tile_pos_y, num_bytes, content_hash, tree_version FROM tiles')
+    db.commit()
+
+    cur = db.cursor()
+    cur.execute('SELECT img_file, json_file, num_bytes FROM tiles')
+    first, second = cur.fetchall()
+    assert first['img_file'] == second['img_file']
+
+    # the shared files fit in the budget once
+    app.config['TILE_CACHE_BYTES'] = first['num_bytes']
+    assert evict() == 0
+    assert set(_tile_sizes(tree_id, 1)) == {(7, 5), (0, 1)}
+
+    # files are only removed along with the last tile referring to them
+    app.config['TILE_CACHE_BYTES'] = first['num_bytes'] - 1
+    assert evict() == 2
+    assert _count_tiles(tree_id, 1) == 0
+    assert not os.path.exists(first['img_file']) and not os.path.exists(first['json_file'])
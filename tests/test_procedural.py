@@ -0,0 +1,36 @@
+import pytest
+
+from wordstree.graphics.generate import generate_tree
+from wordstree.graphics.index import BranchIndex
+from wordstree.graphics.procedural import ProceduralTree, branch_geometry, branch_depth, layer_begin, MAX_DEPTH
+
+
+def test_branch_geometry_matches_generated_tree():
+    """Test if the geometry computed from the index of a branch is that of the generated branch"""
+    branches, layers, num_branches = generate_tree(max_depth=MAX_DEPTH + 1)
+    assert num_branches == layer_begin(MAX_DEPTH + 1)
+
+    for branch in branches[:num_branches]:
+        assert branch_depth(branch.index) == branch.depth
+        assert branch_geometry(branch.index) == \
+            (branch.pos.x, branch.pos.y, branch.length, branch.width, branch.angle, branch.depth)
+
+    with pytest.raises(IndexError):
+        branch_geometry(num_branches)
+
+
+def test_procedural_queries_match_index():
+    """Test if queries of the implicit tree find the same branches as the spatial index over the generated tree"""
+    branches, layers, num_branches = generate_tree(max_depth=MAX_DEPTH + 1)
+    index, tree = BranchIndex(branches, num_branches), ProceduralTree()
+    assert tree.num_branches == num_branches
+
+    for grid in [4, 21]:
+        for row in range(grid):
+            for col in range(grid):
+                for max_depth in [3, MAX_DEPTH]:
+                    assert [branch.index for branch in tree.query_tile(row, col, grid, max_depth=max_depth)] == \
+                        [branch.index for branch in index.query_tile(row, col, grid, max_depth=max_depth)]
+
+    for x, y in [(0.5, 0.8), (0.45, 0.6), (0.3, 0.4), (0.01, 0.99)]:
+        assert [branch.index for branch in tree.hit(x, y)] == [branch.index for branch in index.hit(x, y)]
@@ -1,8 +1,16 @@
 import os
 import json
+import threading
+import xml.etree.ElementTree as ET
 
 from flask import Flask
 from wordstree.db import get_db
+from wordstree.graphics import profile
+from wordstree.graphics.branch import Branch
+from wordstree.graphics.index import BranchIndex
+from wordstree.graphics.loader import Loader, FileLoader
+from wordstree.graphics.util import Vec
+from wordstree.graphics.render import Renderer, _strip_branches, _group_strips
 
 
 def test_save_full_tree(app: Flask):
@@ -125,3 +133,301 @@ def test_add_layer(app: Flask):
     cur.execute('SELECT * FROM branches INNER JOIN branches_ownership bo on branches.id = bo.branch_id '
                 'WHERE bo.owner_id=?', [dummy_id])
     assert num_branches == len(cur.fetchall())
+
+
+def _read_tiles(tree_id):
+    # contents of the image and JSON file of every tile of the tree, keyed by zoom level and tile index
+    cur = get_db().cursor()
+    cur.execute('SELECT zoom_level, grid, tile_index, img_file, json_file FROM tiles INNER JOIN zoom_info zi '
+                'ON tiles.zoom_id = zi.zoom_id WHERE tree_id=?', [tree_id])
+    contents = dict()
+    for tile in cur.fetchall():
+        assert os.path.isfile(tile['img_file'])
+        assert os.path.isfile(tile['json_file'])
+        with open(tile['img_file'], 'rb') as img, open(tile['json_file'], 'rb') as branches:
+            contents[(tile['zoom_level'], tile['tile_index'])] = (img.read(), branches.read())
+    return contents
+
+
+def test_cache_tiles_jobs(app: Flask):
+    """Test if tiles rendered by a pool of worker processes are all recorded in the tiles table, and are the same as
+    tiles rendered serially"""
+    runner = app.test_cli_runner()
+
+    tree_id = 1
+    result = runner.invoke(args=['render', '-d', '8', '-z', '0-1', '-j', '1', '-o', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+    serial = _read_tiles(tree_id)
+
+    result = runner.invoke(args=['render', '-z', '0-1', '-j', '2', '-f', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    db = get_db()
+    cur = db.cursor()
+    cur.execute('SELECT zoom_id, grid FROM zoom_info WHERE tree_id=?', [tree_id])
+    zooms = cur.fetchall()
+    assert len(zooms) == 2
+
+    for zoom in zooms:
+        cur.execute('SELECT COUNT(tile_id) FROM tiles WHERE zoom_id=?', [zoom['zoom_id']])
+        assert cur.fetchone()[0] == zoom['grid'] ** 2
+
+    parallel = _read_tiles(tree_id)
+    assert len(parallel) == sum(zoom['grid'] ** 2 for zoom in zooms)
+    assert parallel == serial
+
+
+def test_update_tiles(app: Flask):
+    """Test if only the tiles overlapped by changed branches are re-rendered, and their entries updated in place"""
+    runner = app.test_cli_runner()
+
+    tree_id = app.config['TEST_TREE_ID']
+    result = runner.invoke(args=['render', '-z', '0-1', '-f', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    db = get_db()
+    cur = db.cursor()
+    cur.execute('SELECT tile_id, img_file FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=?', [tree_id])
+    tiles = cur.fetchall()
+    for tile in tiles:
+        os.remove(tile['img_file'])
+
+    cur.execute('SELECT id FROM branches WHERE tree_id=? AND ind=?', [tree_id, 1])
+    branch_id = cur.fetchone()['id']
+    result = runner.invoke(args=['render', '-z', '0-1', '-f', 'db:{}'.format(tree_id), '--branches', str(branch_id)])
+    assert result.exception is None
+
+    cur.execute('SELECT tile_id, img_file FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=?', [tree_id])
+    updated = cur.fetchall()
+    assert sorted([tile['tile_id'] for tile in updated]) == sorted([tile['tile_id'] for tile in tiles])
+
+    # only some of the tiles should have been rendered again
+    rendered = [tile for tile in updated if os.path.isfile(tile['img_file'])]
+    assert 0 < len(rendered) < len(updated)
+
+
+class _ListLoader(Loader):
+    # loader holding a given list of branches
+    def __init__(self, branches):
+        self.__branches = branches
+
+    def _branches(self):
+        return self.__branches
+
+    def _num_branches(self):
+        return len(self.__branches)
+
+    def _layers(self):
+        return [0]
+
+
+def test_dirty_tiles_touching_edge():
+    """Test if tiles only touched by a changed branch are re-rendered, since the branch is listed in them"""
+    ren = Renderer()
+    grid = ren.grid_levels[0]
+    # bounding box from the left edge of the second column to the right edge of the third column of the grid
+    branch = Branch(0, Vec(1 / grid, 0.6), depth=0, length=1 / grid, width=0.02, angle=0)
+    min_x, min_y, max_x, max_y = branch.rect.bounds
+    assert min_x * grid == 1 and max_x * grid == 2
+
+    loader = _ListLoader([branch])
+    listed = [(row, col) for row in range(grid) for col in range(grid) if ren.tile_branches(loader, 0, row, col)]
+    assert (2, 0) in listed and (2, 2) in listed
+    assert ren.get_dirty_tiles(loader, [0], 0) == listed
+
+
+def test_full_tree_svg_layers(app: Flask):
+    """Test if the SVG of the full tree is well-formed and has a group of paths for every layer drawn"""
+    loader = FileLoader()
+    loader.load_branches(max_depth=8, tree_name='svg_tree')
+
+    ren = Renderer()
+    ren.render_tree(loader, zoom=0)
+    ren.save_full_tree(zoom=0, saver=loader)
+
+    svg_path = os.path.join(app.config['CACHE_DIR'], 'svg_tree/images/svg/tree_z0.svg')
+    root = ET.parse(svg_path).getroot()
+    groups = [g for g in root if g.get('id', '').startswith('layer-')]
+
+    drawn = [depth for depth in range(len(loader.layers)) if ren.get_opacity(0, depth) > 0]
+    assert [g.get('id') for g in groups] == ['layer-{}'.format(depth) for depth in drawn]
+    assert sum(len(g) for g in groups) == sum(
+        (loader.layers[d + 1] if d + 1 < len(loader.layers) else loader.num_branches) - loader.layers[d] for d in drawn
+    )
+
+
+def test_render_profile(app: Flask):
+    """Test if the report of the stages of rendering is saved, including timers of tiles rendered in workers"""
+    runner = app.test_cli_runner()
+
+    for jobs in ['1', '2']:
+        report_path = os.path.join(app.config['CACHE_DIR'], 'profile_j{}.json'.format(jobs))
+        result = runner.invoke(args=[
+            'render', '-d', '8', '-z', '0-1', '-j', jobs, '-o', 'db:{}'.format(10 + int(jobs)),
+            '--profile', 'profile_j{}.json'.format(jobs)
+        ])
+        assert result.exception is None
+        assert os.path.isfile(report_path)
+
+        with open(report_path) as f:
+            report = json.load(f)
+
+        for name in ['generate', 'index', 'assign', 'rasterize', 'png_encode', 'file_write', 'db_write']:
+            assert report['timers'][name]['calls'] > 0
+        grids = Renderer().grid_levels
+        assert report['counters']['tiles'] == grids[0] ** 2 + grids[1] ** 2
+        assert report['counters']['bytes_written'] > 0
+        assert report['counters']['branches_drawn'] > 0
+
+        for zoom in [0, 1]:
+            zoom_report = report['zooms'][str(zoom)]
+            assert zoom_report['counters']['tiles'] == grids[zoom] ** 2
+            assert zoom_report['timers']['png_encode']['calls'] == grids[zoom] ** 2
+
+
+def test_profile_per_thread():
+    """Test if stages recorded by other threads, e.g. tiles rendered on request, are left out of a profiled render"""
+    profiler = profile.start_profile()
+    try:
+        thread = threading.Thread(target=lambda: profile.count('tiles'))
+        thread.start()
+        thread.join()
+        profile.count('tiles', 2)
+    finally:
+        assert profile.stop_profile() is profiler
+    assert profiler.report()['counters'] == {'tiles': 2}
+    assert profile.get_profile() is None
+
+
+def test_tile_order(app: Flask, client):
+    """Test if requested tiles are rendered first, followed by the tiles closest to the trunk"""
+    ren = Renderer()
+    grid = ren.grid_levels[1]
+    order = ren.tile_order(1, [(2, 3), (200, 0), (2, 3)])
+    assert len(order) == grid * grid and len(set(order)) == grid * grid
+    assert order[0] == (3, 2)
+    # bottom center of the grid, where the trunk is
+    assert order[1] in [(grid // 2 - 1, grid - 1), (grid // 2, grid - 1)]
+
+    runner = app.test_cli_runner()
+    tree_id = app.config['TEST_TREE_ID']
+    result = runner.invoke(args=['render', '-z', '1', '-f', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=0&col=0'.format(tree_id))
+    assert response.status_code == 200
+
+    # tiles are saved as they are rendered, so the requested tile is saved first
+    result = runner.invoke(args=['render', '-z', '1', '-f', 'db:{}'.format(tree_id), '-j', '2'])
+    assert result.exception is None
+    cur = get_db().cursor()
+    cur.execute('SELECT tile_row, tile_col FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=1 ORDER BY tile_id ASC', [tree_id])
+    tiles = [(tile['tile_row'], tile['tile_col']) for tile in cur.fetchall()]
+    assert len(tiles) == grid * grid
+    assert tiles[0] == (0, 0)
+    assert tiles[1] == (order[1][1], order[1][0])
+
+    # rendering in this process does not render the rest of the row of the requested tile before the other tiles
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=0&col=0'.format(tree_id))
+    assert response.status_code == 200
+    result = runner.invoke(args=['render', '-z', '1', '-f', 'db:{}'.format(tree_id), '-j', '1'])
+    assert result.exception is None
+    cur.execute('SELECT tile_row, tile_col FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=1 ORDER BY tile_id ASC', [tree_id])
+    tiles = [(tile['tile_row'], tile['tile_col']) for tile in cur.fetchall()]
+    assert len(tiles) == grid * grid
+    assert tiles[0] == (0, 0)
+    assert tiles[1] == (order[1][1], order[1][0])
+
+
+def test_resume_render(app: Flask):
+    """Test if resuming a render keeps the tiles already rendered from the same version of the tree"""
+    runner = app.test_cli_runner()
+
+    tree_id = app.config['TEST_TREE_ID']
+    result = runner.invoke(args=['render', '-z', '0', '-f', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    db = get_db()
+    cur = db.cursor()
+    query = 'SELECT tile_id, tile_index, img_file, tree_version FROM tiles INNER JOIN zoom_info zi ' \
+            'ON tiles.zoom_id = zi.zoom_id WHERE tree_id=? AND zoom_level=0 ORDER BY tile_index'
+    cur.execute(query, [tree_id])
+    tiles = cur.fetchall()
+    assert len(tiles) == 16 and tiles[0]['tree_version'] is not None
+
+    # simulate an interrupted render: the last tiles were never saved, and one tile is from an older tree
+    cur.execute('DELETE FROM tiles WHERE tile_id IN (?, ?, ?)', [tile['tile_id'] for tile in tiles[-3:]])
+    cur.execute('UPDATE tiles SET tree_version=? WHERE tile_id=?', ['stale', tiles[0]['tile_id']])
+    db.commit()
+    kept = tiles[1:-3]
+    for tile in tiles[:-3]:
+        with open(tile['img_file'], 'wb') as f:
+            f.write(b'kept')
+
+    result = runner.invoke(args=['render', '-z', '0', '-f', 'db:{}'.format(tree_id), '--resume'])
+    assert result.exception is None
+
+    cur.execute(query, [tree_id])
+    resumed = cur.fetchall()
+    assert [tile['tile_index'] for tile in resumed] == [tile['tile_index'] for tile in tiles]
+    assert all(tile['tree_version'] == tiles[1]['tree_version'] for tile in resumed)
+    assert [tile['tile_id'] for tile in resumed[:-3]] == [tile['tile_id'] for tile in tiles[:-3]]
+
+    # only the missing and stale tiles are rendered again
+    for tile in kept:
+        with open(tile['img_file'], 'rb') as f:
+            assert f.read() == b'kept'
+    with open(resumed[0]['img_file'], 'rb') as f:
+        assert f.read() != b'kept'
+
+    cur.execute('SELECT rc.* FROM render_checkpoints rc INNER JOIN zoom_info zi ON rc.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=0', [tree_id])
+    checkpoint = cur.fetchone()
+    assert checkpoint['finished'] == 1 and checkpoint['tiles_done'] == checkpoint['num_tiles'] == 16
+
+
+def test_strip_branches(app: Flask):
+    """Test if the branches looked up for a row of tiles are the branches found for each tile of the row"""
+    loader = FileLoader()
+    loader.load_branches(max_depth=8, tree_name='strip_tree')
+    index = BranchIndex(loader.branches, loader.num_branches)
+
+    ren = Renderer()
+    for grid in ren.grid_levels:
+        for row in range(grid):
+            strip = _strip_branches(index, grid, row)
+            assert len(strip) == grid
+            for col in range(grid):
+                expected = index.query_tile(row, col, grid, exact=False)
+                assert [branch.index for branch in strip[col]] == [branch.index for branch in expected]
+
+    order = ren.tile_order(1, [(2, 3)])
+    strips = _group_strips(order)
+    assert strips[0][0] == 2 and strips[0][1][0] == 3
+    assert sorted((i, j) for j, columns in strips for i in columns) == sorted(order)
+
+
+def test_resume_after_archive(app: Flask, client):
+    """Test if tiles packed into an archive are rendered again when resuming without one"""
+    runner = app.test_cli_runner()
+
+    tree_id = app.config['TEST_TREE_ID']
+    result = runner.invoke(args=['render', '-z', '0', '-f', 'db:{}'.format(tree_id), '--archive'])
+    assert result.exception is None
+
+    result = runner.invoke(args=['render', '-z', '0', '-f', 'db:{}'.format(tree_id), '--resume'])
+    assert result.exception is None
+
+    cur = get_db().cursor()
+    cur.execute('SELECT img_file, archive_file FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                'WHERE tree_id=? AND zoom_level=0', [tree_id])
+    tiles = cur.fetchall()
+    assert len(tiles) == 16
+    assert all(tile['archive_file'] is None and tile['img_file'].endswith('.png') for tile in tiles)
+
+    response = client.get('/api/tile?tree-id={}&zoom=0&row=1&col=1'.format(tree_id))
+    assert response.status_code == 200 and response.data.startswith(b'\x89PNG')
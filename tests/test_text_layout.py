@@ -0,0 +1,33 @@
+import cairo
+
+from wordstree.graphics.text import layout_text, MAX_TEXT_RATIO, FONT_SIZE_RATIO
+
+
+def _context():
+    ctx = cairo.Context(cairo.ImageSurface(cairo.Format.RGB24, 16, 16))
+    ctx.select_font_face('Impact', cairo.FontSlant.NORMAL, cairo.FontWeight.BOLD)
+    return ctx
+
+
+def test_layout_fits_branch():
+    ctx = _context()
+    length, width = 0.005, 0.0005
+
+    long_msg = ' '.join('SHRINKING')
+    layout = layout_text(ctx, long_msg, length, width)
+    assert layout.num_fillers == 0
+    assert layout.font_size < width * FONT_SIZE_RATIO
+    ctx.set_font_size(layout.font_size)
+    assert ctx.text_extents(long_msg).width <= MAX_TEXT_RATIO * length
+
+    # shrinking by a small step more than needed leaves text that is too wide
+    ctx.set_font_size(layout.font_size * 1.01)
+    assert ctx.text_extents(long_msg).width > MAX_TEXT_RATIO * length
+
+    short = layout_text(ctx, 'A', length, width)
+    assert short.font_size == width * FONT_SIZE_RATIO
+    assert short.num_fillers > 0
+    assert short.text.strip().startswith('—')
+
+    # same message on a branch of the same dimensions reuses the layout
+    assert layout_text(_context(), long_msg, length, width) is layout
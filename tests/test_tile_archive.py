@@ -0,0 +1,78 @@
+import os
+
+from flask import Flask
+from wordstree.db import get_db
+from wordstree.graphics.loader import DBLoader
+from wordstree.graphics.render import Renderer
+
+
+def _tiles(tree_id):
+    cur = get_db().cursor()
+    cur.execute('SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE tree_id=? '
+                'ORDER BY tiles.tile_id', [tree_id])
+    return cur.fetchall()
+
+
+def test_render_into_archive(app: Flask, client):
+    """Test if tiles rendered into an archive are served the same as tiles saved as separate files"""
+    runner = app.test_cli_runner()
+    tree_id = app.config['TEST_TREE_ID']
+
+    result = runner.invoke(args=['render', '-z', '0-1', '-f', 'db:{}'.format(tree_id), '-j', '2'])
+    assert result.exception is None
+    expected = dict()
+    for tile in _tiles(tree_id):
+        for key in ['img_file', 'json_file']:
+            with open(tile[key], mode='rb') as f:
+                expected[(tile['zoom_level'], tile['tile_row'], tile['tile_col'], key)] = f.read()
+            os.remove(tile[key])
+
+    result = runner.invoke(args=['render', '-z', '0-1', '-f', 'db:{}'.format(tree_id), '--archive', '-j', '2'])
+    assert result.exception is None
+
+    tiles = _tiles(tree_id)
+    assert len(tiles) == len(expected) // 2
+    for tile in tiles:
+        assert tile['img_file'] == tile['archive_file']
+        for key, res_type in [('img_file', 'img'), ('json_file', 'json')]:
+            response = client.get('/api/tile?tree-id={}&zoom={}&row={}&col={}&type={}'.format(
+                tree_id, tile['zoom_level'], tile['tile_row'], tile['tile_col'], res_type
+            ))
+            assert response.status_code == 200
+            assert response.data == expected[(tile['zoom_level'], tile['tile_row'], tile['tile_col'], key)]
+
+    # re-rendered tiles are merged back into the archive
+    cur = get_db().cursor()
+    cur.execute('SELECT id FROM branches WHERE tree_id=? AND ind=?', [tree_id, 1])
+    branch_id = cur.fetchone()['id']
+    result = runner.invoke(args=['render', '-z', '0-1', '-f', 'db:{}'.format(tree_id), '--archive',
+                                 '--branches', str(branch_id)])
+    assert result.exception is None
+
+    for tile in _tiles(tree_id):
+        assert tile['img_file'] == tile['archive_file']
+    for root, dirs, files in os.walk(app.config['CACHE_DIR']):
+        assert not [f for f in files if f.endswith('.png') or f.endswith('.json')]
+
+
+class _ArchiveCheckingLoader(DBLoader):
+    # loader checking that the archive tiles refer to is in place whenever tile information is saved
+    def save_tile_info(self, **kwargs):
+        archive_file = kwargs['img_path']
+        assert os.path.isfile(archive_file) and not os.path.isfile(archive_file + '.tmp')
+        super().save_tile_info(**kwargs)
+
+
+def test_archive_saved_before_tiles(app: Flask):
+    """Test if tile information referring to an archive is only saved once the archive has been written"""
+    tree_id = app.config['TEST_TREE_ID']
+    loader = _ArchiveCheckingLoader(app)
+    loader.load_branches(tree_id=tree_id)
+
+    ren = Renderer()
+    ren.render_tree(loader, zoom=0)
+    ren.cache_tiles(zoom=0, saver=loader, saver_args={'tree_id': tree_id}, archive=True)
+
+    tiles = _tiles(tree_id)
+    assert len(tiles) == 16
+    assert all(tile['img_file'] == tile['archive_file'] for tile in tiles)
@@ -0,0 +1,56 @@
+import json
+import os
+
+from flask import Flask
+from wordstree.db import get_db
+from wordstree.graphics.render import EMPTY_TILE, empty_tile
+
+
+def _tiles(tree_id):
+    cur = get_db().cursor()
+    cur.execute('SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE tree_id=?', [tree_id])
+    return cur.fetchall()
+
+
+def test_dedup_tiles(app: Flask, client):
+    """Test if tiles with the same contents share files, and empty tiles are served from memory"""
+    runner = app.test_cli_runner()
+
+    tree_id = 1
+    result = runner.invoke(args=['render', '-d', '8', '-z', '2', '--dedup', '-j', '2', '-o', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    tiles = _tiles(tree_id)
+    assert len(tiles) == tiles[0]['grid'] ** 2
+    empty = [tile for tile in tiles if tile['img_file'] == EMPTY_TILE]
+    saved = [tile for tile in tiles if tile['img_file'] != EMPTY_TILE]
+    assert len(empty) > 0 and len(saved) > 0
+    assert all(tile['num_bytes'] == 0 and tile['json_file'] == EMPTY_TILE for tile in empty)
+
+    # files are named after the contents of the tiles, and written once
+    assert len({tile['img_file'] for tile in saved}) == len({tile['content_hash'] for tile in saved})
+    files = os.listdir(os.path.dirname(saved[0]['img_file']))
+    assert len(files) == len({tile['content_hash'] for tile in saved})
+    for tile in saved:
+        assert os.path.isfile(tile['img_file']) and os.path.isfile(tile['json_file'])
+
+    tile = empty[0]
+    url = '/api/tile?tree-id={}&zoom=2&row={}&col={}'.format(tree_id, tile['tile_row'], tile['tile_col'])
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == empty_tile((tile['image_width'], tile['image_height']))[0]
+    assert json.loads(client.get(url + '&type=json').data) == []
+
+    # the hash of the tile is its ETag
+    etag = response.headers['ETag']
+    assert tile['content_hash'] in etag
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    tile = saved[0]
+    response = client.get('/api/tile?tree-id={}&zoom=2&row={}&col={}&type=json'.format(
+        tree_id, tile['tile_row'], tile['tile_col']
+    ))
+    assert response.status_code == 200
+    with open(tile['json_file'], mode='rb') as f:
+        assert response.data == f.read()
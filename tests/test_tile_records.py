@@ -0,0 +1,89 @@
+import json
+import math
+
+import pytest
+from flask import Flask
+from wordstree.db import get_db
+from wordstree.graphics.records import read_branches, read_strings, strings_version
+from wordstree.services import tile_service
+
+
+def test_binary_records_match_json(app: Flask, client):
+    """Test if binary branch records of tiles list the same branches as the JSON files of the tiles"""
+    runner = app.test_cli_runner()
+    tree_id = app.config['TEST_TREE_ID']
+    result = runner.invoke(args=['render', '-z', '1', '-f', 'db:{}'.format(tree_id)])
+    assert result.exception is None
+
+    response = client.get('/api/tile-strings?tree-id={}&zoom=1'.format(tree_id))
+    assert response.status_code == 200
+    strings = read_strings(response.data)
+    assert strings[0] == ''
+
+    cur = get_db().cursor()
+    cur.execute('SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE tree_id=? AND '
+                'zoom_level=1', [tree_id])
+    tiles = cur.fetchall()
+    assert len(tiles) > 0
+
+    num_branches = 0
+    for tile in tiles:
+        response = client.get('/api/tile?zoom-id={}&row={}&col={}&type=bin'.format(
+            tile['zoom_id'], tile['tile_row'], tile['tile_col']
+        ))
+        assert response.status_code == 200
+        branches = read_branches(response.data, strings)
+
+        with open(tile['json_file']) as f:
+            expected = json.load(f)
+        assert [b.index for b in branches] == [b['index'] for b in expected]
+        for branch, dic in zip(branches, expected):
+            assert branch.depth == dic['depth']
+            assert math.isclose(branch.pos.x, dic['pos']['x'], rel_tol=1e-6, abs_tol=1e-7)
+            assert math.isclose(branch.angle, dic['angle'], rel_tol=1e-6)
+        num_branches += len(branches)
+    assert num_branches > 0
+
+    response = client.get('/api/tile?tree-id={}&zoom=1&row=200&col=0&type=bin'.format(tree_id))
+    assert response.status_code == 404
+
+
+def test_string_table_version(app: Flask, client):
+    """Test if records referring to a string table built before the texts of the tree changed are detected"""
+    tree_id = app.config['TEST_TREE_ID']
+    tile_url = '/api/tile?tree-id={}&zoom=0&row=3&col=1&type=bin'.format(tree_id)
+    strings_url = '/api/tile-strings?tree-id={}&zoom=0'.format(tree_id)
+
+    response = client.get(strings_url)
+    assert response.status_code == 200
+    strings, version = read_strings(response.data), strings_version(response.data)
+    assert response.get_etag()[0] == '{:016x}'.format(version)
+    assert client.get(strings_url, headers={'If-None-Match': response.get_etag()[0]}).status_code == 304
+
+    response = client.get(tile_url + '&strings-version={:016x}'.format(version))
+    assert response.status_code == 200
+    assert strings_version(response.data) == version
+    assert len(read_branches(response.data, strings, version=version)) > 0
+    records_etag = response.get_etag()[0]
+
+    # a purchase changes the text of the trunk, which is drawn at every zoom level
+    db = get_db()
+    branch_id = db.execute('SELECT id FROM branches WHERE tree_id=? AND ind=0', [tree_id]).fetchone()['id']
+    if db.execute('UPDATE branches_ownership SET text=? WHERE branch_id=?', ['new text', branch_id]).rowcount == 0:
+        db.execute('INSERT INTO branches_ownership (branch_id, owner_id, text, price, available_for_purchase, '
+                   'available_for_bid) VALUES (?,?,?,?,?,?)', [branch_id, None, 'new text', 0, 0, 0])
+    db.commit()
+    tile_service.invalidate(tree_id)
+
+    response = client.get(tile_url + '&strings-version={:016x}'.format(version))
+    assert response.status_code == 409
+    response = client.get(tile_url)
+    assert response.status_code == 200 and response.get_etag()[0] != records_etag
+    new_version = strings_version(response.data)
+    assert new_version != version
+    with pytest.raises(Exception):
+        read_branches(response.data, strings, version=version)
+
+    response = client.get(strings_url)
+    assert strings_version(response.data) == new_version
+    assert 'new text' in read_strings(response.data)
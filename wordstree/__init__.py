@@ -17,7 +17,18 @@ def create_app(test_config=None):
         CACHE_DIR=os.path.join(app.root_path, 'cache'),
         IMAGE_DIR=os.path.join(app.root_path, 'cache/images'),
         TREE_ID=5,
-        DEFAULT_ZOOM=0
+        DEFAULT_ZOOM=0,
+        # render tiles missing from the cache when they are requested
+        LAZY_TILES=False,
+        # byte budget of tiles at zoom levels >= TILE_CACHE_MIN_ZOOM; least recently requested ones are evicted first
+        TILE_CACHE_BYTES=512 * 1024 * 1024,
+        TILE_CACHE_MIN_ZOOM=2,
+        # write the tiles of each zoom level into a single archive file instead of one file per tile
+        TILE_ARCHIVE=False,
+        # share the files of tiles with the same contents, and serve tiles without branches from memory
+        TILE_DEDUP=False,
+        # keep tiles already rendered from the same version of a tree, e.g. by a render that was interrupted
+        RENDER_RESUME=True
     )
     app.config.from_envvar('FLASKR_SETTINGS', silent=True)
     if test_config:
@@ -1,9 +1,14 @@
+import hashlib
 import json
+import os
 
 from flask import Blueprint, Flask, request, g, redirect, url_for, render_template, flash, current_app, session, Response, abort
 
 from wordstree.db import get_db
-from wordstree.services import render_service
+from wordstree.graphics.archive import open_archive
+from wordstree.graphics.records import strings_version
+from wordstree.graphics.render import EMPTY_TILE, empty_tile
+from wordstree.services import render_service, tile_service
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -187,6 +192,21 @@ def query_zoom():
 
 @bp.route('/tile', methods=['GET'])
 def query_tile():
+    """
+    Returns the image (`type=img`), JSON file (`type=json`) or binary branch records (`type=bin`, see
+    :func:`tile_service.tile_records`) of the tile at `row` and `col` of zoom level `zoom` of tree `tree-id`, or of zoom
+    level with id `zoom-id`. If `LAZY_TILES` is set in the application configuration, tiles
+    that have not been rendered are rendered on request, see :func:`tile_service.render_tile`. Tiles packed into the
+    archive of their zoom level are served from a memory-mapping of the archive, see :func:`open_archive`. Empty tiles
+    of deduplicated zoom levels are served from memory, see :func:`empty_tile`. Responses carry the hash of the contents
+    of the tile as their ETag, if it is known, and requests with a matching `If-None-Match` header are answered with
+    `304 Not Modified`. Requested tiles are recorded, see :func:`tile_service.record_request`, so that they are rendered
+    first when their zoom level is rendered again.
+
+    Binary branch records refer to texts by their ids in the string table of the zoom level, and carry the version of
+    that table, see `/api/tile-strings`. If `strings-version` is given, records referring to a different version of the
+    table are answered with `409 Conflict`, so that the client reads the string table again.
+    """
     zoom_level = request.args.get('zoom', default=0)
     row = request.args.get('row', default=0)
     col = request.args.get('col', default=0)
@@ -196,7 +216,7 @@ def query_tile():
 
     if not tree_id and not zoom_id:
         return Response('zoom-id or tree-id and zoom must be provided', status=500)
-    if res_type not in ['img', 'json']:
+    if res_type not in ['img', 'json', 'bin']:
         return Response('\'{}\' type unknown'.format(res_type), status=500)
 
     try:
@@ -204,32 +224,84 @@ def query_tile():
         col = int(col)
 
         cur = get_db().cursor()
+        if res_type == 'bin':
+            if zoom_id:
+                tree_id, zoom_level = _get_zoom_level(zoom_id)
+                if tree_id is None:
+                    return Response('tile not found', status=404)
+            data = tile_service.tile_records(tree_id, zoom_level, row, col)
+            if data is None:
+                return Response('tile not found', status=404)
+            version = '{:016x}'.format(strings_version(data))
+            if request.args.get('strings-version', version) != version:
+                return Response('string table changed, current version is {}'.format(version), status=409)
+
+            response = Response(response=data, mimetype='application/octet-stream',
+                                content_type='application/octet-stream')
+            # the header of the records holds the version of the string table, so the hash changes along with it
+            response.set_etag('{}-{}'.format(hashlib.sha1(data).hexdigest(), res_type))
+            return response.make_conditional(request)
+
         if zoom_id:
-            cur.execute('SELECT * FROM tiles WHERE zoom_id=? AND tile_row=? AND tile_col=?', [zoom_id, row, col])
+            cur.execute(
+                'SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE '
+                'tiles.zoom_id=? AND tile_row=? AND tile_col=?', [zoom_id, row, col]
+            )
         else:
             cur.execute(
                 'SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE '
                 'zoom_level=? AND tree_id=? AND tile_row=? AND tile_col=?', [zoom_level, tree_id, row, col]
             )
-        row = cur.fetchone()
-        if row is None:
-            return Response('tile not found', status=404)
+        tile = cur.fetchone()
 
-        if res_type == 'img':
-            with open(row['img_file'], mode='rb') as f:
+        if current_app.config.get('LAZY_TILES', False):
+            if tile is None or not _tile_saved(tile):
+                if zoom_id:
+                    tree_id, zoom_level = _get_zoom_level(zoom_id)
+                    if tree_id is None:
+                        return Response('tile not found', status=404)
+                tile = tile_service.render_tile(tree_id, zoom_level, row, col)
+
+        if tile is None:
+            return Response('tile not found', status=404)
+        tile_service.record_request(tile)
+
+        if tile['img_file'] == EMPTY_TILE:
+            img_data, json_data, _ = empty_tile((tile['image_width'], tile['image_height']))
+            if res_type == 'img':
+                response = Response(response=img_data, mimetype='image/png', content_type='image/png')
+            else:
+                response = Response(response=json_data, mimetype='application/json', content_type='application/json')
+        elif tile['archive_file'] and tile['img_file'] == tile['archive_file']:
+            archive = open_archive(tile['archive_file'])
+            if res_type == 'img':
+                data, mimetype = archive.img(tile['tile_index']), 'image/png'
+            else:
+                data, mimetype = archive.json(tile['tile_index']), 'application/json'
+            if len(data) == 0:
+                return Response('tile data not found', status=404)
+
+            # slice of the archive is sent as is, without copying it
+            response = Response(response=[data], mimetype=mimetype, content_type=mimetype)
+            response.content_length = len(data)
+        elif res_type == 'img':
+            with open(tile['img_file'], mode='rb') as f:
                 response = Response(
                     response=f.read(),
                     mimetype='image/png',
                     content_type='image/png'
                 )
         else:
-            with open(row['json_file'], mode='r') as f:
+            with open(tile['json_file'], mode='r') as f:
                 response = Response(
                     response=f.read(),
                     mimetype='application/json',
                     content_type='application/json'
                 )
 
+        if tile['content_hash']:
+            response.set_etag('{}-{}'.format(tile['content_hash'], res_type))
+            response = response.make_conditional(request)
         return response
     except FileNotFoundError:
         return Response('tile data not found', status=404)
@@ -237,6 +309,103 @@ def query_tile():
         return Response(str(e), status=500)
 
 
+@bp.route('/tile-strings', methods=['GET'])
+def query_tile_strings():
+    """
+    Returns the string table of zoom level `zoom` of tree `tree-id`, or of zoom level with id `zoom-id`, holding the
+    texts of the branches referred to by the binary branch records of its tiles, see :func:`tile_service.tile_strings`.
+    Responses carry the version of the table as their ETag, the same version as in the header of the table and of the
+    records referring to it.
+    """
+    zoom_level = request.args.get('zoom', default=0)
+    tree_id = request.args.get('tree-id')
+    zoom_id = request.args.get('zoom-id')
+
+    if not tree_id and not zoom_id:
+        return Response('zoom-id or tree-id and zoom must be provided', status=500)
+
+    try:
+        if zoom_id:
+            tree_id, zoom_level = _get_zoom_level(zoom_id)
+            if tree_id is None:
+                return Response('zoom level not found', status=404)
+        data = tile_service.tile_strings(tree_id, zoom_level)
+    except ValueError as e:
+        return Response(str(e), status=500)
+
+    if data is None:
+        return Response('zoom level not found', status=404)
+    response = Response(response=data, mimetype='application/octet-stream', content_type='application/octet-stream')
+    response.set_etag('{:016x}'.format(strings_version(data)))
+    return response.make_conditional(request)
+
+
+@bp.route('/hit', methods=['GET', 'POST'])
+def query_hit():
+    """
+    Returns the topmost branch of tree `tree-id` at the point (`x`, `y`), given in the unit square the tree is drawn in
+    (the grid of tiles of every zoom level covers the same square), along with its ownership information and text, see
+    :func:`tile_service.hit_test`. If `zoom` is given, only branches listed in the tiles of that zoom level are
+    considered.
+
+    Several points can be tested at once by posting a JSON object with a `points` list of `[x, y]` pairs, and
+    optionally `tree-id` and `zoom` in place of the query parameters, which is answered with a list of results in the
+    same order. Each result holds the point and the branch at it, `null` if there is none.
+    """
+    tree_id = request.args.get('tree-id')
+    zoom_level = request.args.get('zoom')
+
+    try:
+        if request.method == 'POST':
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or not isinstance(body.get('points', None), list):
+                return Response('JSON object with list of points must be provided', status=500)
+            tree_id = body.get('tree-id', tree_id)
+            zoom_level = body.get('zoom', zoom_level)
+            points = [(float(x), float(y)) for x, y in body['points']]
+        else:
+            points = [(float(request.args.get('x')), float(request.args.get('y')))]
+    except (TypeError, ValueError):
+        return Response('x and y of points must be numbers', status=500)
+
+    if not tree_id:
+        return Response('tree-id must be provided', status=500)
+
+    try:
+        hits = tile_service.hit_test(tree_id, points, zoom_level=zoom_level)
+    except ValueError as e:
+        return Response(str(e), status=500)
+    if hits is None:
+        return Response('tree not found', status=404)
+
+    rv = [{'x': x, 'y': y, 'branch': branch} for (x, y), branch in zip(points, hits)]
+    if request.method != 'POST':
+        rv = rv[0]
+
+    return Response(
+        response=json.dumps(rv),
+        mimetype='application/json',
+        content_type='application/json;charset=utf-8'
+    )
+
+
+def _tile_saved(tile) -> bool:
+    # whether the files of `tile`, an entry of `tiles` table, exist; empty tiles have no files
+    if tile['img_file'] == EMPTY_TILE:
+        return True
+    return os.path.isfile(tile['img_file']) and os.path.isfile(tile['json_file'])
+
+
+def _get_zoom_level(zoom_id):
+    # returns (tree_id, zoom_level) of the entry in `zoom_info` table with id `zoom_id`, (None, None) if there is none
+    cur = get_db().cursor()
+    cur.execute('SELECT tree_id, zoom_level FROM zoom_info WHERE zoom_id=?', [zoom_id])
+    zoom = cur.fetchone()
+    if zoom is None:
+        return None, None
+    return zoom['tree_id'], zoom['zoom_level']
+
+
 @bp.route('/add-layer', methods=['GET'])
 def add_layer():
     tree_id = current_app.config['TREE_ID']
@@ -246,6 +415,7 @@ def add_layer():
             '--price=1'
         ])
     except SystemExit:
+        tile_service.invalidate(tree_id)
         render_service.render(zooms=None)
 
     response = Response(
@@ -1,7 +1,7 @@
 from wordstree.db import get_db
 from flask import Blueprint, Flask, request, g, redirect, url_for, render_template, flash, current_app, session
 
-from .services import render_service
+from .services import render_service, tile_service
 from .home import _initial_render
 
 bp = Blueprint('buy', __name__)
@@ -111,8 +111,9 @@ def buy_branch():
         db.execute("INSERT INTO notifications (receiver_id, entity_id) VALUES (?, ?)", [user_id, 3])
         db.commit()
 
-        # re-render all tiles at all zoom levels in another thread
-        render_service.render(zooms=None)
+        # re-render the tiles of the bought branch at all zoom levels in another thread
+        tile_service.invalidate(current_app.config['TREE_ID'])
+        render_service.render(zooms=None, branch_ids=[buying_id])
 
         return redirect(url_for("buy.buy_branches_get"))
 
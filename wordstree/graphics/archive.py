@@ -0,0 +1,182 @@
+import mmap
+import os
+import struct
+
+# header of an archive: magic, format version, unused, size of the square grid
+HEADER = struct.Struct('<4sHHI')
+# entry of the index of an archive: offset and length of the image, offset and length of the JSON file of a tile
+ENTRY = struct.Struct('<QIQI')
+MAGIC = b'WTTA'
+VERSION = 1
+
+
+class TileArchiveWriter:
+    """
+    Writes the images and JSON files of the tiles of one zoom level into a single archive file. The archive starts with
+    a header followed by an index of fixed-width entries, one for each tile of the grid in `tile_index` order (see
+    :meth:`DBLoader.save_tile_info`), holding the offset and length of the image and JSON file of the tile within the
+    archive. The data of the tiles follows the index. Tiles that are not added are left empty, with lengths of `0`.
+
+    Tiles added with the hash of their contents are deduplicated: the entries of tiles with the same hash refer to the
+    same data, which is written once.
+
+    The archive is written to a temporary file that replaces the file at `path` once the writer is closed, so readers
+    never see a partially written archive. Use as a context manager, or call :meth:`close` when done.
+    """
+
+    def __init__(self, path: str, grid: int):
+        """
+        :param path: path to the archive file
+        :param grid: size of the square grid of the zoom level
+        """
+        self.__path = path
+        self.__tmp_path = path + '.tmp'
+        self.__grid = grid
+        self.__entries = [(0, 0, 0, 0)] * (grid * grid)
+        # entries of the tiles added so far, keyed by the hash of their contents
+        self.__hashes = dict()
+
+        self.__file = open(self.__tmp_path, mode='wb')
+        self.__file.write(HEADER.pack(MAGIC, VERSION, 0, grid))
+        self.__file.write(bytes(ENTRY.size * grid * grid))
+        self.__offset = HEADER.size + ENTRY.size * grid * grid
+
+    def add(self, tile_index: int, img_data: bytes, json_data: bytes, content_hash: str = None):
+        """
+        Appends the image and JSON file of the tile at `tile_index` to the archive, replacing any previously added data
+        of the tile.
+
+        :param tile_index: index of the tile in the grid, `column * grid + row`
+        :param img_data: contents of the PNG image of the tile
+        :param json_data: contents of the JSON file of the tile
+        :param content_hash: hash of the contents of the tile; if a tile with the same hash has been added before, the
+            tile refers to the data of that tile instead of appending its own
+        """
+        if not 0 <= tile_index < len(self.__entries):
+            raise Exception('tile index {} out of range of {}x{} grid'.format(tile_index, self.__grid, self.__grid))
+
+        entry = self.__hashes.get(content_hash, None) if content_hash else None
+        if entry is not None:
+            self.__entries[tile_index] = entry
+            return
+
+        img_offset = self.__offset
+        self.__file.write(img_data)
+        json_offset = img_offset + len(img_data)
+        self.__file.write(json_data)
+        self.__offset = json_offset + len(json_data)
+
+        self.__entries[tile_index] = (img_offset, len(img_data), json_offset, len(json_data))
+        if content_hash:
+            self.__hashes[content_hash] = self.__entries[tile_index]
+
+    def close(self):
+        """
+        Writes the index of the archive and moves the archive in place of the file at `path`.
+        """
+        if self.__file.closed:
+            return
+        self.__file.seek(HEADER.size)
+        self.__file.write(b''.join([ENTRY.pack(*entry) for entry in self.__entries]))
+        self.__file.close()
+        os.replace(self.__tmp_path, self.__path)
+
+    def discard(self):
+        """
+        Drops the archive being written, leaving the file at `path` untouched.
+        """
+        if not self.__file.closed:
+            self.__file.close()
+        if os.path.isfile(self.__tmp_path):
+            os.remove(self.__tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class TileArchive:
+    """
+    Read-only view of an archive written by :class:`TileArchiveWriter`. The archive is memory-mapped, and the data of
+    the tiles is returned as `memoryview` slices of the mapping, so reading a tile neither opens a file nor copies its
+    contents.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path to the archive file
+        """
+        self.__path = path
+        with open(path, mode='rb') as file:
+            if os.fstat(file.fileno()).st_size < HEADER.size:
+                raise Exception('{} is not a tile archive'.format(path))
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, grid = HEADER.unpack_from(self.__mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception('{} is not a tile archive'.format(path))
+        self.__grid = grid
+        self.__view = memoryview(self.__mmap)
+
+    def entry(self, tile_index: int) -> tuple:
+        """
+        Returns the entry of the tile at `tile_index` in the index of the archive.
+        :param tile_index: index of the tile in the grid, `column * grid + row`
+        :return: tuple `(img_offset, img_length, json_offset, json_length)`
+        """
+        if not 0 <= tile_index < self.__grid * self.__grid:
+            raise Exception('tile index {} out of range of {}x{} grid'.format(tile_index, self.__grid, self.__grid))
+        return ENTRY.unpack_from(self.__mmap, HEADER.size + tile_index * ENTRY.size)
+
+    def has_tile(self, tile_index: int) -> bool:
+        return self.entry(tile_index)[1] > 0
+
+    def img(self, tile_index: int) -> memoryview:
+        """
+        Returns the PNG image of the tile at `tile_index`, empty if the tile is not in the archive.
+        """
+        offset, length, _, _ = self.entry(tile_index)
+        return self.__view[offset:offset + length]
+
+    def json(self, tile_index: int) -> memoryview:
+        """
+        Returns the JSON file of the tile at `tile_index`, empty if the tile is not in the archive.
+        """
+        _, _, offset, length = self.entry(tile_index)
+        return self.__view[offset:offset + length]
+
+    @property
+    def grid(self) -> int:
+        return self.__grid
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+
+# archives opened by `open_archive()`, keyed by path, along with the identity of the file they were opened from
+__archives = dict()
+
+
+def open_archive(path: str) -> TileArchive:
+    """
+    Returns :class:`TileArchive` of the archive at `path`. Archives are kept open across calls, and reopened once the
+    file has been replaced by a newly written archive.
+
+    :param path: path to the archive file
+    :return: the archive
+    """
+    stat = os.stat(path)
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    cached = __archives.get(path, None)
+    if cached is None or cached[0] != key:
+        # earlier mapping is left for the garbage collector, slices of it may still be in use
+        cached = (key, TileArchive(path))
+        __archives[path] = cached
+    return cached[1]
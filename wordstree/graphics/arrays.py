@@ -0,0 +1,268 @@
+from typing import List, Dict
+
+import numpy as np
+
+from .branch import Branch
+from .util import Vec, Rect, rectangles_intersect
+
+
+class BranchArray:
+    """
+    Branches of a tree stored column by column in contiguous NumPy arrays, instead of as one :class:`Branch` object (and
+    its :class:`Vec` and :class:`Rect`) per branch. The text of the branches is stored out of line, keyed by row, since
+    most branches have none.
+
+    Indexing an array returns a :class:`Branch` created on demand for that row, and slicing returns a list of them, so
+    code written for lists of branches can read an array as well. Geometry of all the branches at once is available
+    from :meth:`corners` and :meth:`bounds`.
+    """
+
+    # columns of the array and their types
+    COLUMNS = {
+        'pos_x': np.float64,
+        'pos_y': np.float64,
+        'length': np.float64,
+        'width': np.float64,
+        'angle': np.float64,
+        'depth': np.int32,
+        'index': np.int64,
+        'parent': np.int64
+    }
+
+    def __init__(self, size: int = 0, columns: Dict[str, object] = None, texts: Dict[int, str] = None):
+        """
+        :param size: number of branches
+        :param columns: map of column name to the values of the column, see :attr:`COLUMNS`; columns not provided are
+            filled with zeros, except for `index` which defaults to the row of the branch and `parent` which defaults to
+            `-1` (unknown)
+        :param texts: map of row to text of the branches that have text
+        """
+        if columns is None:
+            columns = dict()
+
+        self.__size = size
+        self.__columns = dict()
+        for name, dtype in BranchArray.COLUMNS.items():
+            values = columns.get(name, None)
+            if values is not None:
+                column = np.array(values, dtype=dtype)
+                if column.shape != (size,):
+                    raise Exception('column \'{}\' has {} values, expected {}'.format(name, len(column), size))
+            elif name == 'index':
+                column = np.arange(size, dtype=dtype)
+            elif name == 'parent':
+                column = np.full(size, -1, dtype=dtype)
+            else:
+                column = np.zeros(size, dtype=dtype)
+            self.__columns[name] = column
+
+        self.__texts = dict()
+        if texts:
+            for row, text in texts.items():
+                self.set_text(row, text)
+
+    def resize(self, size: int):
+        """
+        Grows or shrinks the array to `size` branches. New branches are filled as described in :meth:`__init__`, the
+        text of removed branches is dropped.
+        """
+        old_size = self.__size
+        for name, column in self.__columns.items():
+            if size <= old_size:
+                self.__columns[name] = column[:size].copy()
+                continue
+
+            if name == 'index':
+                extra = np.arange(old_size, size, dtype=column.dtype)
+            elif name == 'parent':
+                extra = np.full(size - old_size, -1, dtype=column.dtype)
+            else:
+                extra = np.zeros(size - old_size, dtype=column.dtype)
+            self.__columns[name] = np.concatenate((column, extra))
+
+        self.__texts = {row: text for row, text in self.__texts.items() if row < size}
+        self.__size = size
+
+    def text(self, row: int) -> str:
+        return self.__texts.get(row, '')
+
+    def set_text(self, row: int, text: str):
+        """
+        Sets the text of the branch at `row`, an empty or `None` text removes it.
+        """
+        if not 0 <= row < self.__size:
+            raise IndexError('branch {} out of range'.format(row))
+        if text:
+            self.__texts[row] = text
+        else:
+            self.__texts.pop(row, None)
+
+    def corners(self) -> np.ndarray:
+        """
+        Returns the vertices of the rectangles of all the branches, computed at once.
+
+        :return: array of shape `(len(self), 4, 2)` with the (x, y) of the top-left, top-right, bottom-right and
+            bottom-left vertices of each branch, in the order of :attr:`Rect.points`
+        """
+        cos_theta, sin_theta = np.cos(self.angle), np.sin(self.angle)
+        half_width = self.width / 2
+
+        # top-left corner is half the width away from the position of the branch, across the branch
+        x0 = self.pos_x + half_width * sin_theta
+        y0 = self.pos_y - half_width * cos_theta
+        # sides of the rectangle along and across the branch
+        lx, ly = self.length * cos_theta, self.length * sin_theta
+        wx, wy = -self.width * sin_theta, self.width * cos_theta
+
+        corners = np.empty((self.__size, 4, 2), dtype=np.float64)
+        corners[:, 0, 0], corners[:, 0, 1] = x0, y0
+        corners[:, 1, 0], corners[:, 1, 1] = x0 + lx, y0 + ly
+        corners[:, 2, 0], corners[:, 2, 1] = x0 + lx + wx, y0 + ly + wy
+        corners[:, 3, 0], corners[:, 3, 1] = x0 + wx, y0 + wy
+        return corners
+
+    def bounds(self) -> np.ndarray:
+        """
+        Returns the axis-aligned bounding boxes of all the branches, computed at once.
+
+        :return: array of shape `(len(self), 4)` with the `(min_x, min_y, max_x, max_y)` of each branch, as in
+            :attr:`Rect.bounds`
+        """
+        corners = self.corners()
+        return np.concatenate((corners.min(axis=1), corners.max(axis=1)), axis=1)
+
+    def intersect(self, rect: Rect) -> np.ndarray:
+        """
+        Returns boolean mask of the branches whose rectangles intersect `rect`, see :func:`rectangles_intersect`.
+        """
+        return rectangles_intersect(rect, self.corners(), self.angle)
+
+    def layers(self) -> List[int]:
+        """
+        Returns the rows at which each layer of branches begins, see :attr:`Loader.layers`. Branches must be sorted by
+        depth.
+        """
+        depth = self.depth
+        steps = np.diff(depth)
+        if np.any(steps < 0):
+            raise Exception('branches not in order')
+        if self.__size == 0:
+            return []
+        return [0] + (np.flatnonzero(steps) + 1).tolist()
+
+    def branch(self, row: int) -> Branch:
+        """
+        Returns a new :class:`Branch` object with the values of the branch at `row`.
+        """
+        if row < 0:
+            row += self.__size
+        if not 0 <= row < self.__size:
+            raise IndexError('branch {} out of range'.format(row))
+
+        cols = self.__columns
+        return Branch(
+            int(cols['index'][row]), Vec(float(cols['pos_x'][row]), float(cols['pos_y'][row])),
+            depth=int(cols['depth'][row]), length=float(cols['length'][row]), width=float(cols['width'][row]),
+            angle=float(cols['angle'][row]), text=self.__texts.get(row, '')
+        )
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.branch(row) for row in range(*key.indices(self.__size))]
+        return self.branch(key)
+
+    def __iter__(self):
+        for row in range(self.__size):
+            yield self.branch(row)
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def texts(self) -> Dict[int, str]:
+        return self.__texts
+
+    @property
+    def pos_x(self) -> np.ndarray:
+        return self.__columns['pos_x']
+
+    @property
+    def pos_y(self) -> np.ndarray:
+        return self.__columns['pos_y']
+
+    @property
+    def length(self) -> np.ndarray:
+        return self.__columns['length']
+
+    @property
+    def width(self) -> np.ndarray:
+        return self.__columns['width']
+
+    @property
+    def angle(self) -> np.ndarray:
+        return self.__columns['angle']
+
+    @property
+    def depth(self) -> np.ndarray:
+        return self.__columns['depth']
+
+    @property
+    def index(self) -> np.ndarray:
+        return self.__columns['index']
+
+    @property
+    def parent(self) -> np.ndarray:
+        return self.__columns['parent']
+
+
+def branch_array(branches: List[Branch], num_branches: int = None) -> BranchArray:
+    """
+    Returns a :class:`BranchArray` with the first `num_branches` branches of `branches`, defaults to all of them. The
+    parents of the branches are unknown.
+    """
+    if num_branches is None:
+        num_branches = len(branches)
+    branches = [branches[k] for k in range(num_branches)]
+
+    return BranchArray(num_branches, columns={
+        'pos_x': [branch.pos.x for branch in branches],
+        'pos_y': [branch.pos.y for branch in branches],
+        'length': [branch.length for branch in branches],
+        'width': [branch.width for branch in branches],
+        'angle': [branch.angle for branch in branches],
+        'depth': [branch.depth for branch in branches],
+        'index': [branch.index for branch in branches]
+    }, texts={row: branch.text for row, branch in enumerate(branches) if branch.text})
+
+
+def branch_array_from_json(objs: List[dict]) -> BranchArray:
+    """
+    Returns a :class:`BranchArray` with the branches of the list of dictionaries returned by :meth:`Branch.json_obj`,
+    e.g. decoded from a tree saved by :class:`FileLoader`.
+    """
+    return BranchArray(len(objs), columns={
+        'pos_x': [obj['pos']['x'] for obj in objs],
+        'pos_y': [obj['pos']['y'] for obj in objs],
+        'length': [obj['length'] for obj in objs],
+        'width': [obj['width'] for obj in objs],
+        'angle': [obj['angle'] for obj in objs],
+        'depth': [obj['depth'] for obj in objs],
+        'index': [obj['index'] for obj in objs]
+    })
+
+
+def join_branch_arrays(arrays: List[BranchArray]) -> BranchArray:
+    """
+    Returns a :class:`BranchArray` with the branches of every array of `arrays`, one after the other, e.g. the layers
+    yielded by :func:`iter_layers`.
+    """
+    texts, offset = dict(), 0
+    for array in arrays:
+        texts.update({offset + row: text for row, text in array.texts.items()})
+        offset += len(array)
+
+    if not arrays:
+        return BranchArray()
+    return BranchArray(offset, columns={
+        name: np.concatenate([getattr(array, name) for array in arrays]) for name in BranchArray.COLUMNS
+    }, texts=texts)
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import time
+from typing import List
+
+from flask import current_app
+
+from wordstree.graphics.index import BranchIndex
+from wordstree.graphics.loader import FileLoader
+from wordstree.graphics.render import Renderer, _draw_tile, _encode_tile, _tile_file_name
+from wordstree.graphics.util import create_dir
+
+# stages timed once per tree, and once per zoom level of every tree
+TREE_STAGES = ['generate', 'save', 'load', 'index']
+ZOOM_STAGES = ['assign', 'rasterize', 'encode', 'persist']
+
+# regressions smaller than this many seconds are considered noise
+MIN_REGRESSION = 0.005
+
+
+def _timed(results: dict, key: str, repeat: int, fn):
+    # runs `fn` `repeat` times and records the fastest run under `key`, returns the result of the last run
+    best, rv = None, None
+    for i in range(repeat):
+        start = time.perf_counter()
+        rv = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    results[key] = best
+    return rv
+
+
+def result_key(depth: int, stage: str, zoom: int = None) -> str:
+    """
+    Returns the key of the timing of `stage` for the tree of depth `depth` in the results of :func:`run_benchmarks`.
+    """
+    if zoom is None:
+        return 'd{}/{}'.format(depth, stage)
+    return 'd{}/z{}/{}'.format(depth, zoom, stage)
+
+
+def run_benchmarks(depths: List[int], zooms: List[int], seed: int = 0, repeat: int = 1) -> dict:
+    """
+    Times every stage of the render pipeline for trees generated with a fixed seed at each depth in `depths`: tree
+    generation, saving the branches to and loading them from a JSON file, building the spatial index, and, for each zoom
+    level in `zooms`, assigning branches to tiles, drawing the tiles, encoding their PNG images and JSON files, and
+    writing the tile files to disk. Files are written under the `bench` directory of the cache directory, which is
+    removed afterwards.
+
+    :param depths: maximum depths of the trees to generate
+    :param zooms: zoom levels to render each tree at
+    :param seed: seed of the random number generator, so that the same trees are generated on every run
+    :param repeat: number of times to run each stage; the fastest run is reported
+    :return: dictionary with the parameters of the run, and the time in seconds of each stage keyed by
+        :func:`result_key` under `results`
+    """
+    ren = Renderer()
+    bench_dir = os.path.join(current_app.config['CACHE_DIR'], 'bench')
+    results = dict()
+
+    try:
+        for depth in depths:
+            print('Benchmarking tree of depth {} ...'.format(depth))
+
+            def generate():
+                loader = FileLoader()
+                loader.load_branches(max_depth=depth, tree_name='bench_d{}'.format(depth), seed=seed)
+                return loader
+
+            loader = _timed(results, result_key(depth, 'generate'), repeat, generate)
+
+            tree_file = os.path.join(bench_dir, 'tree_d{}.json'.format(depth))
+            create_dir(bench_dir)
+            _timed(results, result_key(depth, 'save'), repeat, lambda: loader.save_branches(file=tree_file))
+            _timed(results, result_key(depth, 'load'), repeat, lambda: FileLoader().load_branches(file=tree_file))
+
+            index = _timed(results, result_key(depth, 'index'), repeat,
+                           lambda: BranchIndex(loader.branches, loader.num_branches))
+
+            for zoom in zooms:
+                grid, visible = ren.grid_levels[zoom], ren.zoom_levels[zoom]
+                opacities = ren._get_opacities(zoom, loader)
+                tile_args = ren._tile_args(zoom, 'bench_d{}'.format(depth))
+                tiles = [(i, j) for i in range(grid) for j in range(grid)]
+
+                _timed(results, result_key(depth, 'assign', zoom), repeat, lambda: [
+                    index.query_tile(j, i, grid, max_depth=visible) for i, j in tiles
+                ])
+                drawn = _timed(results, result_key(depth, 'rasterize', zoom), repeat, lambda: [
+                    _draw_tile(index, opacities, visible, tile_args, i, j) for i, j in tiles
+                ])
+                encoded = _timed(results, result_key(depth, 'encode', zoom), repeat, lambda: [
+                    _encode_tile(tile, branches) for tile, branches in drawn
+                ])
+
+                tile_dir = os.path.join(bench_dir, 'd{}_z{}'.format(depth, zoom))
+                create_dir(tile_dir)
+
+                def persist():
+                    for (i, j), (img_data, json_data) in zip(tiles, encoded):
+                        name = os.path.join(tile_dir, _tile_file_name(zoom, tile_args['tile_size'], i, j))
+                        with open(name + '.png', mode='wb') as img_file:
+                            img_file.write(img_data)
+                        with open(name + '.json', mode='wb') as json_file:
+                            json_file.write(json_data)
+
+                _timed(results, result_key(depth, 'persist', zoom), repeat, persist)
+                print('  zoom level {}: {}'.format(zoom, ', '.join([
+                    '{} {:.3f}s'.format(stage, results[result_key(depth, stage, zoom)]) for stage in ZOOM_STAGES
+                ])))
+    finally:
+        shutil.rmtree(bench_dir, ignore_errors=True)
+
+    return {
+        'seed': seed,
+        'depths': list(depths),
+        'zooms': list(zooms),
+        'repeat': repeat,
+        'results': results
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float,
+                     min_seconds: float = MIN_REGRESSION) -> List[tuple]:
+    """
+    Compares the timings of two runs of :func:`run_benchmarks`. A stage has regressed if it is slower than in the
+    baseline by more than `threshold` times the baseline time, and by more than `min_seconds` seconds. Stages missing
+    from either run are ignored.
+
+    :param results: dictionary returned by :func:`run_benchmarks`
+    :param baseline: dictionary returned by :func:`run_benchmarks` to compare against
+    :param threshold: allowed slowdown as a fraction of the baseline time, e.g `0.2` for 20%
+    :param min_seconds: slowdowns of at most this many seconds are ignored as noise
+    :return: list of tuples `(key, baseline seconds, seconds)` of the stages that regressed
+    """
+    regressions = []
+    new, old = results['results'], baseline['results']
+    for key in sorted(new.keys()):
+        if key not in old:
+            continue
+        if new[key] - old[key] > max(threshold * old[key], min_seconds):
+            regressions.append((key, old[key], new[key]))
+    return regressions
+
+
+def save_results(results: dict, path: str):
+    with open(path, mode='w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> dict:
+    with open(path, mode='r') as file:
+        return json.load(file)
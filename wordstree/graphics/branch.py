@@ -1,9 +1,10 @@
 import math
 import cairo
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Iterable
 import json
 
 from wordstree.graphics import HALF_PI
+from wordstree.graphics.text import layout_text
 from wordstree.graphics.util import Vec, degrees, JSONifiable, Rect, translate_point_along_line
 
 
@@ -12,6 +13,7 @@ class Branch(JSONifiable):
     DEFAULT_WIDTH = 0.0005
     DEFAULT_ANGLE = 3 * math.pi / 2
     JSON_KEYS = ['index', 'pos', 'depth', 'length', 'width', 'angle']
+    __slots__ = ('__index', '__pos', '__depth', '__length', '__width', '__angle', '__text', '__rect')
 
     def __init__(self, index, pos: Vec = None, **kwargs):
         self.__index = index
@@ -21,12 +23,13 @@ class Branch(JSONifiable):
         self.__width = kwargs.get('width', Branch.DEFAULT_WIDTH)
         self.__angle = kwargs.get('angle', Branch.DEFAULT_ANGLE)
         self.__text = kwargs.get('text', '')
-
-        x, y = self.__pos.x, self.__pos.y
-        top_left = translate_point_along_line(x, y, -self.__width/2, self.__angle + HALF_PI)
-        self.__rect = Rect(top_left, self.__length, self.__width, self.__angle)
+        # built on first access, most branches loaded are never tested against a rectangle
+        self.__rect = None
 
     def hit_test(self, x, y):
+        """
+        Returns whether the point (x, y) lies inside the rectangle of the branch.
+        """
         cos_theta = math.cos(self.angle)
         sin_theta = math.sin(self.angle)
 
@@ -38,7 +41,6 @@ class Branch(JSONifiable):
 
         halfw = self.width / 2
 
-        print('testing hit ({:.2f}, {:.2f})...'.format(nx, ny))
         if (0 < nx < self.length) and (-halfw < ny < halfw):
             return True
         return False
@@ -79,65 +81,63 @@ class Branch(JSONifiable):
             ctx.show_text(label)
             ctx.restore()
 
+        # draw point
+        # ctx.rotate(-angle)
+        # ctx.arc(0, 0, 0.004, 0, 2 * math.pi)
+        # ctx.set_source_rgb(0, 1, 0)
+        # ctx.fill()
+
+        # restore out of branch coordinates
+        ctx.restore()
+
+        self.draw_text(ctx, opacity=opacity)
+
+    def draw_text(self, ctx: cairo.Context, opacity: float = 1.0):
+        """
+        Draws the text of the branch along the branch, does nothing if the branch has no text.
+        """
         msg = '{}'.format(' '.join(self.text.upper()))
-        filler = '—  '
-        if msg:
-            # draw message
-            ctx.save()
-            ft_size = width * 0.6
-            ctx.set_font_size(ft_size)
-            ctx.set_line_width(0.0002)
-            ctx.select_font_face('Impact', cairo.FontSlant.NORMAL, cairo.FontWeight.BOLD)
-
-            max_width = 0.6 * length
-            msg_extents = ctx.text_extents(msg)
-            if msg_extents.width > max_width:
-                num_fillers = 0
-                while msg_extents.width > max_width:
-                    if ft_size < 0.0001:
-                        break
-                    ft_size -= 0.00001
-                    ctx.set_font_size(ft_size)
-                    msg_extents = ctx.text_extents(msg)
-            else:
-                filler_extents = ctx.text_extents(filler)
-                num_fillers = max(math.floor((length-msg_extents.width)/filler_extents.x_advance/2)-2, 0)
+        if not msg:
+            return
 
-            full_msg = '{}    {}    {}'.format(filler*num_fillers, msg, filler*num_fillers).strip()
-            extents = ctx.text_extents(full_msg)
+        ctx.save()
+        pos, angle, width, length = self.pos, self.angle, self.width, self.length
 
-            if math.pi/2 <= angle <= 3*math.pi/2:
-                ctx.rotate(angle + math.pi)
-                ctx.translate(-length, 0)
-                ctx.scale(1, 1)
-                ctx.translate(length/2-extents.width/2, extents.height/2)
-            else:
-                ctx.rotate(angle)
-                ctx.translate(length/2-extents.width/2, extents.height/2)
+        # move origin to position of branch
+        ctx.translate(pos.x, pos.y)
+        ctx.set_line_width(0.0002)
+        ctx.select_font_face('Impact', cairo.FontSlant.NORMAL, cairo.FontWeight.BOLD)
 
-            ctx.set_source_rgba(1, 1, 1, opacity)
-            ctx.text_path(full_msg)
-            ctx.fill()
-            ctx.stroke()
+        layout = layout_text(ctx, msg, length, width)
+        full_msg = layout.text
 
-            # give border
-            ctx.set_source_rgba(0, 0, 0, opacity)
-            ctx.text_path(full_msg)
-            ctx.stroke()
+        if math.pi/2 <= angle <= 3*math.pi/2:
+            ctx.rotate(angle + math.pi)
+            ctx.translate(-length, 0)
+            ctx.scale(1, 1)
+            ctx.translate(length/2-layout.width/2, layout.height/2)
+        else:
+            ctx.rotate(angle)
+            ctx.translate(length/2-layout.width/2, layout.height/2)
 
-            ctx.restore()
+        ctx.set_source_rgba(1, 1, 1, opacity)
+        ctx.text_path(full_msg)
+        ctx.fill()
+        ctx.stroke()
 
-        # draw point
-        # ctx.rotate(-angle)
-        # ctx.arc(0, 0, 0.004, 0, 2 * math.pi)
-        # ctx.set_source_rgb(0, 1, 0)
-        # ctx.fill()
+        # give border
+        ctx.set_source_rgba(0, 0, 0, opacity)
+        ctx.text_path(full_msg)
+        ctx.stroke()
 
-        # restore out of branch coordinates
         ctx.restore()
 
     @property
-    def rect(self):
+    def rect(self) -> Rect:
+        if self.__rect is None:
+            x, y = self.__pos.x, self.__pos.y
+            top_left = translate_point_along_line(x, y, -self.__width/2, self.__angle + HALF_PI)
+            self.__rect = Rect(top_left, self.__length, self.__width, self.__angle)
         return self.__rect
 
     @property
@@ -205,10 +205,13 @@ def _interpolate(start: List, end: List, r) -> List:
 
 
 def _get_branch_color(branch: Branch) -> List[float]:
+    return _get_depth_color(branch.depth)
+
+
+def _get_depth_color(depth: int) -> List[float]:
     brown = [83/255.0, 49/255.0, 24/255.0]
     green_start = [25/255.0, 131/255.0, 87/255.0]
     green = [0, 1, 0]
-    depth = branch.depth
     # stem, brown color
     if depth == 0:
         return brown
@@ -216,3 +219,64 @@ def _get_branch_color(branch: Branch) -> List[float]:
     return _interpolate(green_start, green, depth/15)
 
 
+# colors of branches indexed by depth, extended by `_get_depth_colors()` as deeper branches are drawn
+__depth_colors = []
+
+
+def _get_depth_colors(max_depth: int) -> List[List[float]]:
+    """
+    Returns lookup table of the colors of branches at depths `0` to `max_depth`, see :func:`_get_depth_color`.
+    """
+    for depth in range(len(__depth_colors), max_depth + 1):
+        __depth_colors.append(_get_depth_color(depth))
+    return __depth_colors
+
+
+def draw_branches(ctx: cairo.Context, branches: Iterable[Branch], opacities: Dict[int, float]) -> int:
+    """
+    Draws `branches` in batches, one per depth, instead of one branch at a time with :meth:`Branch.draw`. The
+    rectangles of the branches at the same depth are added to a single path as polygons and filled once with the color
+    of that depth, followed by the text of those branches. Depths are drawn from the root up, so that the branches and
+    text of deeper layers are drawn over those of shallower layers.
+
+    :param ctx: context to draw to
+    :param branches: branches to draw
+    :param opacities: map of branch depth to the opacity the branches at that depth are drawn with; branches at depths
+        not in the map are not drawn
+    :return: number of branches drawn
+    """
+    layers = dict()
+    for branch in branches:
+        if opacities.get(branch.depth, 0.0) > 0.0:
+            layers.setdefault(branch.depth, []).append(branch)
+    if not layers:
+        return 0
+
+    colors = _get_depth_colors(max(layers))
+    num_drawn = 0
+    for depth in sorted(layers):
+        layer, opacity = layers[depth], opacities[depth]
+
+        ctx.new_path()
+        for branch in layer:
+            x, y, angle, length = branch.pos.x, branch.pos.y, branch.angle, branch.length
+            half_width = branch.width / 2
+            cos_theta, sin_theta = math.cos(angle), math.sin(angle)
+            # corners of the rectangle of `Branch.draw()`, rotated by the angle of the branch about its position
+            dx, dy = length * cos_theta, length * sin_theta
+            wx, wy = half_width * sin_theta, -half_width * cos_theta
+            ctx.move_to(x + wx, y + wy)
+            ctx.line_to(x + wx + dx, y + wy + dy)
+            ctx.line_to(x - wx + dx, y - wy + dy)
+            ctx.line_to(x - wx, y - wy)
+            ctx.close_path()
+
+        r, g, b = colors[depth]
+        ctx.set_source_rgba(r, g, b, opacity)
+        ctx.fill()
+
+        for branch in layer:
+            if branch.text:
+                branch.draw_text(ctx, opacity=opacity)
+        num_drawn += len(layer)
+    return num_drawn
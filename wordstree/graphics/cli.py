@@ -1,16 +1,45 @@
+from functools import update_wrapper
+from typing import List
+
 import click
 from flask import current_app
 from flask.cli import with_appcontext
 import os
 
+from wordstree.graphics import profile
+from wordstree.graphics.bench import run_benchmarks, find_regressions, load_results, save_results, MIN_REGRESSION
 from wordstree.graphics.loader import Loader, FileLoader, DBLoader
 from wordstree.graphics.render import Renderer
-from .generate import generate_layer
+from .generate import generate_layer, iter_layers, new_seed
+
+
+def with_profile(f):
+    """
+    Wraps a command taking a `profile_str` option, the path of a JSON file to write a report of the stages of rendering
+    run by the command to, see :class:`profile.Profiler`. Relative paths are relative to the cache directory. The
+    report is written even if the command fails. The option is not passed on to the command.
+    """
+    def wrapper(*args, profile_str: str = '', **kwargs):
+        profile_str = profile_str.strip()
+        if not profile_str:
+            return f(*args, **kwargs)
+
+        profile.start_profile()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            profile_path = os.path.join(current_app.config['CACHE_DIR'], profile_str)
+            profile.stop_profile().save(profile_path)
+            print('\nSaved render profile to {}'.format(profile_path))
+
+    return update_wrapper(wrapper, f)
 
 
 def init_app(app):
     app.cli.add_command(render_tree)
+    app.cli.add_command(generate_tree)
     app.cli.add_command(add_layer)
+    app.cli.add_command(bench_render)
 
 
 def parse_range_list(string: str, max: int = 0, min: int = 0):
@@ -70,6 +99,25 @@ def validate_zoom(ctx, param, value):
     return value
 
 
+def parse_id_list(string: str) -> List[int]:
+    """
+    Parses comma separated list of integers, eg. "3,12,7", and returns the list of those integers.
+
+    :param string: the string to parse
+    :return: list of integers in `string`, in the order they appear
+    """
+    ids = []
+    for item in string.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            ids.append(int(item))
+        except ValueError:
+            raise click.BadParameter('bad id \'{}\''.format(item))
+    return ids
+
+
 # null character at the end of help messages as a temporary way to get new lines...
 @click.command('render')
 @click.option('-z', '--zoom', 'zooms', default='0',
@@ -84,6 +132,10 @@ def validate_zoom(ctx, param, value):
               help='If generating new tree, specifies maximum depth of the tree, otherwise ignored.\n\0',
               type=int
               )
+@click.option('--seed', 'seed', type=int, default=None,
+              help='If generating new tree, seed of the tree; trees generated with the same seed and depth are the '
+                   'same. If not provided, a new seed is drawn. The seed is saved along with the tree.\n\0'
+              )
 @click.option('-f', '--from', 'input_str', type=str, default='',
               help='Specifies where to read branches from; if left empty, a new tree will be generated. '
                    'Values can be (1) path to JSON file containing serialized array of branches, or (2)'
@@ -101,8 +153,42 @@ def validate_zoom(ctx, param, value):
                    'under the cache directory. If not provided, a default one will be generated if a new tree is being'
                    'generated.\n\0'
               )
+@click.option('-j', '--jobs', 'jobs', type=int, default=1,
+              help='Number of worker processes to render the tiles of each zoom level with, and to generate the '
+                   'subtrees of a new tree with; 0 uses one process per CPU. Defaults to 1, in which case tiles are '
+                   'rendered serially.\n\0'
+              )
+@click.option('--branches', 'branches_str', type=str, default='',
+              help='Comma separated ids (\'id\' column of \'branches\' table) of branches that changed. If provided, '
+                   'only the tiles overlapped by these branches are re-rendered, at the requested zoom levels the tree '
+                   'has already been rendered at, and their entries in \'tiles\' table are updated in place. '
+                   'Requires \'--from db:<tree-id>\'.\n\0'
+              )
+@click.option('--archive/--no-archive', 'archive', is_flag=True, default=False,
+              help='Write the tiles of each zoom level into a single archive file instead of one PNG and one JSON file '
+                   'per tile. With \'--branches\', re-rendered tiles are merged back into the archives of zoom levels '
+                   'that have one.\n\0'
+              )
+@click.option('--dedup/--no-dedup', 'dedup', is_flag=True, default=False,
+              help='Name the files of tiles saved as separate files after the hash of their contents, so that tiles '
+                   'with the same contents share the same files, and save tiles without branches as empty tiles that '
+                   'are served from memory instead of writing them to disk.\n\0'
+              )
+@click.option('--resume/--no-resume', 'resume', is_flag=True, default=False,
+              help='Keep the tiles already rendered at each zoom level from the same version of the tree, e.g. by an '
+                   'interrupted render, and render only the remaining tiles. Has no effect on tiles written into '
+                   'archives.\n\0'
+              )
+@click.option('--profile', 'profile_str', type=str, default='',
+              help='Path of a JSON file to write a report of the time spent in each stage of rendering to, e.g. '
+                   'loading branches, building the spatial index, assigning branches to tiles, drawing, encoding and '
+                   'writing tiles, and writing to the database, in total and per zoom level, along with the number of '
+                   'tiles, branches drawn and bytes written. Relative paths are relative to the cache directory.\n\0'
+              )
 @with_appcontext
-def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree_name):
+@with_profile
+def render_tree(zooms, input_str: str, output_str: str, depth, seed, cache_tiles, tree_name, jobs, branches_str,
+                archive, dedup, resume):
     """
     Generates/Loads branches from database `branches` table or from local JSON file, and renders the branches
     at specified a specified 'zoom level'. The 'zoom' level restricts the highest depth of visible branch and the
@@ -114,6 +200,11 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
 
     input_str, output_str = input_str.strip(), output_str.strip()
 
+    if jobs < 0:
+        raise click.BadParameter('number of jobs must be non-negative')
+    elif jobs == 0:
+        jobs = os.cpu_count() or 1
+
     # load branches
     if input_str.startswith('db:') or input_str == 'db':
         tree_id = input_str[3:]
@@ -122,12 +213,12 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
         if tree_id:
             loader.load_branches(tree_id=int(tree_id))
         else:
-            loader.load_branches(max_depth=depth, tree_name=tree_name)
+            loader.load_branches(max_depth=depth, tree_name=tree_name, seed=seed, workers=jobs)
     else:
         loader = FileLoader()
         input_str = input_str if input_str else None
         try:
-            loader.load_branches(file=input_str, max_depth=depth, tree_name=tree_name)
+            loader.load_branches(file=input_str, max_depth=depth, tree_name=tree_name, seed=seed, workers=jobs)
         except FileNotFoundError:
             abpath = os.path.abspath(os.path.join(current_app.config['CACHE_DIR'], input_str))
             raise click.BadParameter(r"file '{}' does not exist".format(abpath))
@@ -136,6 +227,23 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
     # bound check on zoom levels
     zooms = parse_range_list(zooms, max=ren.max_zoom_level, min=0)
 
+    branch_ids = parse_id_list(branches_str)
+    if branch_ids:
+        if not isinstance(loader, DBLoader) or loader.input_tree('tree_id') is None:
+            raise click.BadParameter('--branches requires branches to be read from database')
+
+        # re-render only the tiles of the changed branches
+        indices = loader.load_branch_indices(branch_ids)
+        rendered = set(loader.load_zoom_levels())
+        for level in zooms:
+            if level not in rendered:
+                continue
+            print('Zoom level: {}'.format(level))
+            ren.update_tiles(loader, indices, zoom=level, dedup=dedup)
+            if archive:
+                ren.pack_tiles(level, loader)
+        return
+
     print('\nRendering tree with max depth {} at zoom level(s) {} ...'.format(depth, str(zooms).strip('[]')))
 
     num_zooms = len(zooms)
@@ -159,7 +267,8 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
             width=ren.BASE_WIDTH, height=ren.BASE_WIDTH,
             branches=loader.branches,
             num_branches=loader.num_branches,
-            tree_name=tree_name
+            tree_name=tree_name,
+            seed=loader.input_tree('seed')
         )
     elif output_str:
         saver = FileLoader()
@@ -169,7 +278,8 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
             file=output_str,
             branches=loader.branches,
             num_branches=loader.num_branches,
-            tree_name=tree_name
+            tree_name=tree_name,
+            seed=loader.input_tree('seed')
         )
     else:
         saver = loader
@@ -185,7 +295,52 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
         print('Zoom level: {}'.format(level))
         ren.save_full_tree(zoom=level, saver=saver)
         if cache_tiles:
-            ren.cache_tiles(zoom=level, saver=saver, saver_args=save_kwargs)
+            ren.cache_tiles(zoom=level, saver=saver, saver_args=save_kwargs, jobs=jobs, archive=archive,
+                            dedup=dedup, resume=resume)
+
+
+@click.command('generate')
+@click.option('-d', '--depth', default=14, type=int,
+              help='Maximum depth of the tree to generate.\n\0'
+              )
+@click.option('--seed', 'seed', type=int, default=None,
+              help='Seed of the tree, see \'--seed\' of \'render\'.\n\0'
+              )
+@click.option('-o', '--out', 'output_str', type=str, default='',
+              help='Specifies where to save branches, see help on \'--out\' of \'render\'.\n\0'
+              )
+@click.option('--name', 'tree_name', default=None,
+              help='Name of the tree, if not provided, a default one will be generated.\n\0'
+              )
+@with_appcontext
+def generate_tree(depth, seed, output_str: str, tree_name):
+    """
+    Generates a new tree and saves its branches to the database or to a local JSON file, one layer at a time as the
+    layers are generated, so that only one layer of branches is held in memory. Tiles of the tree can then be rendered
+    with 'render --from'.
+    """
+    if seed is None:
+        seed = new_seed()
+    print('Generating new tree max_depth={} seed={} ...'.format(depth, seed))
+
+    output_str = output_str.strip()
+    if output_str.startswith('db:') or output_str == 'db':
+        tree_id = output_str[3:]
+        saver = DBLoader(current_app)
+        saver.save_branches(
+            tree_id=int(tree_id) if tree_id else None,
+            width=Renderer.BASE_WIDTH, height=Renderer.BASE_WIDTH,
+            branch_layers=iter_layers(max_depth=depth, seed=seed),
+            tree_name=tree_name,
+            seed=seed
+        )
+    elif output_str:
+        saver = FileLoader()
+        save_kwargs = {'tree_name': tree_name} if tree_name else dict()
+        saver.save_branches(file=output_str, branch_layers=iter_layers(max_depth=depth, seed=seed), seed=seed,
+                            **save_kwargs)
+    else:
+        raise click.BadParameter('output must be provided')
 
 
 @click.command('add-layer')
@@ -199,6 +354,10 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
               help='Number of layers of branches to add (or remove if negative), if value is not specified defaults '
                    'to 1.\n\0'
               )
+@click.option('--seed', 'seed', type=int, default=None,
+              help='Seed to generate the new layers with, defaults to the seed of the tree. If the tree has no seed, a '
+                   'new one is drawn. The seed is saved as the seed of the tree.\n\0'
+              )
 @click.option('--owner-id', 'owner_id', default=None,
               help='If not specified, no entry is added to "branches_ownership" table. If specified, adds an entry to '
                    '"branches_ownership" table for each new entry inserted to "branches" table with the given '
@@ -223,12 +382,13 @@ def render_tree(zooms, input_str: str, output_str: str, depth, cache_tiles, tree
                    'Defaults to empty string \'\'.\n\0'
               )
 @with_appcontext
-def add_layer(input_str, num_layers=1, owner_id=None, price=0, purchase=False, bid=True, text=''):
+def add_layer(input_str, num_layers=1, seed=None, owner_id=None, price=0, purchase=False, bid=True, text=''):
     """
     Add layers of branches to an existing tree in database.
 
     :param input_str: `db:<tree-id>` where `<tree-id>` is the id of the entry in the `tree` table
     :param num_layers: number of layers of branches to add to the `branches` table under the given tree-id
+    :param seed: seed to generate the new layers with, see :func:`layer_rng`; defaults to the seed of the tree
     :param owner_id: if not `None`, entries are also added to the `branches_ownership` table with the given `owner_id`
         column value. Other column values must be specified if this argument is not `None`. See :param:`price`,
         :param:`purchase`, and :param:`text`.
@@ -260,15 +420,20 @@ def add_layer(input_str, num_layers=1, owner_id=None, price=0, purchase=False, b
     else:
         depth = len(loader.layers)
         begin = loader.layers[-1]
+    if seed is None:
+        seed = loader.input_tree('seed')
+    if seed is None:
+        seed = new_seed()
+
     # generate next layer using branches from loader.branches
     branches, num_branches = generate_layer(loader.branches, depth, begin,
-                                            loader.num_branches)
+                                            loader.num_branches, seed=seed)
 
     # generate the rest from the newly generated layers
     begin = 0
     for i in range(1, num_layers):
         depth += 1
-        new_branches, added_branches = generate_layer(branches, depth, begin)
+        new_branches, added_branches = generate_layer(branches, depth, begin, seed=seed)
         begin = num_branches
         num_branches += added_branches
         branches.extend(new_branches)
@@ -289,4 +454,72 @@ def add_layer(input_str, num_layers=1, owner_id=None, price=0, purchase=False, b
             owner_info[branch.index] = info
 
     # update database
-    loader.update_branches(tree_id, branches=branches, num_branches=len(branches), ownership_info=owner_info)
+    loader.update_branches(tree_id, branches=branches, num_branches=len(branches), ownership_info=owner_info,
+                           seed=seed)
+
+
+@click.command('bench-render')
+@click.option('-d', '--depths', 'depths_str', default='8-18',
+              help='Comma separated ranges, or integers of the maximum depths of the trees to benchmark, see \'-z\' '
+                   'option of \'render\'. Defaults to 8-18.\n\0'
+              )
+@click.option('-z', '--zoom', 'zooms', default='0-3', callback=validate_zoom,
+              help='Zoom level(s) to render each tree at, see \'-z\' option of \'render\'. Defaults to all zoom '
+                   'levels.\n\0'
+              )
+@click.option('--seed', 'seed', type=int, default=0,
+              help='Seed to generate the trees with, defaults to 0.\n\0'
+              )
+@click.option('-r', '--repeat', 'repeat', type=int, default=1,
+              help='Number of times to run each stage, the fastest run is reported. Defaults to 1.\n\0'
+              )
+@click.option('-o', '--out', 'output_str', type=str, default='',
+              help='Path to the JSON file to write the results to; by default results are not saved.\n\0'
+              )
+@click.option('-b', '--baseline', 'baseline_str', type=str, default='',
+              help='Path to the JSON file with the results of an earlier run to compare against. The command fails if '
+                   'any stage is slower than in the baseline by more than the threshold.\n\0'
+              )
+@click.option('-t', '--threshold', 'threshold', type=float, default=0.2,
+              help='Allowed slowdown of a stage compared to the baseline, as a fraction of the baseline time. Defaults '
+                   'to 0.2, i.e 20%.\n\0'
+              )
+@click.option('--min-seconds', 'min_seconds', type=float, default=MIN_REGRESSION,
+              help='Slowdowns of at most this many seconds are not reported as regressions. Defaults to {}.\n\0'
+              .format(MIN_REGRESSION)
+              )
+@with_appcontext
+def bench_render(depths_str, zooms, seed, repeat, output_str, baseline_str, threshold, min_seconds):
+    """
+    Times the stages of rendering trees of different depths: generating the tree, saving and loading its branches,
+    building the spatial index, and assigning branches to tiles, drawing, encoding and writing the tiles of each zoom
+    level. Trees are generated with a fixed seed so that runs can be compared.
+    """
+    if repeat < 1:
+        raise click.BadParameter('repeat must be positive')
+
+    ren = Renderer()
+    depths = parse_range_list(depths_str, min=1, max=30)
+    zooms = parse_range_list(zooms, max=ren.max_zoom_level, min=0)
+
+    baseline = None
+    if baseline_str:
+        try:
+            baseline = load_results(baseline_str)
+        except FileNotFoundError:
+            raise click.BadParameter(r"file '{}' does not exist".format(os.path.abspath(baseline_str)))
+
+    results = run_benchmarks(depths, zooms, seed=seed, repeat=repeat)
+    if output_str:
+        save_results(results, output_str)
+        print('Saved results to {}'.format(os.path.abspath(output_str)))
+
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, threshold, min_seconds=min_seconds)
+        for key, old, new in regressions:
+            print('  {}: {:.3f}s -> {:.3f}s (+{:.3f}s)'.format(key, old, new, new - old))
+        if regressions:
+            raise click.ClickException('{} stage(s) regressed by more than {:.0f}%'.format(
+                len(regressions), threshold * 100
+            ))
+        print('No regressions compared to {}'.format(baseline_str))
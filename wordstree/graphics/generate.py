@@ -1,7 +1,10 @@
 import math
-import random
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Iterator
 
+import numpy as np
+
+from .arrays import BranchArray, join_branch_arrays
 from .branch import Branch
 from .util import Vec, radians, JSONifiable, create_file, open_file
 
@@ -14,6 +17,12 @@ BRANCH_ANGLE_DELTA = radians(10)
 BRANCH_ANGLES = (1, -1)
 MAX_BRANCH_LENGTH = 0.2
 MAX_CHILDREN = 2
+# seeds of trees are drawn from [0, MAX_SEED), so that they fit in an sqlite integer column
+MAX_SEED = 2 ** 63
+# depth of the layer below which every subtree is generated on its own, see `iter_layers()`
+SPLIT_DEPTH = 10
+# number of subtrees the layer at the split depth is divided into
+NUM_SUBTREES = 64
 
 
 def generate_root() -> Branch:
@@ -31,22 +40,112 @@ def generate_root() -> Branch:
     )
 
 
-def generate_branches(parent: Branch, index: int, layer: int) -> List[Branch]:
+def new_seed() -> int:
+    """
+    Returns a new random seed for a tree, see :func:`layer_rng`.
+    """
+    return int(np.random.default_rng().integers(MAX_SEED))
+
+
+def layer_rng(seed: int, depth: int, subtree: int = None) -> np.random.Generator:
+    """
+    Returns the random number generator layer `depth` of the tree with seed `seed` is generated with, or the part of the
+    layer in subtree `subtree` past the split depth, see :func:`iter_layers`. The state of the generator only depends on
+    its arguments, so any layer of a tree can be generated again from the layer above it, without generating the layers
+    before it with the same generator.
+
+    :param seed: seed of the tree, `None` for a generator seeded with fresh entropy
+    :param depth: depth of the layer to generate
+    :param subtree: number of the subtree to generate the layer of
+    :return: random number generator for the layer
     """
-    Generate the child branches given a parent branch.
+    if seed is None:
+        return np.random.default_rng()
+    if subtree is None:
+        return np.random.default_rng([seed, depth])
+    return np.random.default_rng([seed, depth, subtree])
+
+
+def _num_children(layer: int, size: int, rng: np.random.Generator = None) -> np.ndarray:
+    # number of child branches of each of `size` branches, at layer `layer` of the tree
+    if layer > 10:
+        if rng is None:
+            rng = np.random.default_rng()
+        return np.floor(np.maximum(0, rng.normal(0.5 - 0.5 * layer, 0.5, size)) + 0.5).astype(np.int64)
+    return np.full(size, MAX_CHILDREN, dtype=np.int64)
+
+
+def grow_layer(pos_x: np.ndarray, pos_y: np.ndarray, length: np.ndarray, width: np.ndarray, angle: np.ndarray,
+               layer: int, rng: np.random.Generator = None) -> Dict[str, np.ndarray]:
+    """
+    Generates the child branches of a whole layer of parent branches at once, the vectorized counterpart of calling
+    :func:`generate_branches` for each parent. Children are in the order of their parents.
+
+    :param pos_x: x-coordinates of the positions of the parent branches
+    :param pos_y: y-coordinates of the positions of the parent branches
+    :param length: lengths of the parent branches
+    :param width: widths of the parent branches
+    :param angle: angles of the parent branches
+    :param layer: layer of the child branches that are to be generated
+    :param rng: random number generator the number of children of each branch is drawn from past layer 10
+    :return: dictionary of the columns of the child branches, as expected by :class:`BranchArray`, where `parent` is
+        the position of the parent of each child in the given arrays
+    """
+    counts = _num_children(layer, len(pos_x), rng)
+    parent = np.repeat(np.arange(len(pos_x), dtype=np.int64), counts)
+    # position of each child among the children of its parent
+    first = np.cumsum(counts) - counts
+    nth = np.arange(len(parent), dtype=np.int64) - np.repeat(first, counts)
+
+    plength, pangle = length[parent], angle[parent]
+    return {
+        'pos_x': pos_x[parent] + np.cos(pangle) * plength,
+        'pos_y': pos_y[parent] + np.sin(pangle) * plength,
+        'length': np.minimum(plength, MAX_BRANCH_LENGTH) * BRANCH_LENGTH_SHRINK_FACTOR,
+        'width': width[parent] * BRANCH_WIDTH_SHRINK_FACTOR,
+        'angle': pangle + np.array(BRANCH_ANGLES, dtype=np.float64)[nth % len(BRANCH_ANGLES)] * math.pi / 2,
+        'depth': np.full(len(parent), layer, dtype=np.int32),
+        'parent': parent
+    }
+
+
+def _branch_list(columns: Dict[str, np.ndarray], index: int) -> List[Branch]:
+    # `Branch` objects of the branches in `columns`, as returned by `grow_layer()`, numbered from `index`
+    return [
+        Branch(index + k, Vec(x, y), depth=depth, length=length, width=width, angle=angle)
+        for k, (x, y, depth, length, width, angle) in enumerate(zip(
+            columns['pos_x'].tolist(), columns['pos_y'].tolist(), columns['depth'].tolist(),
+            columns['length'].tolist(), columns['width'].tolist(), columns['angle'].tolist()
+        ))
+    ]
+
+
+def _layer_columns(branches: List[Branch]) -> Dict[str, np.ndarray]:
+    # columns of the parent branches `branches`, as expected by `grow_layer()`
+    return {
+        'pos_x': np.array([branch.pos.x for branch in branches], dtype=np.float64),
+        'pos_y': np.array([branch.pos.y for branch in branches], dtype=np.float64),
+        'length': np.array([branch.length for branch in branches], dtype=np.float64),
+        'width': np.array([branch.width for branch in branches], dtype=np.float64),
+        'angle': np.array([branch.angle for branch in branches], dtype=np.float64)
+    }
+
+
+def generate_branches(parent: Branch, index: int, layer: int, rng: np.random.Generator = None) -> List[Branch]:
+    """
+    Generate the child branches given a parent branch. To generate the children of many branches at once, use
+    :func:`grow_layer`.
 
     :param parent: the :class:`Branch` object representing the parent branch
     :param index: index of the first child branch
     :param layer: layer of the child branches that are to be generated
+    :param rng: random number generator the number of children is drawn from past layer 10
     :return: a list of :class:`Branch` objects that have :param:`parent` as their parent branch.
     """
     if layer == 0:
         return [generate_root()]
 
-    if layer > 10:
-        num_branches = math.floor(max(0, random.gauss(0.5 - 0.5 * layer, 0.5)) + 0.5)
-    else:
-        num_branches = MAX_CHILDREN
+    num_branches = int(_num_children(layer, 1, rng)[0])
 
     nangles = len(BRANCH_ANGLES)
     branches = []
@@ -81,65 +180,186 @@ def generate_branches(parent: Branch, index: int, layer: int) -> List[Branch]:
     return branches
 
 
-def _create_branches(branches: List, max_layers=13):
-    begin, end, layer = -1, 0, 0
-    max_length = len(branches)
+def _root_layer() -> BranchArray:
+    root = generate_root()
+    return BranchArray(1, columns={
+        'pos_x': [root.pos.x], 'pos_y': [root.pos.y], 'length': [root.length], 'width': [root.width],
+        'angle': [root.angle], 'parent': [-1]
+    })
 
-    if max_length < 1:
-        return 0
 
-    # create root branch
-    branches[end] = generate_root()
-    begin += 1
-    end += 1
-    layer += 1
+def _split_subtrees(size: int) -> np.ndarray:
+    # number of the subtree of each of the `size` branches of the layer at the split depth, subtrees are contiguous
+    return np.arange(size, dtype=np.int64) * NUM_SUBTREES // size
 
-    layers = []
-    while layer < max_layers:
-        layers.append(begin)
 
-        layer_end = end
-        while begin < layer_end:
-            parent = branches[begin]
-            sub_branches = generate_branches(parent, end, layer)
+def _grow_subtrees(columns: Dict[str, np.ndarray], subtrees: np.ndarray, depth: int,
+                   seed: int) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    # grows the branches of each subtree in `columns` with the generator of the subtree, returns the columns of the
+    # children as `grow_layer()` does, and the subtree of each child
+    cuts = (np.flatnonzero(np.diff(subtrees)) + 1).tolist()
+    parts = []
+    for begin, end in zip([0] + cuts, cuts + [len(subtrees)]):
+        part = grow_layer(columns['pos_x'][begin:end], columns['pos_y'][begin:end], columns['length'][begin:end],
+                          columns['width'][begin:end], columns['angle'][begin:end], depth,
+                          layer_rng(seed, depth, int(subtrees[begin])))
+        part['parent'] += begin
+        parts.append(part)
+
+    children = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return children, subtrees[children['parent']]
+
+
+def iter_layers(max_depth=10, seed: int = None, split_depth: int = SPLIT_DEPTH) -> Iterator[BranchArray]:
+    """
+    Generates a tree one layer at a time, see :func:`grow_layer`, and yields a :class:`BranchArray` with the branches of
+    each layer, starting with the root. The `index` and `parent` columns of the branches are their indices in the whole
+    tree. Only the last layer is kept to generate the next one from, so a tree can be saved as it is generated with
+    memory bounded by its widest layer, e.g. by passing the layers to `branch_layers` of :meth:`Loader.save_branches`.
 
-            i, size = 0, len(sub_branches)
-            while i < size and end < max_length:
-                branches[end] = sub_branches[i]
-                i += 1
-                end += 1
-            begin += 1
+    The layer at depth `split_depth` is divided into :attr:`NUM_SUBTREES` subtrees, and each subtree is generated with
+    its own generator below it, so that subtrees can be generated independently, see :func:`generate_tree`.
 
-        if begin == end:
+    :param max_depth: maximum layers of branches to generate
+    :param seed: seed of the tree, each layer is generated with the generator returned by :func:`layer_rng`; trees
+        generated with the same seed and split depth are the same
+    :param split_depth: depth of the layer to divide into subtrees
+    :return: iterator of :class:`BranchArray` objects, one per layer
+    """
+    layer = _root_layer()
+    yield layer
+
+    subtrees = _split_subtrees(1) if split_depth == 0 else None
+    begin, end, depth = 0, 1, 1
+    while depth < max_depth:
+        columns = {name: getattr(layer, name) for name in ['pos_x', 'pos_y', 'length', 'width', 'angle']}
+        if subtrees is None:
+            children = grow_layer(**columns, layer=depth, rng=layer_rng(seed, depth))
+        else:
+            children, subtrees = _grow_subtrees(columns, subtrees, depth, seed)
+        size = len(children['parent'])
+        if size == 0:
             # no new branches were added
+            return
+
+        children['parent'] += begin
+        children['index'] = np.arange(end, end + size, dtype=np.int64)
+        layer = BranchArray(size, columns=children)
+        yield layer
+
+        if depth == split_depth:
+            subtrees = _split_subtrees(size)
+        begin, end, depth = end, end + size, depth + 1
+
+
+def _generate_subtree(columns: Dict[str, np.ndarray], subtree: int, depth: int, max_depth: int,
+                      seed: int) -> List[Dict[str, np.ndarray]]:
+    """
+    Generates the layers below the branches of subtree `subtree` at depth `depth - 1`, down to `max_depth`, in a worker
+    process of :func:`generate_tree`.
+
+    :return: list of the columns of each layer generated, as returned by :func:`grow_layer`, where `parent` is the
+        position of the parent of each branch in the layer before it within the subtree
+    """
+    subtrees = np.full(len(columns['pos_x']), subtree, dtype=np.int64)
+    layers = []
+    while depth < max_depth:
+        columns, subtrees = _grow_subtrees(columns, subtrees, depth, seed)
+        if len(subtrees) == 0:
+            break
+        layers.append(columns)
+        depth += 1
+    return layers
+
+
+def _parallel_layers(max_depth: int, seed: int, split_depth: int, workers: int) -> List[BranchArray]:
+    # same layers as `iter_layers()`, but the subtrees below the split depth are generated by `workers` processes
+    chunks = list(iter_layers(max_depth=min(max_depth, split_depth + 1), seed=seed, split_depth=split_depth))
+    if len(chunks) <= split_depth or max_depth <= split_depth + 1:
+        return chunks
+
+    split = chunks[-1]
+    subtrees = _split_subtrees(len(split))
+    cuts = (np.flatnonzero(np.diff(subtrees)) + 1).tolist()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_generate_subtree, {
+                name: getattr(split, name)[begin:end] for name in ['pos_x', 'pos_y', 'length', 'width', 'angle']
+            }, int(subtrees[begin]), split_depth + 1, max_depth, seed)
+            for begin, end in zip([0] + cuts, cuts + [len(split)])
+        ]
+        results = [future.result() for future in futures]
+
+    # merge layers of the subtrees in order of the subtrees, numbering branches across the whole tree
+    begin, end = int(split.index[0]), int(split.index[0]) + len(split)
+    # position of each subtree in the layer above the one being merged
+    offsets = [0] + cuts
+    for t in range(max_depth - split_depth - 1):
+        parts = [(layers[t], offset) for layers, offset in zip(results, offsets) if t < len(layers)]
+        if not parts:
             break
 
-        layer += 1
+        children = {name: np.concatenate([part[name] for part, _ in parts]) for name in parts[0][0]}
+        children['parent'] = np.concatenate([part['parent'] + begin + offset for part, offset in parts])
+        size = len(children['parent'])
+        children['index'] = np.arange(end, end + size, dtype=np.int64)
+        chunks.append(BranchArray(size, columns=children))
 
-    # return number of branches created
-    return layers, end
+        sizes = np.array([len(layers[t]['parent']) if t < len(layers) else 0 for layers in results])
+        offsets = (np.cumsum(sizes) - sizes).tolist()
+        begin, end = end, end + size
+    return chunks
 
 
-def generate_tree(max_depth=10) -> Tuple[List, List[int], int]:
+def generate_tree(max_depth=10, array=False, seed: int = None, workers: int = 1,
+                  split_depth: int = SPLIT_DEPTH) -> Tuple[List, List[int], int]:
     """
-    Generates and returns a list of :class:`Branch` objects representing a tree.
+    Generates and returns a list of :class:`Branch` objects representing a tree. The tree is generated a layer at a
+    time, see :func:`iter_layers`.
     :param max_depth: maximum layers of branches to generate
-    :return: a tuple consisting of the list of :class:`Branch` objects representing the tree, a list of indicies that
-        mark the beginning of each layer, and the number of branches created
+    :param array: if `True`, the branches are generated into a :class:`BranchArray` instead of a list, along with the
+        parent of each branch
+    :param seed: seed of the tree, see :func:`iter_layers`
+    :param workers: number of processes to generate the subtrees below the split depth with; the tree is the same for
+        any number of processes
+    :param split_depth: depth of the layer to divide into subtrees, see :func:`iter_layers`
+    :return: a tuple consisting of the list of :class:`Branch` objects (or :class:`BranchArray`) representing the tree,
+        a list of indicies that mark the beginning of each layer, and the number of branches created
     """
-    print('Generating new tree max_depth={} ...'.format(max_depth))
+    print('Generating new tree max_depth={} seed={} ...'.format(max_depth, seed))
 
-    branches = [None for i in range(2 ** max_depth + 1)]
-    layers, length = _create_branches(branches, max_layers=max_depth)
+    if workers > 1:
+        if seed is None:
+            # subtrees must be generated from the same seed in every process
+            seed = new_seed()
+        chunks = _parallel_layers(max_depth, seed, split_depth, workers)
+    else:
+        chunks = list(iter_layers(max_depth=max_depth, seed=seed, split_depth=split_depth))
+    layers, begin = [], 0
+    for chunk in chunks:
+        layers.append(begin)
+        begin += len(chunk)
+    if len(chunks) >= max_depth:
+        # beginning of the last layer is only listed if the tree stopped growing before reaching `max_depth`
+        layers.pop()
+
+    branches = join_branch_arrays(chunks)
+    length = len(branches)
+    if not array:
+        columns = {name: getattr(branches, name) for name in BranchArray.COLUMNS}
+        branches = _branch_list(columns, 0)
 
     print('  layers: {}'.format(layers))
     print('  number of branches: {}'.format(length))
     return branches, layers, length
 
 
-def generate_layer(branches: List[Branch], depth: int, begin: int, end=None) -> Tuple[List[Branch], int]:
+def generate_layer(branches: List[Branch], depth: int, begin: int, end=None,
+                   seed: int = None) -> Tuple[List[Branch], int]:
     """
     Generates and returns another layer of branches generated from the last layer of branches in :param:`branches`.
+    The subtrees of the branches are not known, so past the split depth the layer is generated with the generator of
+    the whole layer, and may differ from the same layer of a tree generated at once, see :func:`iter_layers`.
 
     :param branches: list of :class:`Branch` objects containing the layer of branches from which to generate the next
         layer.
@@ -148,29 +368,39 @@ def generate_layer(branches: List[Branch], depth: int, begin: int, end=None) ->
     :param begin: index in :param:`branches` containing the first branch of the layer.
     :param end: index that marks the end of the layer in :param:`branches` (item at `end-1` index in :param:`branches`
         should contain the last branch in the layer, if one exists.
+    :param seed: seed of the tree, the layer is generated with the generator returned by :func:`layer_rng`
     :return: a tuple consisting of the list of new branches created and the number of branches created
     """
     if not end:
         end = len(branches)
 
-    new_branches = []
-
     if depth == 0:
         # generate root
-        new_branches.append(generate_root())
-    else:
-        layer_end = end
-        # index of first child branch
-        index = branches[begin].index + end-begin
-
-        while begin < layer_end:
-            parent = branches[begin]
-            sub_branches = generate_branches(parent, index, depth)
+        return [generate_root()], 1
 
-            for j in range(len(sub_branches)):
-                new_branches.append(sub_branches[j])
-                index += 1
-                end += 1
-            begin += 1
+    # index of first child branch
+    index = branches[begin].index + end-begin
 
+    parents = _layer_columns([branches[k] for k in range(begin, end)])
+    children = grow_layer(parents['pos_x'], parents['pos_y'], parents['length'], parents['width'], parents['angle'],
+                          depth, layer_rng(seed, depth))
+    new_branches = _branch_list(children, index)
     return new_branches, len(new_branches)
+
+
+def regenerate_layer(seed: int, depth: int) -> BranchArray:
+    """
+    Returns the branches of layer `depth` of the tree generated with seed `seed`, see :func:`iter_layers`, without
+    keeping the layers above it in memory.
+
+    :param seed: seed of the tree
+    :param depth: depth of the layer
+    :return: :class:`BranchArray` with the branches of the layer, empty if the tree has no such layer
+    """
+    if seed is None:
+        raise Exception('seed must be provided to regenerate a layer')
+
+    for layer in iter_layers(max_depth=depth + 1, seed=seed):
+        if layer.depth[0] == depth:
+            return layer
+    return BranchArray()
@@ -0,0 +1,176 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+from .arrays import BranchArray
+from .branch import Branch
+from .util import Vec, Rect, bounds_intersect, rectangle_intersect, rectangles_intersect
+
+
+class BranchIndex:
+    """
+    Spatial index over the rectangles of the branches of a tree. The bounding box of the tree is divided into a uniform
+    grid of square buckets, and each branch is added to every bucket its axis-aligned bounding box overlaps. Queries
+    only consider branches in the buckets overlapped by the query rectangle, and check the bounding boxes of those
+    before the exact test with :func:`rectangle_intersect`.
+
+    A :class:`BranchArray` can be indexed as well, in which case the bounding boxes are computed for all the branches
+    at once, queries test the candidates of the buckets in a batch with :func:`rectangles_intersect`, and
+    :class:`Branch` objects are only created for the branches found.
+    """
+
+    MAX_CELLS = 256
+
+    def __init__(self, branches: List[Branch], num_branches: int = None, cells: int = None):
+        """
+        Build index over the first `num_branches` branches of `branches`.
+
+        :param branches: list of :class:`Branch` objects, or :class:`BranchArray`, to index
+        :param num_branches: number of branches in `branches` to index; defaults to `len(branches)`
+        :param cells: number of buckets along each side of the grid; if not provided, chosen from the number of
+            branches
+        """
+        if num_branches is None:
+            num_branches = len(branches)
+        if not cells:
+            cells = max(1, min(BranchIndex.MAX_CELLS, int(math.sqrt(num_branches))))
+
+        # corners, bounding boxes, angles and depths of the branches of an array, see `__query_array()`
+        self.__array = None
+        if isinstance(branches, BranchArray):
+            corners = branches.corners()[:num_branches]
+            bounds = np.concatenate((corners.min(axis=1), corners.max(axis=1)), axis=1)
+            self.__array = (corners, bounds, branches.angle[:num_branches], branches.depth[:num_branches])
+            self.__branches = branches
+            self.__bounds = [tuple(box) for box in bounds.tolist()]
+        else:
+            self.__branches = branches[:num_branches]
+            self.__bounds = [branch.rect.bounds for branch in self.__branches]
+        self.__num_branches = num_branches
+        self.__cells = cells
+
+        if num_branches > 0:
+            self.__min_x = min(b[0] for b in self.__bounds)
+            self.__min_y = min(b[1] for b in self.__bounds)
+            max_x = max(b[2] for b in self.__bounds)
+            max_y = max(b[3] for b in self.__bounds)
+        else:
+            self.__min_x, self.__min_y, max_x, max_y = 0, 0, 1, 1
+        self.__cell_dx = max(max_x - self.__min_x, 1e-9) / cells
+        self.__cell_dy = max(max_y - self.__min_y, 1e-9) / cells
+
+        self.__buckets = [[] for i in range(cells * cells)]
+        for k in range(num_branches):
+            col0, row0, col1, row1 = self.__cell_range(self.__bounds[k])
+            for row in range(row0, row1 + 1):
+                offset = row * cells
+                for col in range(col0, col1 + 1):
+                    self.__buckets[offset + col].append(k)
+
+    def __cell_range(self, bounds: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+        # returns (first column, first row, last column, last row) of the buckets overlapped by `bounds`, clamped to
+        # the grid
+        last = self.__cells - 1
+
+        def clamp(v):
+            return max(0, min(last, v))
+
+        col0 = clamp(math.floor((bounds[0] - self.__min_x) / self.__cell_dx))
+        row0 = clamp(math.floor((bounds[1] - self.__min_y) / self.__cell_dy))
+        col1 = clamp(math.floor((bounds[2] - self.__min_x) / self.__cell_dx))
+        row1 = clamp(math.floor((bounds[3] - self.__min_y) / self.__cell_dy))
+        return col0, row0, col1, row1
+
+    def query(self, rect: Rect, max_depth: int = None, exact: bool = True) -> List[Branch]:
+        """
+        Returns the branches whose rectangles intersect `rect`, in the order they were indexed.
+
+        :param rect: :class:`Rect` object representing the region to query
+        :param max_depth: if not `None`, branches deeper than `max_depth` are left out
+        :param exact: if `False`, only the bounding boxes of the branches are checked, so some of the branches returned
+            may not intersect `rect`
+        :return: list of :class:`Branch` objects intersecting `rect`
+        """
+        bounds = rect.bounds
+        col0, row0, col1, row1 = self.__cell_range(bounds)
+        cells = self.__cells
+
+        candidates = set()
+        for row in range(row0, row1 + 1):
+            offset = row * cells
+            for col in range(col0, col1 + 1):
+                candidates.update(self.__buckets[offset + col])
+
+        if self.__array is not None:
+            return self.__query_array(sorted(candidates), rect, max_depth, exact)
+
+        hits = []
+        for k in sorted(candidates):
+            if not bounds_intersect(bounds, self.__bounds[k]):
+                continue
+            branch = self.__branches[k]
+            if max_depth is not None and branch.depth > max_depth:
+                continue
+            if not exact or rectangle_intersect(rect, branch.rect):
+                hits.append(branch)
+        return hits
+
+    def hit(self, x: float, y: float, max_depth: int = None) -> List[Branch]:
+        """
+        Returns the branches whose rectangles contain the point (`x`, `y`), in the order they were indexed, see
+        :meth:`Branch.hit_test`. Only the branches of the bucket containing the point are tested.
+
+        :param x: x-coordinate of the point
+        :param y: y-coordinate of the point
+        :param max_depth: if not `None`, branches deeper than `max_depth` are left out
+        :return: list of :class:`Branch` objects containing the point
+        """
+        col, row, _, _ = self.__cell_range((x, y, x, y))
+
+        hits = []
+        for k in self.__buckets[row * self.__cells + col]:
+            bounds = self.__bounds[k]
+            if not (bounds[0] <= x <= bounds[2] and bounds[1] <= y <= bounds[3]):
+                continue
+            branch = self.__branches[k]
+            if max_depth is not None and branch.depth > max_depth:
+                continue
+            if branch.hit_test(x, y):
+                hits.append(branch)
+        return hits
+
+    def __query_array(self, candidates: List[int], rect: Rect, max_depth: int, exact: bool) -> List[Branch]:
+        # same as `query()` for the candidates of the buckets overlapped by `rect`, testing all of them at once against
+        # the columns of the indexed `BranchArray`
+        corners, bounds, angles, depths = self.__array
+        rows = np.array(candidates, dtype=np.int64)
+        min_x, min_y, max_x, max_y = rect.bounds
+
+        boxes = bounds[rows]
+        mask = (min_x <= boxes[:, 2]) & (boxes[:, 0] <= max_x) & (min_y <= boxes[:, 3]) & (boxes[:, 1] <= max_y)
+        if max_depth is not None:
+            mask &= depths[rows] <= max_depth
+        rows = rows[mask]
+        if exact and len(rows) > 0:
+            rows = rows[rectangles_intersect(rect, corners[rows], angles[rows])]
+        return [self.__branches[k] for k in rows.tolist()]
+
+    def query_tile(self, row: int, col: int, grid: int, max_depth: int = None, exact: bool = True) -> List[Branch]:
+        """
+        Returns the branches intersecting the tile at (`row`, `col`) of a `grid`x`grid` grid over the unit square, i.e
+        the grid of a zoom level.
+
+        :param row: zero-indexed row of the tile
+        :param col: zero-indexed column of the tile
+        :param grid: size of the square grid
+        :param max_depth: if not `None`, branches deeper than `max_depth` are left out
+        :param exact: see :meth:`query`
+        :return: list of :class:`Branch` objects intersecting the tile
+        """
+        dx = 1 / grid
+        return self.query(Rect(Vec(col * dx, row * dx), dx, dx), max_depth=max_depth, exact=exact)
+
+    @property
+    def num_branches(self) -> int:
+        return self.__num_branches
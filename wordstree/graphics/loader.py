@@ -1,4 +1,5 @@
 from typing import List
+from contextlib import nullcontext
 import time
 import json
 import os
@@ -8,8 +9,10 @@ import sqlite3
 
 from wordstree.db import get_db
 from .util import Vec, JSONifiable, create_file, open_file
+from .arrays import BranchArray, branch_array_from_json
 from .branch import Branch
-from .generate import generate_tree
+from .generate import generate_tree, new_seed
+from . import profile
 
 
 def _remove_file_ext(fname: str) -> str:
@@ -34,7 +37,12 @@ class Loader:
         pass
 
     def save_branches(self, **kwargs):
-        """Save branch information to storage(database, disk, etc)"""
+        """
+        Save branch information to storage(database, disk, etc). Branches are taken from the `branches` and
+        `num_branches` kwargs, or from the `branch_layers` kwarg, an iterable of :class:`BranchArray` objects such as
+        the one returned by :func:`iter_layers`, whose layers are saved one at a time as they are produced, or from
+        :attr:`branches` if neither is given.
+        """
         pass
 
     def save_tile_info(self, **kwargs):
@@ -45,6 +53,18 @@ class Loader:
         """Save information about zoom level (tile width, height, tree_id etc.)"""
         pass
 
+    def load_requested_tiles(self, **kwargs) -> List[tuple]:
+        """Returns `(row, col)` of the tiles of a zoom level requested by clients, most recently requested first"""
+        return []
+
+    def save_checkpoint(self, **kwargs):
+        """Save progress of rendering the tiles of a zoom level"""
+        pass
+
+    def load_checkpoint(self, **kwargs) -> dict:
+        """Returns progress of rendering the tiles of a zoom level saved with `save_checkpoint`, `None` if none"""
+        return None
+
     def save_branches_from_loader(self, loader):
         """same as `save_branches` but list of branches is retrieved from `loader.branches`"""
         pass
@@ -146,21 +166,40 @@ class DBLoader(Loader):
         self.__map = {}
 
     def load_branches(self, **kwargs):
+        """
+        Load branches of tree `tree_id` from the database, or generate a new tree if no `tree_id` is given.
+        :param tree_id: id of the entry in `tree` table to load
+        :param tree_name: name of the generated tree
+        :param max_depth: maximum layers of branches of the generated tree, defaults to `10`
+        :param seed: seed of the generated tree, see :func:`iter_layers`; a new one is drawn if not provided
+        :param workers: number of processes to generate the tree with, see :func:`generate_tree`; defaults to `1`
+        :param array: if `True`, the branches are loaded into a :class:`BranchArray` rather than a list of
+            :class:`Branch` objects; defaults to `False`
+        """
         tree_id = kwargs.get('tree_id', None)
         tree_name = kwargs.get('tree_name', None)
+        array = kwargs.get('array', False)
         new_tree = tree_id is None
 
         if new_tree:
             max_depth = kwargs.get('max_depth', 10)
-            self.__branches, self.__layers, self.__num_branches = generate_tree(max_depth=max_depth)
+            seed = kwargs.get('seed', None)
+            if seed is None:
+                seed = new_seed()
+            with profile.timer('generate'):
+                self.__branches, self.__layers, self.__num_branches = generate_tree(
+                    max_depth=max_depth, array=array, seed=seed, workers=kwargs.get('workers', 1)
+                )
             if tree_name:
                 self.__input_tree['tree_name'] = tree_name
             else:
                 self.__input_tree['tree_name'] = _get_default_tree_name()
+            self.__input_tree['seed'] = seed
             print('DB Loader')
             print(self.layers)
         else:
-            self.__read_all_branches(tree_id)
+            with profile.timer('load'):
+                self.__read_all_branches(tree_id, array=array)
 
         # empty map
         self.__map = {}
@@ -177,6 +216,11 @@ class DBLoader(Loader):
         :param img_dir: path to the directory containing the images of the tile
         :param json_dir: path to the directory containing the JSON files that contain list of branches
             contained in a tile
+        :param archive_file: path to the archive file containing the tiles, see :class:`TileArchiveWriter`; `None`
+            (default) if tiles are saved as separate files
+        :param resume: if `True`, an existing entry with the same zoom_level, tree_id and grid whose tiles were also
+            saved into an archive, or also saved as separate files, is updated in place and its tiles are kept, so that
+            rendering can resume from them; defaults to `False`
         :return:
         """
         req_args = ['tree_id', 'zoom_level', 'grid', 'tile_size', 'img_size', 'img_dir', 'json_dir']
@@ -194,12 +238,29 @@ class DBLoader(Loader):
         img_width, img_height = kwargs['img_size']
         img_dir = kwargs['img_dir']
         json_dir = kwargs['json_dir']
+        archive_file = kwargs.get('archive_file', None)
+        resume = kwargs.get('resume', False)
 
-        with self.app.app_context():
+        with self.app.app_context(), profile.timer('db_write', zoom=zoom_level):
             db = get_db()
             cur = db.cursor()
-            cur.execute('SELECT zoom_id FROM zoom_info WHERE zoom_level=? AND tree_id=?', [zoom_level, tree_id])
+            cur.execute('SELECT zoom_id, grid, archive_file FROM zoom_info WHERE zoom_level=? AND tree_id=?',
+                        [zoom_level, tree_id])
             res = cur.fetchone()
+            # tiles packed into an archive point to the archive file, they cannot be kept as separate files or the
+            # other way around
+            same_mode = res is not None and (res['archive_file'] is None) == (archive_file is None)
+            if res is not None and resume and res['grid'] == grid and same_mode:
+                cur.execute(
+                    'UPDATE zoom_info SET tile_width=?, tile_height=?, image_width=?, image_height=?, imgs_path=?, '
+                    'jsons_path=?, archive_file=? WHERE zoom_id=?',
+                    [tile_width, tile_height, img_width, img_height, img_dir, json_dir, archive_file, res['zoom_id']]
+                )
+                self.__map[(tree_id, zoom_level)] = res['zoom_id']
+                db.commit()
+                print('  Kept zoom level {} and its tiles to resume rendering'.format(zoom_level))
+                return
+
             if res is not None:
                 # drop existing entry with same zoom_level and tree_id
                 cur.execute('SELECT tile_id FROM tiles WHERE "zoom_id"=?', [res['zoom_id']])
@@ -210,8 +271,9 @@ class DBLoader(Loader):
 
             cur.execute(
                 'INSERT INTO zoom_info (zoom_level, tree_id, grid, tile_width, tile_height, image_width, image_height,'
-                ' imgs_path, jsons_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                [zoom_level, tree_id, grid, tile_width, tile_height, img_width, img_height, img_dir, json_dir]
+                ' imgs_path, jsons_path, archive_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [zoom_level, tree_id, grid, tile_width, tile_height, img_width, img_height, img_dir, json_dir,
+                 archive_file]
             )
             cur.execute('SELECT last_insert_rowid();')
             zoom_id = cur.fetchone()[0]
@@ -236,6 +298,10 @@ class DBLoader(Loader):
             respectively
         :param tile_position: tuple `(x, y)` of the position of the top-left corner of the tile in the full rendering
             of the tree
+        :param num_bytes: total size in bytes of the image and JSON file of the tile, defaults to `0`
+        :param content_hash: hash of the contents of the image and JSON file of the tile, defaults to `None`
+        :param tree_version: version of the branches the tile was rendered from, see :meth:`Renderer.tree_version`,
+            defaults to `None`
         """
         req_args = ['tree_id', 'zoom_level', 'tile_index',  'grid_location', 'tile_position']
         if not kwargs.get('tree_id', None):
@@ -252,8 +318,11 @@ class DBLoader(Loader):
         index = kwargs['tile_index']
         row, col = kwargs['grid_location']
         x, y = kwargs['tile_position']
+        num_bytes = kwargs.get('num_bytes', 0)
+        content_hash = kwargs.get('content_hash', None)
+        tree_version = kwargs.get('tree_version', None)
 
-        with self.app.app_context():
+        with self.app.app_context(), profile.timer('db_write', zoom=zoom_level):
             db = get_db()
             cur = db.cursor()
 
@@ -261,7 +330,7 @@ class DBLoader(Loader):
             if zoom_id is None:
                 cur.execute('SELECT zoom_id FROM zoom_info WHERE zoom_level=? AND tree_id=?', [zoom_level, tree_id])
                 result = cur.fetchone()
-                if len(result) == 0:
+                if result is None:
                     raise Exception('tree-id {}, zoom level {} information not added to zoom_info table'
                                     .format(tree_id, zoom_level))
                 else:
@@ -277,18 +346,140 @@ class DBLoader(Loader):
             if res is None:
                 cur.execute(
                     'INSERT INTO tiles (tile_index, zoom_id, img_file, json_file, tile_col, tile_row, tile_pos_x, '
-                    'tile_pos_y) VALUES (?,?,?,?,?,?,?,?)',
-                    [index, zoom_id, img_path, json_path, col, row, x, y]
+                    'tile_pos_y, num_bytes, content_hash, tree_version) VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                    [index, zoom_id, img_path, json_path, col, row, x, y, num_bytes, content_hash, tree_version]
                 )
             else:
                 cur.execute(
                     'UPDATE tiles SET img_file=?, json_file=?, tile_col=?, tile_row=?, tile_pos_x=?,'
-                    ' tile_pos_y=? WHERE tile_id=?;',
-                    [img_path, json_path, col, row, x, y, res['tile_id']]
+                    ' tile_pos_y=?, num_bytes=?, content_hash=?, tree_version=? WHERE tile_id=?;',
+                    [img_path, json_path, col, row, x, y, num_bytes, content_hash, tree_version, res['tile_id']]
                 )
 
             db.commit()
 
+    def load_zoom_levels(self, tree_id=None) -> List[int]:
+        """
+        Returns the zoom levels the tree has been rendered at, i.e the zoom levels of its entries in `zoom_info` table.
+        :param tree_id: id of the entry in `tree` table; defaults to the tree most recently loaded
+        :return: sorted list of zoom levels
+        """
+        if tree_id is None:
+            tree_id = self.input_tree('tree_id')
+
+        with self.app.app_context():
+            cur = get_db().cursor()
+            cur.execute('SELECT zoom_level FROM zoom_info WHERE tree_id=? ORDER BY zoom_level ASC', [tree_id])
+            return [row['zoom_level'] for row in cur.fetchall()]
+
+    def load_requested_tiles(self, **kwargs) -> List[tuple]:
+        """
+        Returns the tiles of a zoom level that have been requested by clients, i.e the entries in `tiles` table with a
+        `last_access` time, see :func:`tile_service.touch`.
+        :param tree_id: id of the entry in `tree` table; defaults to the tree most recently saved
+        :param zoom_level: level of zoom
+        :return: list of `(row, col)` of the tiles, most recently requested first
+        """
+        tree_id = kwargs.get('tree_id', None)
+        if tree_id is None:
+            tree_id = self.output_tree('tree_id')
+        zoom_level = kwargs['zoom_level']
+
+        with self.app.app_context():
+            cur = get_db().cursor()
+            cur.execute('SELECT tile_row, tile_col FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id '
+                        'WHERE tree_id=? AND zoom_level=? AND last_access>0 ORDER BY last_access DESC',
+                        [tree_id, zoom_level])
+            return [(row['tile_row'], row['tile_col']) for row in cur.fetchall()]
+
+    def save_checkpoint(self, **kwargs):
+        """
+        Save the progress of rendering the tiles of a zoom level to `render_checkpoints` table, replacing any progress
+        saved before. Zoom level information must have been saved before, see :meth:`save_zoom_info`.
+        :param tree_id: id of the entry in `tree` table; defaults to the tree most recently saved
+        :param zoom_level: level of zoom
+        :param tree_version: version of the branches the tiles are rendered from, see :meth:`Renderer.tree_version`
+        :param num_tiles: number of tiles of the zoom level
+        :param tiles_done: number of tiles rendered so far
+        :param finished: whether every tile of the zoom level has been rendered, defaults to `False`
+        """
+        tree_id = kwargs.get('tree_id', None)
+        if tree_id is None:
+            tree_id = self.output_tree('tree_id')
+        zoom_level = kwargs['zoom_level']
+
+        with self.app.app_context(), profile.timer('db_write', zoom=zoom_level):
+            db = get_db()
+            cur = db.cursor()
+            cur.execute('SELECT zoom_id FROM zoom_info WHERE zoom_level=? AND tree_id=?', [zoom_level, tree_id])
+            res = cur.fetchone()
+            if res is None:
+                raise Exception('tree-id {}, zoom level {} information not added to zoom_info table'
+                                .format(tree_id, zoom_level))
+
+            cur.execute(
+                'INSERT OR REPLACE INTO render_checkpoints (zoom_id, tree_version, num_tiles, tiles_done, finished, '
+                'updated) VALUES (?, ?, ?, ?, ?, ?)',
+                [res['zoom_id'], kwargs['tree_version'], kwargs.get('num_tiles', 0), kwargs.get('tiles_done', 0),
+                 1 if kwargs.get('finished', False) else 0, time.time()]
+            )
+            db.commit()
+
+    def load_checkpoint(self, **kwargs) -> dict:
+        """
+        Returns the progress of rendering the tiles of a zoom level saved with :meth:`save_checkpoint`, along with the
+        tiles already rendered from the given version of the branches.
+        :param tree_id: id of the entry in `tree` table; defaults to the tree most recently saved
+        :param zoom_level: level of zoom
+        :param tree_version: version of the branches, see :meth:`Renderer.tree_version`
+        :return: dictionary with the `tree_version`, `num_tiles`, `tiles_done` and `finished` values of the checkpoint,
+            and under `tiles` a dictionary of `(img_file, json_file)` of the tiles rendered from `tree_version`, keyed
+            by tile index; `None` if no progress has been saved
+        """
+        tree_id = kwargs.get('tree_id', None)
+        if tree_id is None:
+            tree_id = self.output_tree('tree_id')
+        zoom_level = kwargs['zoom_level']
+
+        with self.app.app_context():
+            cur = get_db().cursor()
+            cur.execute('SELECT rc.* FROM render_checkpoints rc INNER JOIN zoom_info zi ON rc.zoom_id = zi.zoom_id '
+                        'WHERE tree_id=? AND zoom_level=?', [tree_id, zoom_level])
+            res = cur.fetchone()
+            if res is None:
+                return None
+
+            cur.execute('SELECT tile_index, img_file, json_file FROM tiles WHERE zoom_id=? AND tree_version=?',
+                        [res['zoom_id'], kwargs['tree_version']])
+            tiles = {tile['tile_index']: (tile['img_file'], tile['json_file']) for tile in cur.fetchall()}
+
+        return {
+            'tree_version': res['tree_version'],
+            'num_tiles': res['num_tiles'],
+            'tiles_done': res['tiles_done'],
+            'finished': bool(res['finished']),
+            'tiles': tiles
+        }
+
+    def load_branch_indices(self, branch_ids: List[int], tree_id=None) -> List[int]:
+        """
+        Returns the indices (`ind` column) of the entries in `branches` table with the given ids. Ids of branches that
+        do not belong to the tree are ignored.
+        :param branch_ids: values of `id` column of entries in `branches` table
+        :param tree_id: id of the entry in `tree` table; defaults to the tree most recently loaded
+        :return: sorted list of branch indices
+        """
+        if tree_id is None:
+            tree_id = self.input_tree('tree_id')
+        if not branch_ids:
+            return []
+
+        with self.app.app_context():
+            cur = get_db().cursor()
+            cur.execute('SELECT ind FROM branches WHERE tree_id=? AND id IN ({}) ORDER BY ind ASC'
+                        .format(', '.join('?' * len(branch_ids))), [tree_id] + list(branch_ids))
+            return [row['ind'] for row in cur.fetchall()]
+
     def update_branches(self, tree_id, **kwargs):
         """
         Update branch entries with tree-id `tree-id` with information in contained is the list of :class:`Branch`
@@ -315,6 +506,7 @@ class DBLoader(Loader):
                 `available_for_purchase` `bool`  `False`
                 `available_for_bid`      `bool`  `True`
 
+        :param seed: if not `None`, set as the seed of the tree
         :param kwargs: additional options
         :return:
         """
@@ -336,6 +528,10 @@ class DBLoader(Loader):
             if res is None:
                 raise Exception('entry with tree-id \'{}\' does not exist'.format(tree_id))
 
+            seed = kwargs.get('seed', None)
+            if seed is not None:
+                cur.execute('UPDATE tree SET seed=? WHERE tree_id=?', [seed, tree_id])
+
             print('\nUpdating branches with tree-id \'{}\' ...'.format(tree_id))
             updated, inserted = 0, 0
             for i in range(num_branches):
@@ -397,19 +593,23 @@ class DBLoader(Loader):
         full_width = kwargs.get('width', 0)
         full_height = kwargs.get('height', 0)
         tree_name = kwargs.get('tree_name', None)
+        seed = kwargs.get('seed', None)
         # for formatting
         newline = True
 
-        # use self.branches if branches kwarg not provided
+        # use self.branches if neither branches nor branch_layers kwarg provided
         branches, num_branches = kwargs.get('branches', None), kwargs.get('num_branches', None)
-        if branches is None:
+        branch_layers = kwargs.get('branch_layers', None)
+        if branch_layers is None and branches is None:
             branches = self.branches
             num_branches = self.num_branches
-        elif not num_branches:
+        elif branch_layers is None and not num_branches:
             # branches kwarg provided but no num_branches provided
             raise Exception('num_branches not provided')
 
-        with self.app.app_context():
+        # layers are produced while they are saved, so only their inserts are timed, see `__add_branch_layers()`
+        write_timer = nullcontext() if branch_layers is not None else profile.timer('db_write')
+        with self.app.app_context(), write_timer:
             db = get_db()
             cur = db.cursor()
 
@@ -440,13 +640,13 @@ class DBLoader(Loader):
                 elif not tree_name:
                     tree_name = _get_default_tree_name()
 
-                cur.execute('INSERT INTO tree (tree_id, tree_name, full_width, full_height) '
-                            'VALUES (?, ?, ?, ?)', [tree_id, tree_name, full_width, full_height])
+                cur.execute('INSERT INTO tree (tree_id, tree_name, full_width, full_height, seed) '
+                            'VALUES (?, ?, ?, ?, ?)', [tree_id, tree_name, full_width, full_height, seed])
             else:
                 if not tree_name:
                     tree_name = _get_default_tree_name()
-                cur.execute('INSERT INTO tree (tree_name, full_width, full_height) VALUES (?, ?, ?)',
-                            [tree_name, full_width, full_height])
+                cur.execute('INSERT INTO tree (tree_name, full_width, full_height, seed) VALUES (?, ?, ?, ?)',
+                            [tree_name, full_width, full_height, seed])
 
             cur.execute('SELECT last_insert_rowid()')
             rowid = cur.fetchone()[0]
@@ -457,19 +657,25 @@ class DBLoader(Loader):
 
             self.__output_tree['tree_name'] = tree_name
             self.__output_tree['tree_id'] = tree_id
-            self.__add_all_branches(cur, rowid, branches=branches, num_branches=num_branches)
-            db.commit()
+            self.__output_tree['seed'] = seed
+            if branch_layers is not None:
+                self.__add_branch_layers(cur, rowid, branch_layers)
+                with profile.timer('db_write'):
+                    db.commit()
+            else:
+                self.__add_all_branches(cur, rowid, branches=branches, num_branches=num_branches)
+                db.commit()
 
-    def __read_all_branches(self, tree_id: int):
+    def __read_all_branches(self, tree_id: int, array: bool = False):
         with self.app.app_context():
             db = get_db()
             cur = db.cursor()
 
-            cur.execute('SELECT tree_name FROM tree WHERE tree_id=?', [tree_id])
+            cur.execute('SELECT tree_name, seed FROM tree WHERE tree_id=?', [tree_id])
             res = cur.fetchone()
             if res is None:
                 raise Exception('entry with tree_id={} does not exist'.format(tree_id))
-            tree_name = res[0]
+            tree_name, seed = res['tree_name'], res['seed']
 
             print('Reading branches from tree \'{}\', tree_id={} ...'.format(tree_name, tree_id))
 
@@ -479,8 +685,19 @@ class DBLoader(Loader):
 
         if results is None or len(results) == 0:
             num_branches = 0
-            branches = []
+            branches = BranchArray() if array else []
             layers = []
+        elif array:
+            num_branches = len(results)
+            branches = BranchArray(num_branches, columns={
+                'pos_x': [row['pos_x'] for row in results],
+                'pos_y': [row['pos_y'] for row in results],
+                'length': [row['length'] for row in results],
+                'width': [row['width'] for row in results],
+                'angle': [row['angle'] for row in results],
+                'depth': [row['depth'] for row in results]
+            }, texts={i: row['text'] for i, row in enumerate(results) if row['text']})
+            layers = branches.layers()
         else:
             num_branches = len(results)
             branches = [None for i in range(num_branches)]
@@ -507,6 +724,7 @@ class DBLoader(Loader):
         self.__layers = layers
         self.__input_tree['tree_name'] = tree_name
         self.__input_tree['tree_id'] = tree_id
+        self.__input_tree['seed'] = seed
 
     def __add_all_branches(self, cur: sqlite3.Connection.cursor, tree_id: int, branches=None, num_branches=None):
         if branches is not None:
@@ -525,6 +743,20 @@ class DBLoader(Loader):
                         [i, branch.depth, branch.length, branch.width, branch.angle,
                          branch.pos.x, branch.pos.y, tree_id])
 
+    def __add_branch_layers(self, cur: sqlite3.Connection.cursor, tree_id: int, branch_layers):
+        # inserts the branches of each `BranchArray` of `branch_layers` as it is produced, so only one layer has to be
+        # held in memory at a time
+        total = 0
+        for layer in branch_layers:
+            with profile.timer('db_write'):
+                cur.executemany('INSERT INTO branches ("ind", depth, length, width, angle, pos_x, pos_y, tree_id)'
+                                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                zip(layer.index.tolist(), layer.depth.tolist(), layer.length.tolist(),
+                                    layer.width.tolist(), layer.angle.tolist(), layer.pos_x.tolist(),
+                                    layer.pos_y.tolist(), [tree_id] * len(layer)))
+            total += len(layer)
+            print('  added layer of {} branches, {} total'.format(len(layer), total))
+
     @property
     def app(self):
         return self.__app
@@ -560,70 +792,115 @@ class FileLoader(Loader):
         self.__output_tree = dict()
 
     def load_branches(self, **kwargs):
+        """
+        Load branches of a tree from a JSON file saved with :meth:`save_branches`, or generate a new tree if no file is
+        given.
+        :param file: path of the file to load, relative to the cache directory
+        :param tree_name: name of the generated tree
+        :param max_depth: maximum layers of branches of the generated tree, defaults to `10`
+        :param seed: seed of the generated tree, see :func:`iter_layers`; a new one is drawn if not provided
+        :param workers: number of processes to generate the tree with, see :func:`generate_tree`; defaults to `1`
+        :param array: if `True`, the branches are loaded into a :class:`BranchArray` rather than a list of
+            :class:`Branch` objects; defaults to `False`
+        """
         file = kwargs.get('file', None)
         new_tree = file is None
         tree_name = kwargs.get('tree_name', None)
+        array = kwargs.get('array', False)
 
         if new_tree:
             max_depth = kwargs.get('max_depth', 10)
-            self.__branches, self.__layers, self.__num_branches = generate_tree(max_depth=max_depth)
+            seed = kwargs.get('seed', None)
+            if seed is None:
+                seed = new_seed()
+            with profile.timer('generate'):
+                self.__branches, self.__layers, self.__num_branches = generate_tree(
+                    max_depth=max_depth, array=array, seed=seed, workers=kwargs.get('workers', 1)
+                )
+            self.__input_tree['seed'] = seed
             if not tree_name:
                 self.__input_tree['tree_name'] = _get_default_tree_name()
             else:
                 self.__input_tree['tree_name'] = tree_name
         else:
-            self.__read_branches(file)
+            with profile.timer('load'):
+                self.__read_branches(file, array=array)
 
     def save_branches(self, **kwargs):
         tree_name = kwargs.get('tree_name', _get_default_tree_name())
         fname = kwargs.get('file', 'default_tree')
+        seed = kwargs.get('seed', None)
 
-        # use self.branches if branches kwarg not provided
+        # use self.branches if neither branches nor branch_layers kwarg provided
         branches, num_branches = kwargs.get('branches', None), kwargs.get('num_branches', None)
-        if branches is None:
+        branch_layers = kwargs.get('branch_layers', None)
+        if branch_layers is None and branches is None:
             branches = self.branches
             num_branches = self.num_branches
-        elif not num_branches:
+        elif branch_layers is None and not num_branches:
             # branches kwarg provided but no num_branches provided
             raise Exception('num_branches not provided')
 
         stream = create_file(fname, relative=current_app.config['CACHE_DIR'])
 
-        with stream as file:
+        # layers are produced while they are saved, so only the writes of each layer are timed
+        write_timer = nullcontext() if branch_layers is not None else profile.timer('file_write')
+        with stream as file, write_timer:
             head, tail = os.path.split(file.name)
             print('Saving branches to {} ...'.format(tail))
-            json.dump(
-                {
-                    'name': tree_name,
-                    'branches': branches[:num_branches]
-                }, file, cls=BranchJSONEncoder
-            )
+            if branch_layers is not None:
+                # same JSON as below, written a branch at a time
+                file.write('{{"name": {}, "seed": {}, "branches": ['.format(json.dumps(tree_name), json.dumps(seed)))
+                separator = ''
+                for layer in branch_layers:
+                    with profile.timer('file_write'):
+                        for branch in layer:
+                            file.write(separator)
+                            json.dump(branch, file, cls=BranchJSONEncoder)
+                            separator = ', '
+                file.write(']}')
+            else:
+                json.dump(
+                    {
+                        'name': tree_name,
+                        'seed': seed,
+                        'branches': branches[:num_branches]
+                    }, file, cls=BranchJSONEncoder
+                )
         self.__output_tree['tree_name'] = tree_name
+        self.__output_tree['seed'] = seed
 
-    def __read_branches(self, fpath):
+    def __read_branches(self, fpath, array: bool = False):
         stream = open_file(fpath, relative=current_app.config['CACHE_DIR'])
 
         with stream as file:
             head, tail = os.path.split(file.name)
             print('Reading branches from {} ...'.format(tail))
-            tree = json.load(file, object_hook=_as_obj_hook)
+            tree = json.load(file, object_hook=None if array else _as_obj_hook)
 
         branches = tree['branches']
         tree_name = tree['name']
+        if array:
+            branches = branch_array_from_json(branches)
         self.__input_tree['tree_name'] = tree_name
+        self.__input_tree['seed'] = tree.get('seed', None)
         self.__input_tree['file'] = file
         self.__branches = branches
         self.__num_branches = len(branches)
 
-        layers = []
-        prev, size = -1, self.__num_branches
-        for i in range(size):
-            branch = branches[i]
-            if prev < branch.depth:
-                layers.append(i)
-                prev = branch.depth
-            elif prev > branch.depth:
-                raise Exception('branches not in order')
+        size = self.__num_branches
+        if array:
+            layers = branches.layers()
+        else:
+            layers = []
+            prev = -1
+            for i in range(size):
+                branch = branches[i]
+                if prev < branch.depth:
+                    layers.append(i)
+                    prev = branch.depth
+                elif prev > branch.depth:
+                    raise Exception('branches not in order')
         self.__layers = layers
 
         print('Read tree \'{}\' with {:d} branches, {:d} layers :\n   {} ...'
@@ -0,0 +1,170 @@
+import math
+from typing import List, Tuple
+
+from .branch import Branch
+from .generate import generate_root, BRANCH_ANGLES, BRANCH_LENGTH_SHRINK_FACTOR, BRANCH_WIDTH_SHRINK_FACTOR, \
+    MAX_BRANCH_LENGTH, MAX_CHILDREN
+from .util import Vec, Rect, bounds_intersect, rectangle_intersect
+
+# deepest layer of a generated tree that is always full, every branch above it has `MAX_CHILDREN` children and no
+# randomness is involved, see `_num_children()` of the `generate` module
+MAX_DEPTH = 10
+
+
+def layer_begin(depth: int) -> int:
+    """
+    Returns the index of the first branch of layer `depth` of a full tree.
+    """
+    if MAX_CHILDREN == 1:
+        return depth
+    return (MAX_CHILDREN ** depth - 1) // (MAX_CHILDREN - 1)
+
+
+def branch_depth(index: int) -> int:
+    """
+    Returns the depth of the branch with index `index` of a full tree.
+    """
+    depth = 0
+    while layer_begin(depth + 1) <= index:
+        depth += 1
+    return depth
+
+
+def _check_index(index: int):
+    if not 0 <= index < layer_begin(MAX_DEPTH + 1):
+        raise IndexError('branch {} is not in the layers up to depth {}'.format(index, MAX_DEPTH))
+
+
+def branch_geometry(index: int) -> Tuple[float, float, float, float, float, int]:
+    """
+    Computes the geometry of the branch with index `index` of a generated tree from the index alone, by following the
+    path from the root to the branch, in O(depth). The result is the same as for the branch generated by
+    :func:`generate_tree`, for branches in the layers up to :attr:`MAX_DEPTH`.
+
+    :param index: index of the branch
+    :return: tuple of the x and y-coordinates of the position, the length, width, angle and depth of the branch
+    """
+    _check_index(index)
+
+    # position of each branch on the path among the children of its parent, from the root down
+    path = []
+    while index > 0:
+        path.append((index - 1) % MAX_CHILDREN)
+        index = (index - 1) // MAX_CHILDREN
+    path.reverse()
+
+    root = generate_root()
+    x, y, length, width, angle = root.pos.x, root.pos.y, root.length, root.width, root.angle
+    for nth in path:
+        # same steps as `grow_layer()`
+        x, y = x + math.cos(angle) * length, y + math.sin(angle) * length
+        length = min(length, MAX_BRANCH_LENGTH) * BRANCH_LENGTH_SHRINK_FACTOR
+        width = width * BRANCH_WIDTH_SHRINK_FACTOR
+        angle = angle + BRANCH_ANGLES[nth % len(BRANCH_ANGLES)] * math.pi / 2
+    return x, y, length, width, angle, len(path)
+
+
+def procedural_branch(index: int, text: str = '') -> Branch:
+    """
+    Returns a new :class:`Branch` object for the branch with index `index`, see :func:`branch_geometry`.
+    """
+    x, y, length, width, angle, depth = branch_geometry(index)
+    return Branch(index, Vec(x, y), depth=depth, length=length, width=width, angle=angle, text=text)
+
+
+class ProceduralTree:
+    """
+    The layers of a generated tree up to :attr:`MAX_DEPTH`, whose branches are computed from their indices instead of
+    being stored, see :func:`branch_geometry`. Offers the queries of :class:`BranchIndex` without materializing the
+    tree: branches are visited from the root down, and the subtree of a branch is skipped when the disc it is contained
+    in does not overlap the query rectangle.
+    """
+
+    def __init__(self, max_depth: int = MAX_DEPTH):
+        """
+        :param max_depth: depth of the deepest layer of the tree, at most :attr:`MAX_DEPTH`
+        """
+        if not 0 <= max_depth <= MAX_DEPTH:
+            raise Exception('max_depth must be between 0 and {}'.format(MAX_DEPTH))
+        self.__max_depth = max_depth
+
+        # every branch of a layer has the same length and width
+        root = generate_root()
+        self.__lengths, self.__widths = [root.length], [root.width]
+        for depth in range(max_depth):
+            self.__lengths.append(min(self.__lengths[-1], MAX_BRANCH_LENGTH) * BRANCH_LENGTH_SHRINK_FACTOR)
+            self.__widths.append(self.__widths[-1] * BRANCH_WIDTH_SHRINK_FACTOR)
+
+        # distance from the end of a branch at each depth that any point of the branches below it can be at: the sum of
+        # the lengths of the branches on a path down to the deepest layer, plus half the widest of those branches
+        self.__reach = [0.0] * (max_depth + 1)
+        for depth in range(max_depth - 1, -1, -1):
+            self.__reach[depth] = sum(self.__lengths[depth + 1:]) + self.__widths[depth + 1] / 2
+
+    def query(self, rect: Rect, max_depth: int = None, exact: bool = True) -> List[Branch]:
+        """
+        Returns the branches whose rectangles intersect `rect`, in the order of their indices, see
+        :meth:`BranchIndex.query`.
+
+        :param rect: :class:`Rect` object representing the region to query
+        :param max_depth: if not `None`, branches deeper than `max_depth` are left out
+        :param exact: if `False`, only the bounding boxes of the branches are checked
+        :return: list of :class:`Branch` objects intersecting `rect`
+        """
+        if max_depth is None or max_depth > self.__max_depth:
+            max_depth = self.__max_depth
+        min_x, min_y, max_x, max_y = bounds = rect.bounds
+
+        root = generate_root()
+        hits = []
+        # (index, x, y, angle, depth) of the branches left to visit
+        stack = [(0, root.pos.x, root.pos.y, root.angle, 0)]
+        while stack:
+            index, x, y, angle, depth = stack.pop()
+            length, width = self.__lengths[depth], self.__widths[depth]
+
+            branch = Branch(index, Vec(x, y), depth=depth, length=length, width=width, angle=angle)
+            if bounds_intersect(bounds, branch.rect.bounds) and (not exact or rectangle_intersect(rect, branch.rect)):
+                hits.append(branch)
+
+            if depth >= max_depth:
+                continue
+            # skip the subtree if the disc around the end of the branch containing it misses `rect`
+            end_x, end_y = x + math.cos(angle) * length, y + math.sin(angle) * length
+            dx = max(min_x - end_x, 0, end_x - max_x)
+            dy = max(min_y - end_y, 0, end_y - max_y)
+            reach = self.__reach[depth]
+            if dx * dx + dy * dy > reach * reach:
+                continue
+
+            first = index * MAX_CHILDREN + 1
+            for nth in range(MAX_CHILDREN):
+                stack.append((first + nth, end_x, end_y,
+                              angle + BRANCH_ANGLES[nth % len(BRANCH_ANGLES)] * math.pi / 2, depth + 1))
+
+        hits.sort(key=lambda b: b.index)
+        return hits
+
+    def query_tile(self, row: int, col: int, grid: int, max_depth: int = None, exact: bool = True) -> List[Branch]:
+        """
+        Returns the branches intersecting the tile at (`row`, `col`) of a `grid`x`grid` grid over the unit square, see
+        :meth:`BranchIndex.query_tile`.
+        """
+        dx = 1 / grid
+        return self.query(Rect(Vec(col * dx, row * dx), dx, dx), max_depth=max_depth, exact=exact)
+
+    def hit(self, x: float, y: float, max_depth: int = None) -> List[Branch]:
+        """
+        Returns the branches whose rectangles contain the point (`x`, `y`), in the order of their indices, see
+        :meth:`BranchIndex.hit`.
+        """
+        candidates = self.query(Rect(Vec(x, y), 0, 0), max_depth=max_depth, exact=False)
+        return [branch for branch in candidates if branch.hit_test(x, y)]
+
+    @property
+    def max_depth(self) -> int:
+        return self.__max_depth
+
+    @property
+    def num_branches(self) -> int:
+        return layer_begin(self.__max_depth + 1)
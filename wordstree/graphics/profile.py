@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# the profiler stages of rendering are recorded to as `active`, per thread, so that a profiled render does not record
+# the stages of tiles rendered on request by other threads of the same process; not set when not profiling
+__local = threading.local()
+
+
+class Profiler:
+    """
+    Collects named timers and counters of the stages of rendering a tree. Timers accumulate the total time and number of
+    calls of a stage, counters accumulate a count. Both can be recorded for a zoom level, in which case they are
+    reported for that zoom level and added to the totals of the run.
+    """
+
+    def __init__(self):
+        self.__timers = dict()
+        self.__counters = dict()
+        self.__start = time.perf_counter()
+
+    @contextmanager
+    def timer(self, name: str, zoom: int = None):
+        """
+        Context manager timing the stage `name` for zoom level `zoom`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, zoom=zoom)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1, zoom: int = None):
+        key = (zoom, name)
+        total, num_calls = self.__timers.get(key, (0.0, 0))
+        self.__timers[key] = (total + seconds, num_calls + calls)
+
+    def count(self, name: str, n: int = 1, zoom: int = None):
+        key = (zoom, name)
+        self.__counters[key] = self.__counters.get(key, 0) + n
+
+    def snapshot(self) -> tuple:
+        """
+        Returns the timers and counters recorded so far, to be added to another profiler with :meth:`merge`, e.g one in
+        a different process.
+        """
+        return dict(self.__timers), dict(self.__counters)
+
+    def merge(self, snapshot: tuple):
+        """
+        Adds the timers and counters returned by :meth:`snapshot` of another profiler.
+        """
+        timers, counters = snapshot
+        for (zoom, name), (seconds, calls) in timers.items():
+            self.add_time(name, seconds, calls=calls, zoom=zoom)
+        for (zoom, name), n in counters.items():
+            self.count(name, n, zoom=zoom)
+
+    def report(self) -> dict:
+        """
+        Returns a dictionary with the total time of the run, the timers and counters of each zoom level under `zooms`,
+        and the timers and counters summed over all zoom levels. Each timer is reported as a dictionary with its total
+        `seconds` and number of `calls`.
+        """
+        rv = {'seconds': time.perf_counter() - self.__start, 'timers': dict(), 'counters': dict(), 'zooms': dict()}
+
+        def zoom_report(zoom):
+            return rv['zooms'].setdefault(str(zoom), {'timers': dict(), 'counters': dict()})
+
+        for (zoom, name), (seconds, calls) in sorted(self.__timers.items(), key=lambda item: item[0][1]):
+            if zoom is not None:
+                zoom_report(zoom)['timers'][name] = {'seconds': seconds, 'calls': calls}
+            total = rv['timers'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+            total['seconds'] += seconds
+            total['calls'] += calls
+
+        for (zoom, name), n in sorted(self.__counters.items(), key=lambda item: item[0][1]):
+            if zoom is not None:
+                zoom_report(zoom)['counters'][name] = n
+            rv['counters'][name] = rv['counters'].get(name, 0) + n
+        return rv
+
+    def save(self, path: str):
+        """
+        Writes :meth:`report` to the JSON file at `path`.
+        """
+        with open(path, mode='w') as file:
+            json.dump(self.report(), file, indent=2, sort_keys=True)
+
+
+def start_profile() -> Profiler:
+    """
+    Starts recording the stages of rendering in the current thread to a new :class:`Profiler`, replacing any profiler
+    already active in the thread.
+    :return: the profiler
+    """
+    __local.active = Profiler()
+    return __local.active
+
+
+def stop_profile() -> Profiler:
+    """
+    Stops recording the stages of rendering in the current thread.
+    :return: the profiler that was active, `None` if there was none
+    """
+    profiler = get_profile()
+    __local.active = None
+    return profiler
+
+
+def get_profile() -> Profiler:
+    """
+    Returns the profiler active in the current thread, `None` if stages are not being recorded.
+    """
+    return getattr(__local, 'active', None)
+
+
+@contextmanager
+def timer(name: str, zoom: int = None):
+    """
+    Context manager timing the stage `name` with the active profiler, see :meth:`Profiler.timer`. Does nothing if there
+    is no active profiler.
+    """
+    profiler = get_profile()
+    if profiler is None:
+        yield
+    else:
+        with profiler.timer(name, zoom=zoom):
+            yield
+
+
+def count(name: str, n: int = 1, zoom: int = None):
+    """
+    Adds `n` to the counter `name` of the active profiler, see :meth:`Profiler.count`. Does nothing if there is no
+    active profiler.
+    """
+    profiler = get_profile()
+    if profiler is not None:
+        profiler.count(name, n, zoom=zoom)
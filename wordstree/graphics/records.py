@@ -0,0 +1,175 @@
+import hashlib
+import struct
+from typing import List
+
+from .branch import Branch
+from .util import Vec
+
+# header of a payload: magic, format version, size of each entry in bytes, number of entries, version of the string
+# table the texts of the records refer to, or of the string table itself, see `StringTable.version`
+HEADER = struct.Struct('<4sHHIQ')
+# record of a branch: index, depth, x, y, length, width, angle, id of the text of the branch in the string table
+RECORD = struct.Struct('<IIfffffI')
+RECORDS_MAGIC = b'WTBR'
+STRINGS_MAGIC = b'WTST'
+# size of each entry of a string table, the end offset of the string
+OFFSET = struct.Struct('<I')
+VERSION = 2
+
+
+class StringTable:
+    """
+    Table of the distinct texts of a set of branches, shared by the binary branch records of all the tiles of a zoom
+    level. The empty string always has id `0`. Ids are positions in the table, so they change when the table is built
+    again from branches with different texts; both payloads carry the :attr:`version` of the table to detect that.
+    """
+
+    def __init__(self, branches: List[Branch] = None):
+        """
+        :param branches: branches whose texts to add to the table, in order of ids
+        """
+        self.__strings = ['']
+        self.__ids = {'': 0}
+        self.__version = None
+        if branches:
+            for branch in branches:
+                self.add(branch.text)
+
+    def add(self, string: str) -> int:
+        """
+        Adds `string` to the table if it is not already in it.
+        :return: id of the string
+        """
+        string_id = self.__ids.get(string, None)
+        if string_id is None:
+            string_id = len(self.__strings)
+            self.__strings.append(string)
+            self.__ids[string] = string_id
+            self.__version = None
+        return string_id
+
+    def id(self, string: str) -> int:
+        return self.__ids[string]
+
+    @property
+    def strings(self) -> List[str]:
+        return self.__strings
+
+    @property
+    def version(self) -> int:
+        """
+        Hash of the strings of the table in order of ids, as an unsigned 64-bit integer.
+        """
+        if self.__version is None:
+            h = hashlib.sha1()
+            for string in self.__strings:
+                data = string.encode('utf-8')
+                h.update(OFFSET.pack(len(data)) + data)
+            self.__version = int.from_bytes(h.digest()[:8], 'little')
+        return self.__version
+
+    def __len__(self):
+        return len(self.__strings)
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the table as a header, followed by the end offset of every string as an uint32, followed by the UTF-8
+        encoded strings, little-endian.
+        """
+        encoded = [string.encode('utf-8') for string in self.__strings]
+        offsets, end = [], 0
+        for data in encoded:
+            end += len(data)
+            offsets.append(OFFSET.pack(end))
+        header = HEADER.pack(STRINGS_MAGIC, VERSION, OFFSET.size, len(encoded), self.version)
+        return header + b''.join(offsets) + b''.join(encoded)
+
+
+def encode_branches(branches: List[Branch], strings: StringTable) -> bytes:
+    """
+    Returns binary records of `branches`: a header followed by one packed little-endian record per branch with its
+    index, depth, position, length, width and angle, and the id of its text in `strings`. Positions and dimensions are
+    stored as float32. The header carries the version of `strings`, see :attr:`StringTable.version`.
+
+    :param branches: list of :class:`Branch` objects
+    :param strings: string table containing the texts of the branches
+    :return: the payload
+    """
+    pack = RECORD.pack
+    records = [
+        pack(b.index, b.depth, b.pos.x, b.pos.y, b.length, b.width, b.angle, strings.id(b.text)) for b in branches
+    ]
+    return HEADER.pack(RECORDS_MAGIC, VERSION, RECORD.size, len(records), strings.version) + b''.join(records)
+
+
+def __read_header(data, magic: bytes) -> tuple:
+    # returns (size of entries, number of entries, version of string table) of payload `data`, raises exception if it
+    # has the wrong type
+    if len(data) < HEADER.size:
+        raise Exception('payload too short')
+    payload_magic, version, size, count, table_version = HEADER.unpack_from(data, 0)
+    if payload_magic != magic or version != VERSION:
+        raise Exception('unknown payload type or version')
+    return size, count, table_version
+
+
+def strings_version(data) -> int:
+    """
+    Returns the version of the string table of a payload returned by :func:`encode_branches` or
+    :meth:`StringTable.to_bytes`, i.e the table the texts of the records refer to, or the table itself.
+    """
+    if len(data) < HEADER.size:
+        raise Exception('payload too short')
+    magic = HEADER.unpack_from(data, 0)[0]
+    if magic not in [RECORDS_MAGIC, STRINGS_MAGIC]:
+        raise Exception('unknown payload type or version')
+    return __read_header(data, magic)[2]
+
+
+def read_strings(data) -> List[str]:
+    """
+    Reads a string table returned by :meth:`StringTable.to_bytes`.
+    :param data: bytes-like object containing the table
+    :return: list of strings, indexed by their ids
+    """
+    size, count, _ = __read_header(data, STRINGS_MAGIC)
+    start = HEADER.size + count * size
+    view = memoryview(data)
+
+    strings, offset = [], start
+    for (end,) in OFFSET.iter_unpack(view[HEADER.size:start]):
+        strings.append(str(view[offset:start + end], 'utf-8'))
+        offset = start + end
+    return strings
+
+
+def read_records(data) -> List[tuple]:
+    """
+    Reads the records of a payload returned by :func:`encode_branches` without creating branches.
+    :param data: bytes-like object containing the payload
+    :return: list of tuples `(index, depth, x, y, length, width, angle, text_id)`
+    """
+    size, count, _ = __read_header(data, RECORDS_MAGIC)
+    if size != RECORD.size:
+        raise Exception('unknown record size {}'.format(size))
+    return list(RECORD.iter_unpack(memoryview(data)[HEADER.size:HEADER.size + count * size]))
+
+
+def read_branches(data, strings: List[str] = None, version: int = None) -> List[Branch]:
+    """
+    Reads the branches of a payload returned by :func:`encode_branches`.
+    :param data: bytes-like object containing the payload
+    :param strings: list returned by :func:`read_strings` for the string table of the zoom level of the payload; if
+        `None`, the branches are read without text
+    :param version: version of the string table `strings` was read from, see :func:`strings_version`; if given, an
+        exception is raised if the texts of the payload refer to a different table, which has to be read again
+    :return: list of :class:`Branch` objects
+    """
+    if version is not None and strings_version(data) != version:
+        raise Exception('payload refers to a different version of the string table')
+
+    rv = []
+    for index, depth, x, y, length, width, angle, text_id in read_records(data):
+        text = strings[text_id] if strings else ''
+        rv.append(Branch(index, Vec(x, y), depth=depth, length=length, width=width, angle=angle, text=text))
+    return rv
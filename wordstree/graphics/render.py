@@ -1 +1 @@
-from typing import Listimport osimport jsonimport mathimport cairoimport clickfrom flask import current_appfrom wordstree.graphics.branch import Branchfrom wordstree.graphics.util import Vec, radians, create_dir, Rect, rectangle_intersect, path_fromfrom wordstree.graphics.loader import Loader, FileLoader, BranchJSONEncoderdef create_surface(zoom=0):    surface = cairo.RecordingSurface(        cairo.Content.COLOR_ALPHA,        cairo.Rectangle(0, 0, Renderer.BASE_WIDTH, Renderer.BASE_HEIGHT)    )    return surfacedef create_cache_file(name, path='', binary=False):    dir = os.path.join(current_app.config['CACHE_DIR'], path)    create_dir(dir)    pfile = os.path.join(dir, name)    if binary:        file = open(pfile, mode='wb')    else:        file = open(pfile, mode='w')    return file, pfiledef __draw_point(ctx, x, y):    # utility function for drawing a point, helpful for debugging    ctx.arc(x, y, 0.0001, 0, 2 * math.pi)    ctx.fill()class Renderer:    """    Instances of this class are responsible for rendering the branches/tiles and saving them to disk    """    BASE_WIDTH = 1024    BASE_HEIGHT = 1024    # ZOOM_LEVELS = [3, 4, 5, 6, 9, 10, 11]    # GRID_LEVELS = [4, 12, 21, 30, 40, 60, 80]    ZOOM_LEVELS = [2, 3, 4, 5]    GRID_LEVELS = [4, 12, 21, 30]    def __init__(self, zoom_levels=None, grid_levels=None):        # self.zoom_levels = [i for i in range(0, max_layers)]        if not zoom_levels:            # list containing of maximum depth of visible branches at a particular zoom_level            # ex. if zoom_level=[2, 5]; then at zoom=1, branches at depth > 5 are not visible            self.zoom_levels = Renderer.ZOOM_LEVELS        if not grid_levels:            # list containing size of grid at each zoom_level            self.grid_levels = Renderer.GRID_LEVELS        if len(self.zoom_levels) != len(self.grid_levels):            raise Exception('not enough zoom_levels of grid_levels provided')        self.__map = {}    def __setup_canvas(self, ctx):        ctx.scale(Renderer.BASE_WIDTH, Renderer.BASE_HEIGHT)        # draw white background        ctx.set_source_rgb(1, 1, 1)        ctx.rectangle(0, 0, 1, 1)        ctx.fill()    def get_opacity(self, zoom: int, layer: int) -> float:        diff = layer - self.zoom_levels[zoom]        if diff < 0:            return 1.0        elif diff == 0:            return 0.5        elif diff == 1:            return 0.15        elif diff == 2:            return 0.05        elif diff == 3:            return 0.01        else:            return 0    def render_tree(self, loader: Loader, zoom=0):        """        Renders the branches contained in `loader.branches` as well as the tiles at zoom level `zoom`.        :param loader: `Loader` instance containing the list of `Branch` objects representing the tree to be rendered        :param zoom: zoom level of render the tree and generate the tiles at, see `zoom_levels` and `grid_levels`        """        layers = loader.layers        branches = loader.branches        num_branches = loader.num_branches        surface = create_surface(zoom=zoom)        ctx = cairo.Context(surface)        self.__setup_canvas(ctx)        print('  Rendering branches ...')        num_layers = len(layers)        if num_layers < 1:            print('    no branches to render\r')        else:            depth = 0            i = layers[depth]            next_layer = layers[depth + 1] if depth+1 < num_layers else num_branches            while i < num_branches:                opacity = self.get_opacity(zoom, depth)                if opacity > 0.0:                    branches[i].draw(ctx, opacity=opacity)                print('    layer {}, branch {:d} of {}, {:.0f}% \r'.format(                    depth, i, num_branches, (i/num_branches)*100                ), end='')                i += 1                if i == next_layer:                    depth += 1                    next_layer = layers[depth] if depth < num_layers else num_branches        print()        self.__map[zoom] = (surface, loader)    def save_full_tree(self, zoom: int, saver: Loader):        """        Saves graphics of a tree previously rendered with :meth:`render_tree` as  a SVG file to disk under the name        `tree_z<zoom>.svg`. If tree has not been rendered at zoom level `zoom`, an exception will be raised.        :param zoom: zoom level of the tree, used for naming the file        :param saver: :class:`Loader` instance containing information about where to save the image        """        rv = self.__map.get(zoom, None)        if not rv:            raise Exception('tree at zoom level {} must be rendered first'.format(zoom))        surface, loader = rv        if not saver:            saver = loader        svg_file, svg_file_path = create_cache_file(            'tree_z{}.svg'.format(zoom), path='{}/images/svg'.format(saver.output_tree('tree_name')), binary=True        )        print('  Saving svg of tree to {} ...'.format(path_from(svg_file_path, 4)))        pat = cairo.SurfacePattern(surface)        img = cairo.SVGSurface(svg_file, Renderer.BASE_WIDTH, Renderer.BASE_HEIGHT)        ctx = cairo.Context(img)        ctx.set_source(pat)        ctx.paint()        # font options        ctx.set_font_size(0.001)        # draw grid        ctx.scale(Renderer.BASE_WIDTH, Renderer.BASE_HEIGHT)        ctx.set_source_rgb(1, 0, 0)        ctx.set_line_width(0.0001)        grid = self.grid_levels[zoom]        dx = 1 / grid        draw_label = grid <= 40        for i in range(grid + 1):            x = i * dx            # horizontal line            ctx.new_path()            ctx.move_to(0, x)            ctx.line_to(1, x)            ctx.stroke()            # vertical line            ctx.new_path()            ctx.move_to(x, 0)            ctx.line_to(x, 1)            ctx.stroke()            if not draw_label:                continue            for j in range(grid + 1):                # draw label                y = j * dx + dx                ctx.save()                ctx.translate(x + 0.003, y - 0.003)                ctx.show_text('({}, {}):({:.2f}, {:.2f})'.format(i, j, x, y))                ctx.stroke()                ctx.restore()    def cache_tiles(self, zoom: int, saver: Loader, saver_args: dict = None):        """        Render the tiles at zoom level :param:`zoom` and save the images and JSON file containing list of branches        visible in them to the cache directory(`app.config['CACHE_DIR']`). If `loader` is not `None`, then zoom level        information and tile information is also saved using `save_tile_info` and `save_zoom_info` methods in `loader`.        If the loader instance requires additional argument(s), they are can be provided using `saver_args`, which will        be passed as kwargs to all invocations of :meth:`Loader.save_tile` and :meth:`Loader.save_zoom_level`.        :param zoom: zoom level to render tiles at, must be less than length of `self.zoom_levels`.        :param saver: :class:`Loader` instance to call for saving information about tile and zoom level        :param saver_args: additional arguments to pass to every call to `save_tile_info` and `save_zoom_info`            methods of `loader`        """        surface, loader = self.__map.get(zoom, None)        if surface is None:            raise Exception('branches must be rendered at zoom level {} before tiles can be rendered'.format(zoom))        pat = cairo.SurfacePattern(surface)        grid = self.grid_levels[zoom]        # dimension of each tile        dimx, dimy = Renderer.BASE_WIDTH//4, Renderer.BASE_HEIGHT//4        # dimension of each tile in the original image        grid_dx = Renderer.BASE_WIDTH / grid        grid_dy = Renderer.BASE_HEIGHT / grid        # dimension of each tile in the original image        norm_grid_dx = 1 / grid        norm_grid_dy = 1 / grid        scale = grid_dx / dimx        if saver:            tree_name = saver.output_tree('tree_name')        else:            tree_name = loader.output_tree('tree_name')        imgdir = '{}/images/png/zoom_{}'.format(tree_name, zoom)        jsondir = '{}/json/zoom_{}'.format(tree_name, zoom)        # save information about current zoom level        cache_info = saver is not None        if cache_info:            saver.save_zoom_info(                zoom_level=zoom,                grid=grid,                tile_size=(grid_dx, grid_dy),                img_size=(dimx, dimy),                img_dir=imgdir,                json_dir=jsondir,                **saver_args            )        tile_index, num_tiles = 0, grid*grid        print('  Rendering {}x{} grid...'.format(grid, grid))        for i in range(grid):            x = i * grid_dx            x_norm = i * norm_grid_dx            for j in range(grid):                tile = cairo.ImageSurface(cairo.Format.RGB24, dimx, dimy)                ctx = cairo.Context(tile)                y = j * grid_dy                y_norm = j * norm_grid_dy                mat = cairo.Matrix(xx=scale, yy=scale, x0=x, y0=y)                pat.set_matrix(mat)                ctx.set_source(pat)                ctx.paint()                rect = Rect(Vec(x_norm, y_norm), norm_grid_dx, norm_grid_dy)                contained_branches = self._get_contained_branches(loader.branches, loader.num_branches, rect, zoom)                file_name = 'z{}_{:.0f}x{:.0f}@{}_{}'.format(zoom, grid_dx, grid_dy, i, j)                branch_file, branch_filepath = create_cache_file(file_name + '.json', path=jsondir)                json.dump(contained_branches, branch_file, cls=BranchJSONEncoder)                img_file, img_filepath = create_cache_file(file_name + '.png', path=imgdir, binary=True)                tile.write_to_png(img_file)                if cache_info:                    saver.save_tile_info(                        zoom_level=zoom, img_path=img_filepath, json_path=branch_filepath,                        # note: (j, i) = (ROW, COLUMN) is what method expects                        grid_location=(j, i), tile_position=(x_norm, y_norm), tile_index=tile_index,                        **saver_args                    )                tile_index += 1                print('    tile {} out of {}, {:.1f}%\r'.format(                    tile_index, num_tiles, tile_index / num_tiles * 100), end=''                )        print()    def _get_contained_branches(self, branches: List[Branch], num_branches: int, rect: Rect, zoom: int):        # returns list of branches contained in the rectangular region described by `rect`        # the `zoom` parameter determines the maximum depth of the branch considered        # if a branch is deeper than `self.zoom_levels[zoom]`, then it is not considered        hits = []        visible = self.zoom_levels[zoom]        for i in range(num_branches):            branch = branches[i]            if branch.depth > visible:                continue            if rectangle_intersect(rect, branch.rect):                hits.append(branch)        return hits    @property    def max_zoom_level(self):        return len(self.zoom_levels) - 1if __name__ == "__main__":    renderer = Renderer()    renderer.render_tree(zoom=7)
\ No newline at end of file
+from typing import Listfrom concurrent.futures import ProcessPoolExecutorimport hashlibimport ioimport osimport jsonimport mathimport cairoimport clickfrom flask import current_appfrom wordstree.graphics.archive import TileArchive, TileArchiveWriterfrom wordstree.graphics.branch import Branch, draw_branchesfrom wordstree.graphics.index import BranchIndexfrom wordstree.graphics.svg import SVGWriterfrom wordstree.graphics.util import Vec, radians, create_dir, Rect, rectangle_intersect, path_fromfrom wordstree.graphics.loader import Loader, FileLoader, BranchJSONEncoderfrom wordstree.graphics import profile# image and JSON paths saved for tiles without branches when tiles are deduplicated, see `_write_tile()`; such tiles# are served from memory, see `empty_tile()`EMPTY_TILE = ':empty:'def create_cache_file(name, path='', binary=False, buffering=-1):    dir = os.path.join(current_app.config['CACHE_DIR'], path)    create_dir(dir)    pfile = os.path.join(dir, name)    if binary:        file = open(pfile, mode='wb', buffering=buffering)    else:        file = open(pfile, mode='w', buffering=buffering, encoding='utf-8')    return file, pfiledef _branch_geometry(branch: Branch) -> tuple:    # plain tuple describing `branch`, cheap to pickle when sending branches to worker processes    return branch.index, branch.pos.x, branch.pos.y, branch.depth, branch.length, branch.width, branch.angle, \        branch.textdef _branch_from_geometry(geometry: tuple) -> Branch:    # inverse of `_branch_geometry()`    index, x, y, depth, length, width, angle, text = geometry    return Branch(index, Vec(x, y), depth=depth, length=length, width=width, angle=angle, text=text)# state of a tile rendering worker process, set once per process by `_init_tile_worker()`_worker = {}def _init_tile_worker(geometry: List[tuple], opacities: dict, visible: int, tile_args: dict):    """    Initializer of worker processes used by :meth:`Renderer.cache_tiles` when rendering with more than one job. The    branch geometry is sent to each worker once, rather than with every column of tiles.    :param geometry: list of tuples returned by `_branch_geometry()` for every branch drawn at the zoom level    :param opacities: map of branch depth to the opacity the branches at that depth are drawn with    :param visible: maximum depth of branches listed in the JSON file of a tile    :param tile_args: dictionary with the zoom level, grid size, image dimensions and output directories of the tiles    """    branches = [_branch_from_geometry(geom) for geom in geometry]    _worker['index'] = BranchIndex(branches)    _worker['opacities'] = opacities    _worker['visible'] = visible    _worker.update(tile_args)    # image surface reused for every tile drawn by the worker, see `_draw_tile()`    _worker['surface'] = cairo.ImageSurface(cairo.Format.RGB24, *tile_args['img_size'])def _tile_file_name(zoom: int, tile_size: tuple, i: int, j: int) -> str:    # name, without extension, of the image and JSON files of the tile at column `i`, row `j`    grid_dx, grid_dy = tile_size    return 'z{}_{:.0f}x{:.0f}@{}_{}'.format(zoom, grid_dx, grid_dy, i, j)def _tile_hash(img_data, json_data) -> str:    # hash of the contents of a tile, tiles with the same image and JSON file have the same hash    digest = hashlib.sha1(img_data)    digest.update(json_data)    return digest.hexdigest()def _blank_tile(img_size: tuple) -> tuple:    # returns image surface of a tile with a white background and a context to draw onto it with    tile = cairo.ImageSurface(cairo.Format.RGB24, *img_size)    ctx = cairo.Context(tile)    _clear_tile(ctx)    return tile, ctxdef _clear_tile(ctx: cairo.Context):    # paints the whole surface of `ctx` white, so that the surface of a tile can be reused for the next tile    ctx.identity_matrix()    ctx.set_source_rgb(1, 1, 1)    ctx.paint()# contents of tiles without branches keyed by image dimensions, see `empty_tile()`__empty_tiles = dict()def empty_tile(img_size: tuple) -> tuple:    """    Returns the contents of a tile of dimensions `img_size` with no branches drawn on it or listed in its JSON file.    Deduplicated tiles with these contents are saved as :data:`EMPTY_TILE` instead of being written to disk.    :param img_size: `(width, height)` of the image of the tile    :return: tuple `(img_data, json_data, content_hash)`    """    img_size = (int(img_size[0]), int(img_size[1]))    rv = __empty_tiles.get(img_size, None)    if rv is None:        tile, _ = _blank_tile(img_size)        img = io.BytesIO()        tile.write_to_png(img)        img_data, json_data = img.getvalue(), json.dumps([]).encode('utf-8')        rv = (img_data, json_data, _tile_hash(img_data, json_data))        __empty_tiles[img_size] = rv    return rvdef _draw_tile(index: BranchIndex, opacities: dict, visible: int, tile_args: dict, i: int, j: int) -> tuple:    """    Renders the tile at column `i`, row `j` of the grid by drawing the branches overlapping it directly onto the tile.    If `surface` is set in `tile_args`, the tile is drawn onto that image surface instead of a new one.    :param index: spatial index over the branches of the tree    :param opacities: map of branch depth to the opacity the branches at that depth are drawn with; branches at depths        not in the map are not drawn    :param visible: maximum depth of branches listed in the JSON file of the tile    :param tile_args: dictionary with the zoom level, grid size, image dimensions and output directories of the tiles    :param i: zero-indexed column of the tile    :param j: zero-indexed row of the tile    :return: tuple of the image surface of the tile and the list of branches to list in its JSON file    """    zoom, grid = tile_args['zoom'], tile_args['grid']    rect = Rect(Vec(i / grid, j / grid), 1 / grid, 1 / grid)    # every branch whose bounding box overlaps the tile is drawn, branches that turn out to miss it are clipped    with profile.timer('assign', zoom=zoom):        candidates = index.query(rect, exact=False)    tile = tile_args.get('surface', None)    if tile is None:        tile = cairo.ImageSurface(cairo.Format.RGB24, *tile_args['img_size'])    return tile, _paint_tile(cairo.Context(tile), candidates, opacities, visible, tile_args, i, j)def _paint_tile(ctx: cairo.Context, candidates: List[Branch], opacities: dict, visible: int, tile_args: dict,                i: int, j: int) -> List[Branch]:    """    Clears the image surface of `ctx` and draws the tile at column `i`, row `j` of the grid onto it. The surface may    hold a previously drawn tile.    :param ctx: context of the image surface of the tile    :param candidates: branches whose bounding boxes overlap the tile, in the order they were indexed    :param opacities: map of branch depth to the opacity the branches at that depth are drawn with    :param visible: maximum depth of branches listed in the JSON file of the tile    :param tile_args: dictionary with the zoom level, grid size and image dimensions of the tiles    :param i: zero-indexed column of the tile    :param j: zero-indexed row of the tile    :return: list of branches to list in the JSON file of the tile    """    zoom, grid = tile_args['zoom'], tile_args['grid']    dimx, dimy = tile_args['img_size']    norm_grid_dx, norm_grid_dy = 1 / grid, 1 / grid    x_norm, y_norm = i * norm_grid_dx, j * norm_grid_dy    rect = Rect(Vec(x_norm, y_norm), norm_grid_dx, norm_grid_dy)    with profile.timer('assign', zoom=zoom):        contained_branches = [            branch for branch in candidates if branch.depth <= visible and rectangle_intersect(rect, branch.rect)        ]    with profile.timer('rasterize', zoom=zoom):        _clear_tile(ctx)        # map the region of the tile to the full dimensions of the image        ctx.scale(dimx * grid, dimy * grid)        ctx.translate(-x_norm, -y_norm)        num_drawn = draw_branches(ctx, candidates, opacities)    profile.count('branches_drawn', num_drawn, zoom=zoom)    return contained_branchesdef _tile_range(low: float, high: float, grid: int) -> range:    # columns (or rows) of the tiles of a `grid`x`grid` grid over the unit square overlapped by the interval [`low`,    # `high`], including the tiles only touched by an end of the interval, as intersections of tiles and branches are    return range(max(0, math.ceil(low * grid) - 1), min(grid - 1, math.floor(high * grid)) + 1)def _strip_branches(index: BranchIndex, grid: int, j: int) -> List[List[Branch]]:    """    Looks up the branches overlapping row `j` of a `grid`x`grid` grid over the unit square with a single query of    `index`, and splits them among the tiles of the row by their bounding boxes.    :return: list of the branches whose bounding boxes overlap each tile of the row, by column, in the order they were        indexed    """    dx = 1 / grid    columns = [[] for i in range(grid)]    for branch in index.query(Rect(Vec(0, j * dx), 1, dx), exact=False):        min_x, min_y, max_x, max_y = branch.rect.bounds        for i in _tile_range(min_x, max_x, grid):            columns[i].append(branch)    return columnsdef _group_strips(order: List[tuple], single: set = frozenset()) -> List[tuple]:    """    Groups the tiles of the list of (column, row) `order` by row, rows in the order their first tile appears in `order`.    Tiles in `single` are kept in strips of their own, in the order they appear in `order`.    :return: list of tuples `(row, columns)`, with the columns of the tiles of each row in the order they appear in        `order`    """    strips, rows = [], dict()    for i, j in order:        if (i, j) in single:            strips.append((j, [i]))        elif j in rows:            rows[j].append(i)        else:            rows[j] = [i]            strips.append((j, rows[j]))    return stripsdef _encode_tile(tile: cairo.ImageSurface, branches: List[Branch], zoom: int = None) -> tuple:    # contents of the PNG image and JSON file of a tile, as saved to the tile files or archives    with profile.timer('png_encode', zoom=zoom):        img = io.BytesIO()        tile.write_to_png(img)    with profile.timer('json_encode', zoom=zoom):        json_data = json.dumps(branches, cls=BranchJSONEncoder).encode('utf-8')    return img.getvalue(), json_datadef _write_tile(tile_args: dict, i: int, j: int, img_data: bytes, json_data: bytes) -> tuple:    """    Saves the image and JSON file of the tile at column `i`, row `j` of the grid to the directories in `tile_args`.    If `dedup` is set in `tile_args`, the files are named after the hash of the contents of the tile instead, so tiles    with the same contents share the same files, which are only written once. Tiles without branches are not written at    all, :data:`EMPTY_TILE` is returned as their paths.    :return: tuple `(img_path, json_path, content_hash)`    """    zoom = tile_args['zoom']    content_hash = _tile_hash(img_data, json_data)    if tile_args.get('dedup', False):        if content_hash == empty_tile(tile_args['img_size'])[2]:            profile.count('empty_tiles', zoom=zoom)            return EMPTY_TILE, EMPTY_TILE, content_hash        file_name = content_hash    else:        file_name = _tile_file_name(zoom, tile_args['tile_size'], i, j)    img_filepath = os.path.join(tile_args['img_dir'], file_name + '.png')    branch_filepath = os.path.join(tile_args['json_dir'], file_name + '.json')    if tile_args.get('dedup', False) and os.path.isfile(img_filepath) and os.path.isfile(branch_filepath):        profile.count('duplicate_tiles', zoom=zoom)        return img_filepath, branch_filepath, content_hash    with profile.timer('file_write', zoom=zoom):        with open(branch_filepath, mode='wb') as branch_file:            branch_file.write(json_data)        with open(img_filepath, mode='wb') as img_file:            img_file.write(img_data)    profile.count('bytes_written', len(img_data) + len(json_data), zoom=zoom)    return img_filepath, branch_filepath, content_hashdef _tile_bytes(img_path: str, json_path: str) -> int:    # size in bytes of the files of a tile saved by `_write_tile()`, empty tiles take up no space    if img_path == EMPTY_TILE:        return 0    return os.path.getsize(img_path) + os.path.getsize(json_path)def _render_tile(index: BranchIndex, opacities: dict, visible: int, tile_args: dict, i: int, j: int) -> tuple:    """    Renders the tile at column `i`, row `j` of the grid with `_draw_tile()`, and saves its image and JSON file with    `_write_tile()`.    :return: tuple `(i, j, img_path, json_path, content_hash)`    """    tile, contained_branches = _draw_tile(index, opacities, visible, tile_args, i, j)    img_data, json_data = _encode_tile(tile, contained_branches, zoom=tile_args['zoom'])    return (i, j) + _write_tile(tile_args, i, j, img_data, json_data)def _pack_tile(index: BranchIndex, opacities: dict, visible: int, tile_args: dict, i: int, j: int) -> tuple:    """    Renders the tile at column `i`, row `j` of the grid with `_draw_tile()`, without saving any files.    :return: tuple `(i, j, img_data, json_data, content_hash)` with the contents of the image and JSON file of the tile    """    tile, contained_branches = _draw_tile(index, opacities, visible, tile_args, i, j)    img_data, json_data = _encode_tile(tile, contained_branches, zoom=tile_args['zoom'])    return i, j, img_data, json_data, _tile_hash(img_data, json_data)def _render_tile_batch(tiles: List[tuple]) -> tuple:    """    Renders a batch of tiles of the grid, in order. Runs in a worker process initialized with `_init_tile_worker()`.    The images and JSON files of the tiles are saved, unless the tiles are rendered into an archive (`archive` set in    the tile arguments), in which case their contents are returned to be added to the archive by the parent process. If    `profile` is set in the tile arguments, the stages of rendering the batch are recorded and returned to be merged    into the profile of the parent process.    :param tiles: list of `(i, j)` of the zero-indexed column and row of each tile    :return: tuple of the list of tuples returned by `_render_tile()`, or by `_pack_tile()` for archives, one for each        tile in the batch, and :meth:`Profiler.snapshot` of the batch or `None` if not profiling    """    profiler = profile.start_profile() if _worker.get('profile', False) else None    render = _pack_tile if _worker.get('archive', False) else _render_tile    rv = []    try:        for i, j in tiles:            rv.append(render(_worker['index'], _worker['opacities'], _worker['visible'], _worker, i, j))    finally:        if profiler:            profile.stop_profile()    return rv, profiler.snapshot() if profiler else Nonedef __draw_point(ctx, x, y):    # utility function for drawing a point, helpful for debugging    ctx.arc(x, y, 0.0001, 0, 2 * math.pi)    ctx.fill()class Renderer:    """    Instances of this class are responsible for rendering the branches/tiles and saving them to disk    """    BASE_WIDTH = 1024    BASE_HEIGHT = 1024    # ZOOM_LEVELS = [3, 4, 5, 6, 9, 10, 11]    # GRID_LEVELS = [4, 12, 21, 30, 40, 60, 80]    ZOOM_LEVELS = [2, 3, 4, 5]    GRID_LEVELS = [4, 12, 21, 30]    # size of the write buffer of SVG files of full trees    SVG_BUFFER_SIZE = 1 << 20    # normalized position of the base of the trunk, tiles closest to it are rendered first, see `tile_order()`    TRUNK_POSITION = (0.5, 0.99)    def __init__(self, zoom_levels=None, grid_levels=None):        # self.zoom_levels = [i for i in range(0, max_layers)]        if not zoom_levels:            # list containing of maximum depth of visible branches at a particular zoom_level            # ex. if zoom_level=[2, 5]; then at zoom=1, branches at depth > 5 are not visible            zoom_levels = Renderer.ZOOM_LEVELS        self.zoom_levels = zoom_levels        if not grid_levels:            # list containing size of grid at each zoom_level            grid_levels = Renderer.GRID_LEVELS        self.grid_levels = grid_levels        if len(self.zoom_levels) != len(self.grid_levels):            raise Exception('not enough zoom_levels of grid_levels provided')        self.__map = {}        # tuple of the loader whose branches were most recently rendered and the spatial index over its branches        self.__index = (None, None)        # tuple of the loader whose branches were most recently versioned and the version, see `tree_version()`        self.__version = (None, None)        # paths of the image and JSON files of the tiles saved as separate files by this renderer, keyed by the image        # directory of their zoom level and then by tile index, since deduplicated tiles are not named after their        # position in the grid        self.__tile_files = dict()    def get_opacity(self, zoom: int, layer: int) -> float:        diff = layer - self.zoom_levels[zoom]        if diff < 0:            return 1.0        elif diff == 0:            return 0.5        elif diff == 1:            return 0.15        elif diff == 2:            return 0.05        elif diff == 3:            return 0.01        else:            return 0    def render_tree(self, loader: Loader, zoom=0):        """        Prepares the branches contained in `loader.branches` for rendering the tiles at zoom level `zoom`, see        :meth:`cache_tiles` and :meth:`save_full_tree`. No image of the whole tree is drawn: tiles are rasterized one        row of the grid at a time from the branches the spatial index finds in that row, so the memory used to render        a zoom level does not grow with its grid.        :param loader: `Loader` instance containing the list of `Branch` objects representing the tree to be rendered        :param zoom: zoom level of render the tree and generate the tiles at, see `zoom_levels` and `grid_levels`        """        if len(loader.layers) < 1:            print('    no branches to render')        self.__map[zoom] = loader        # index is built once per tree and shared by all zoom levels        self.__get_index(loader)    def save_full_tree(self, zoom: int, saver: Loader):        """        Saves graphics of a tree previously rendered with :meth:`render_tree` as  a SVG file to disk under the name        `tree_z<zoom>.svg`. If tree has not been rendered at zoom level `zoom`, an exception will be raised. The        branches are streamed to the file layer by layer with :class:`SVGWriter`, followed by the grid of the zoom        level.        :param zoom: zoom level of the tree, used for naming the file        :param saver: :class:`Loader` instance containing information about where to save the image        """        loader = self.__map.get(zoom, None)        if not loader:            raise Exception('tree at zoom level {} must be rendered first'.format(zoom))        if not saver:            saver = loader        svg_file, svg_file_path = create_cache_file(            'tree_z{}.svg'.format(zoom), path='{}/images/svg'.format(saver.output_tree('tree_name')),            buffering=Renderer.SVG_BUFFER_SIZE        )        print('  Saving svg of tree to {} ...'.format(path_from(svg_file_path, 4)))        with svg_file, profile.timer('svg', zoom=zoom):            writer = SVGWriter(svg_file, Renderer.BASE_WIDTH, Renderer.BASE_HEIGHT)            writer.write_tree(loader, self._get_opacities(zoom, loader))            writer.write_grid(self.grid_levels[zoom])            writer.close()    def cache_tiles(self, zoom: int, saver: Loader, saver_args: dict = None, jobs: int = 1, archive: bool = False,                    dedup: bool = False, resume: bool = False):        """        Render the tiles at zoom level :param:`zoom` and save the images and JSON file containing list of branches        visible in them to the cache directory(`app.config['CACHE_DIR']`). If `loader` is not `None`, then zoom level        information and tile information is also saved using `save_tile_info` and `save_zoom_info` methods in `loader`.        If the loader instance requires additional argument(s), they are can be provided using `saver_args`, which will        be passed as kwargs to all invocations of :meth:`Loader.save_tile` and :meth:`Loader.save_zoom_level`.        Tiles are rendered in the order given by :meth:`tile_order`, tiles recently requested by clients (see        `load_requested_tiles` of :param:`saver`) first, and the tile information of each tile is saved as soon as the        tile is done, so that the first tiles can be served before the whole zoom level is rendered.        Tiles are rendered one row of the grid at a time into a single image surface that is cleared between tiles,        drawing only the branches the spatial index finds in the row, so rows are taken in the order their first tile        appears in :meth:`tile_order`. Requested tiles are rendered one at a time before any other tile.        If :param:`jobs` is greater than one, the tiles are split into batches of one grid row's worth of tiles across a        pool of `jobs` worker processes. Each worker draws the branches intersecting its tiles directly onto the tile,        and the tile information is saved by this process as the batches are completed, in order.        If :param:`archive` is `True`, the tiles are written into a single archive file for the zoom level, see        :class:`TileArchiveWriter`, instead of one image and one JSON file per tile. The tile information of every tile        then refers to the archive, and is saved only once the archive has replaced any previous archive of the zoom        level, so that tiles are never looked up in a missing or stale archive. Tiles with the same contents are stored        in the archive once.        If :param:`dedup` is `True`, tiles saved as separate files are named after the hash of their contents, so tiles        with the same contents share the same image and JSON file, and tiles without branches are not saved at all but        recorded as :data:`EMPTY_TILE`. The hash of the contents of every tile is saved with its tile information.        Progress is saved with `save_checkpoint` of :param:`saver` after every grid row's worth of tiles, and every tile        is saved along with the :meth:`tree_version` it was rendered from. If :param:`resume` is `True`, the tile        information of the zoom level is kept rather than dropped, and tiles already rendered from the current version        of the tree whose files still exist are skipped, so that an interrupted render can be picked up where it left        off. Tiles written into an archive are always rendered again, since the archive is rewritten as a whole.        :param zoom: zoom level to render tiles at, must be less than length of `self.zoom_levels`.        :param saver: :class:`Loader` instance to call for saving information about tile and zoom level        :param saver_args: additional arguments to pass to every call to `save_tile_info` and `save_zoom_info`            methods of `loader`        :param jobs: number of worker processes to render the tiles with; `1` renders the tiles in this process        :param archive: whether to write the tiles into an archive file        :param dedup: whether to deduplicate tiles saved as separate files        :param resume: whether to skip tiles already rendered from the current version of the tree        """        loader = self.__map.get(zoom, None)        if loader is None:            raise Exception('branches must be rendered at zoom level {} before tiles can be rendered'.format(zoom))        if saver_args is None:            saver_args = dict()        grid = self.grid_levels[zoom]        if saver:            tree_name = saver.output_tree('tree_name')        else:            tree_name = loader.output_tree('tree_name')        # save information about current zoom level, after reading the tiles requested before they are dropped        cache_info = saver is not None        requested = None        if cache_info:            requested = saver.load_requested_tiles(zoom_level=zoom, **saver_args)            self.save_zoom_info(zoom, saver, saver_args, archive=archive, resume=resume)        order = self.tile_order(zoom, requested)        requested = {(col, row) for row, col in requested or []}        tile_args = self._tile_args(zoom, tree_name)        tile_args['archive'] = archive        tile_args['dedup'] = dedup        tile_args['profile'] = profile.get_profile() is not None        tile_files = self.__tile_files.setdefault(tile_args['img_dir'], dict())        tile_files.clear()        tree_version = self.tree_version(loader)        tiles_done = 0        if cache_info:            if resume and not archive:                done = self.__load_done_tiles(zoom, saver, saver_args, tree_version)                order = [(i, j) for i, j in order if i * grid + j not in done]                tile_files.update(done)                tiles_done = len(done)            saver.save_checkpoint(zoom_level=zoom, tree_version=tree_version, num_tiles=grid*grid,                                  tiles_done=tiles_done, **saver_args)        if jobs > 1:            tiles = self.__render_tiles_parallel(zoom, loader, tile_args, jobs, order)        else:            tiles = self.__render_tiles(zoom, loader, tile_args, order, requested)        writer = None        if archive:            archive_filepath = tile_args['archive_file']            create_dir(os.path.dirname(archive_filepath))            writer = TileArchiveWriter(archive_filepath, grid)        norm_grid_dx = 1 / grid        norm_grid_dy = 1 / grid        # tile information of tiles written into the archive, saved only once the archive is in place        archived = []        try:            for i, j, img, branches, content_hash in tiles:                if writer:                    # `img` and `branches` hold the contents of the tile rather than paths to its files                    num_bytes = len(img) + len(branches)                    with profile.timer('file_write', zoom=zoom):                        writer.add(i * grid + j, img, branches, content_hash=content_hash)                    profile.count('bytes_written', num_bytes, zoom=zoom)                    img_filepath, branch_filepath = archive_filepath, archive_filepath                else:                    img_filepath, branch_filepath = img, branches                    num_bytes = _tile_bytes(img_filepath, branch_filepath)                    tile_files[i * grid + j] = (img_filepath, branch_filepath)                profile.count('tiles', zoom=zoom)                if cache_info:                    tile_info = dict(                        zoom_level=zoom, img_path=img_filepath, json_path=branch_filepath,                        # note: (j, i) = (ROW, COLUMN) is what method expects                        grid_location=(j, i), tile_position=(i * norm_grid_dx, j * norm_grid_dy),                        tile_index=i * grid + j, num_bytes=num_bytes, content_hash=content_hash,                        tree_version=tree_version, **saver_args                    )                    if writer:                        archived.append(tile_info)                        continue                    saver.save_tile_info(**tile_info)                    tiles_done += 1                    if tiles_done % grid == 0:                        saver.save_checkpoint(zoom_level=zoom, tree_version=tree_version, num_tiles=grid*grid,                                              tiles_done=tiles_done, **saver_args)        except BaseException:            if writer:                writer.discard()            raise        if writer:            with profile.timer('file_write', zoom=zoom):                writer.close()            for tile_info in archived:                saver.save_tile_info(**tile_info)            tiles_done += len(archived)        if cache_info:            saver.save_checkpoint(zoom_level=zoom, tree_version=tree_version, num_tiles=grid*grid,                                  tiles_done=tiles_done, finished=True, **saver_args)        print()    def save_zoom_info(self, zoom: int, saver: Loader, saver_args: dict = None, archive: bool = False,                       resume: bool = False):        """        Save information about the grid and tiles of zoom level :param:`zoom` using `save_zoom_info` method of        :param:`saver`. Any tile information previously saved for the zoom level is dropped, unless :param:`resume` is        `True` and the grid of the zoom level is unchanged.        :param zoom: zoom level, must be less than length of `self.zoom_levels`        :param saver: :class:`Loader` instance to save the zoom level information with        :param saver_args: additional arguments to pass to `save_zoom_info`        :param archive: whether the tiles of the zoom level are stored in an archive file        :param resume: whether to keep the tile information previously saved for the zoom level        """        if saver_args is None:            saver_args = dict()        grid = self.grid_levels[zoom]        tree_name = saver.output_tree('tree_name')        saver.save_zoom_info(            zoom_level=zoom,            grid=grid,            tile_size=(Renderer.BASE_WIDTH / grid, Renderer.BASE_HEIGHT / grid),            img_size=(Renderer.BASE_WIDTH//4, Renderer.BASE_HEIGHT//4),            img_dir='{}/images/png/zoom_{}'.format(tree_name, zoom),            json_dir='{}/json/zoom_{}'.format(tree_name, zoom),            archive_file=self._tile_args(zoom, tree_name)['archive_file'] if archive else None,            resume=resume,            **saver_args        )    def render_tile(self, loader: Loader, zoom: int, row: int, col: int, saver: Loader = None,                    saver_args: dict = None, dedup: bool = False) -> tuple:        """        Render a single tile at zoom level :param:`zoom` directly from the branches in `loader.branches`, save its        image and JSON file to the cache directory, and save its tile information with `save_tile_info` of        :param:`saver`. Zoom level information must have been saved before, see :meth:`save_zoom_info`. The tree does        not need to be rendered with :meth:`render_tree` first.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :param zoom: zoom level of the tile        :param row: zero-indexed row of the tile        :param col: zero-indexed column of the tile        :param saver: :class:`Loader` instance to call for saving tile information; defaults to :param:`loader`        :param saver_args: additional arguments to pass to `save_tile_info`        :param dedup: whether to deduplicate the tile, see :meth:`cache_tiles`        :return: tuple `(img_path, json_path)` of the files of the tile        """        if saver is None:            saver = loader        if saver_args is None:            saver_args = dict()        tile_args = self._tile_args(zoom, saver.output_tree('tree_name'))        tile_args['dedup'] = dedup        create_dir(tile_args['img_dir'])        create_dir(tile_args['json_dir'])        grid = tile_args['grid']        i, j, img_filepath, branch_filepath, content_hash = _render_tile(            self.__get_index(loader), self._get_opacities(zoom, loader), self.zoom_levels[zoom], tile_args, col, row        )        profile.count('tiles', zoom=zoom)        self.__tile_files.setdefault(tile_args['img_dir'], dict())[col * grid + row] = (img_filepath, branch_filepath)        saver.save_tile_info(            zoom_level=zoom, img_path=img_filepath, json_path=branch_filepath,            grid_location=(row, col), tile_position=(col / grid, row / grid), tile_index=col * grid + row,            num_bytes=_tile_bytes(img_filepath, branch_filepath), content_hash=content_hash,            tree_version=self.tree_version(loader), **saver_args        )        return img_filepath, branch_filepath    def __render_tiles(self, zoom, loader, tile_args, order, requested):        # renders the tiles of the list of (column, row) `order` one row of the grid at a time, and the tiles in the set        # `requested` one at a time, into a single image surface cleared between tiles, drawing the branches the spatial        # index finds in the row; yields (column, row, image path, json path, content hash) of each tile once it has        # been saved, or (column, row, image data, json data, content hash) without saving the tile if rendering into an        # archive        index = self.__get_index(loader)        opacities, visible = self._get_opacities(zoom, loader), self.zoom_levels[zoom]        grid, archive = tile_args['grid'], tile_args['archive']        if not archive:            create_dir(tile_args['img_dir'])            create_dir(tile_args['json_dir'])        tile = cairo.ImageSurface(cairo.Format.RGB24, *tile_args['img_size'])        ctx = cairo.Context(tile)        tile_index, num_tiles = 0, len(order)        print('  Rendering {}x{} grid...'.format(grid, grid))        for j, columns in _group_strips(order, requested):            with profile.timer('assign', zoom=zoom):                strip = _strip_branches(index, grid, j)            for i in columns:                contained_branches = _paint_tile(ctx, strip[i], opacities, visible, tile_args, i, j)                img_data, json_data = _encode_tile(tile, contained_branches, zoom=zoom)                if archive:                    yield i, j, img_data, json_data, _tile_hash(img_data, json_data)                else:                    yield (i, j) + _write_tile(tile_args, i, j, img_data, json_data)                tile_index += 1                print('    tile {} out of {}, {:.1f}%\r'.format(                    tile_index, num_tiles, tile_index / num_tiles * 100), end=''                )    def __render_tiles_parallel(self, zoom, loader, tile_args, jobs, order):        # renders batches of tiles of the list of (column, row) `order` in a pool of `jobs` worker processes, yields the        # same tuples as `__render_tiles()` for each tile as the batches are completed, in order        geometry, opacities = [], self._get_opacities(zoom, loader)        branches = loader.branches        for k in range(loader.num_branches):            branch = branches[k]            if opacities.get(branch.depth, 0.0) > 0.0:                geometry.append(_branch_geometry(branch))        grid = tile_args['grid']        num_tiles = len(order)        print('  Rendering {}x{} grid with {} jobs...'.format(grid, grid, jobs))        # create directories before starting workers, so they do not race to create them        if not tile_args.get('archive', False):            create_dir(tile_args['img_dir'])            create_dir(tile_args['json_dir'])        tile_index = 0        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_tile_worker,                                 initargs=(geometry, opacities, self.zoom_levels[zoom], tile_args)) as pool:            batches = [order[k:k + grid] for k in range(0, num_tiles, grid)]            for batch, stats in pool.map(_render_tile_batch, batches):                if stats is not None and profile.get_profile() is not None:                    profile.get_profile().merge(stats)                for tile in batch:                    yield tile                    tile_index += 1                    print('    tile {} out of {}, {:.1f}%\r'.format(                        tile_index, num_tiles, tile_index / num_tiles * 100), end=''                    )    def update_tiles(self, loader: Loader, indices: List[int], zoom: int, saver: Loader = None,                     saver_args: dict = None, dedup: bool = False):        """        Re-render only the tiles at zoom level :param:`zoom` overlapped by the branches at :param:`indices` of        `loader.branches`, e.g. after the text of those branches has changed. The images and JSON files of the tiles are        overwritten and their tile information saved again with `save_tile_info` of :param:`saver`; unlike        :meth:`cache_tiles`, the zoom level information is not saved again, so existing tile entries are updated in        place. The tree does not need to be rendered with :meth:`render_tree` first.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :param indices: indices in `loader.branches` of the branches that changed        :param zoom: zoom level of the tiles to re-render, must have been rendered with :meth:`cache_tiles` before        :param saver: :class:`Loader` instance to call for saving tile information; defaults to :param:`loader`        :param saver_args: additional arguments to pass to every call to `save_tile_info`        :param dedup: whether to deduplicate the tiles, see :meth:`cache_tiles`        :return: list of `(row, col)` of the tiles that were re-rendered        """        tiles = self.get_dirty_tiles(loader, indices, zoom)        grid = self.grid_levels[zoom]        print('  Re-rendering {} of {} tiles ...'.format(len(tiles), grid*grid))        for row, col in tiles:            self.render_tile(loader, zoom, row, col, saver=saver, saver_args=saver_args, dedup=dedup)        return tiles    def pack_tiles(self, zoom: int, saver: Loader, saver_args: dict = None) -> int:        """        Merge the tiles at zoom level :param:`zoom` that are saved as separate image and JSON files, e.g. tiles        re-rendered with :meth:`update_tiles` or :meth:`render_tile`, into the archive of the zoom level. The archive is        rewritten with the data of the separate files replacing that of the same tiles in the existing archive, the        separate files are removed, and the tile information of the merged tiles is saved again to refer to the archive.        Deduplicated tiles are found through the paths recorded by this renderer when saving them. Nothing is merged if        the zoom level has not been rendered into an archive before, see :meth:`cache_tiles`.        :param zoom: zoom level of the tiles        :param saver: :class:`Loader` instance to call for saving tile information        :param saver_args: additional arguments to pass to every call to `save_tile_info`        :return: number of tiles merged into the archive        """        if saver_args is None:            saver_args = dict()        tile_args = self._tile_args(zoom, saver.output_tree('tree_name'))        grid, archive_filepath = tile_args['grid'], tile_args['archive_file']        if not os.path.isfile(archive_filepath):            return 0        old_archive = TileArchive(archive_filepath)        tile_files = self.__tile_files.pop(tile_args['img_dir'], dict())        packed = []        with TileArchiveWriter(archive_filepath, grid) as writer:            for i in range(grid):                for j in range(grid):                    tile_index = i * grid + j                    file_name = _tile_file_name(zoom, tile_args['tile_size'], i, j)                    img_filepath, branch_filepath = tile_files.get(tile_index, (                        os.path.join(tile_args['img_dir'], file_name + '.png'),                        os.path.join(tile_args['json_dir'], file_name + '.json')                    ))                    if img_filepath == EMPTY_TILE:                        img_data, json_data, _ = empty_tile(tile_args['img_size'])                    elif os.path.isfile(img_filepath) and os.path.isfile(branch_filepath):                        with open(img_filepath, mode='rb') as img_file, open(branch_filepath, mode='rb') as branch_file:                            img_data, json_data = img_file.read(), branch_file.read()                    elif old_archive.has_tile(tile_index):                        img_data, json_data = old_archive.img(tile_index), old_archive.json(tile_index)                        writer.add(tile_index, img_data, json_data, content_hash=_tile_hash(img_data, json_data))                        continue                    else:                        continue                    content_hash = _tile_hash(img_data, json_data)                    writer.add(tile_index, img_data, json_data, content_hash=content_hash)                    packed.append((i, j, img_filepath, branch_filepath, len(img_data) + len(json_data), content_hash))        for i, j, img_filepath, branch_filepath, num_bytes, content_hash in packed:            # tile information refers to the archive before the separate files are removed            saver.save_tile_info(                zoom_level=zoom, img_path=archive_filepath, json_path=archive_filepath,                grid_location=(j, i), tile_position=(i / grid, j / grid), tile_index=i * grid + j,                num_bytes=num_bytes, content_hash=content_hash, **saver_args            )            for path in [img_filepath, branch_filepath]:                # files of deduplicated tiles may be shared by several tiles                if path != EMPTY_TILE and os.path.isfile(path):                    os.remove(path)        print('  Packed {} tiles into {}'.format(len(packed), path_from(archive_filepath, 4)))        return len(packed)    def tile_order(self, zoom: int, requested: List[tuple] = None) -> List[tuple]:        """        Returns every tile of the grid of zoom level :param:`zoom` in the order they should be rendered in, so that the        tiles users are most likely to look at first are done first: the tiles in :param:`requested`, followed by the        remaining tiles ordered by the distance of their centers from :attr:`TRUNK_POSITION`, the base of the tree.        :param zoom: zoom level of the tiles        :param requested: list of `(row, col)` of tiles requested by clients, in the order to render them in; tiles            outside of the grid are ignored        :return: list of `(col, row)` of the tiles, i.e `(i, j)` as rendered by :meth:`cache_tiles`        """        grid = self.grid_levels[zoom]        trunk_x, trunk_y = Renderer.TRUNK_POSITION        order, seen = [], set()        for row, col in requested or []:            if 0 <= row < grid and 0 <= col < grid and (col, row) not in seen:                order.append((col, row))                seen.add((col, row))        def distance(tile):            i, j = tile            return ((i + 0.5) / grid - trunk_x) ** 2 + ((j + 0.5) / grid - trunk_y) ** 2        rest = [(i, j) for i in range(grid) for j in range(grid) if (i, j) not in seen]        order.extend(sorted(rest, key=distance))        return order    def get_dirty_tiles(self, loader: Loader, indices: List[int], zoom: int) -> List[tuple]:        """        Returns the tiles at zoom level :param:`zoom` that have to be re-rendered when the branches at :param:`indices`        of `loader.branches` change. Branches that are not drawn at the zoom level do not affect any tile.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :param indices: indices in `loader.branches` of the branches that changed        :param zoom: zoom level of the tiles        :return: sorted list of `(row, col)` of the tiles overlapped or touched by the bounding boxes of the branches        """        grid = self.grid_levels[zoom]        branches, num_branches = loader.branches, loader.num_branches        tiles = set()        for k in indices:            if not 0 <= k < num_branches:                continue            branch = branches[k]            if self.get_opacity(zoom, branch.depth) <= 0.0:                continue            min_x, min_y, max_x, max_y = branch.rect.bounds            # same tiles as the branch can be listed in when rendered, see `_strip_branches()`            for row in _tile_range(min_y, max_y, grid):                for col in _tile_range(min_x, max_x, grid):                    tiles.add((row, col))        return sorted(tiles)    def tile_branches(self, loader: Loader, zoom: int, row: int, col: int) -> List[Branch]:        """        Returns the branches of `loader.branches` listed in the JSON file of the tile at (:param:`row`, :param:`col`) of        zoom level :param:`zoom`, i.e the branches visible at the zoom level that intersect the tile, without rendering        the tile.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :param zoom: zoom level of the tile        :param row: zero-indexed row of the tile        :param col: zero-indexed column of the tile        :return: list of :class:`Branch` objects        """        return self.__get_index(loader).query_tile(row, col, self.grid_levels[zoom], max_depth=self.zoom_levels[zoom])    def branch_at(self, loader: Loader, x: float, y: float, zoom: int = None) -> Branch:        """        Returns the topmost branch of `loader.branches` at the point (:param:`x`, :param:`y`) of the unit square the        tree is drawn in, i.e. the deepest branch containing the point, and of those the one drawn last. The branch is        looked up in the spatial index over the branches, see :meth:`BranchIndex.hit`.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :param x: x-coordinate of the point        :param y: y-coordinate of the point        :param zoom: if not `None`, only branches listed in the tiles of this zoom level are considered        :return: :class:`Branch` object, `None` if there is no branch at the point        """        max_depth = self.zoom_levels[zoom] if zoom is not None else None        hits = self.__get_index(loader).hit(x, y, max_depth=max_depth)        if not hits:            return None        # branches are drawn layer by layer, in order within a layer        top = hits[0]        for branch in hits[1:]:            if branch.depth >= top.depth:                top = branch        return top    def _tile_args(self, zoom: int, tree_name: str) -> dict:        # dictionary describing the tiles at zoom level `zoom`, as expected by `_render_tile()`        grid = self.grid_levels[zoom]        return {            'zoom': zoom,            'grid': grid,            'tile_size': (Renderer.BASE_WIDTH / grid, Renderer.BASE_HEIGHT / grid),            'img_size': (Renderer.BASE_WIDTH//4, Renderer.BASE_HEIGHT//4),            'img_dir': os.path.join(current_app.config['CACHE_DIR'], '{}/images/png/zoom_{}'.format(tree_name, zoom)),            'json_dir': os.path.join(current_app.config['CACHE_DIR'], '{}/json/zoom_{}'.format(tree_name, zoom)),            'archive_file': os.path.join(current_app.config['CACHE_DIR'], '{}/archive/zoom_{}.tiles'.format(                tree_name, zoom))        }    def _get_opacities(self, zoom: int, loader: Loader) -> dict:        # map of depth to opacity of the branches at that depth, for every layer of the tree in `loader`        return {depth: self.get_opacity(zoom, depth) for depth in range(len(loader.layers))}    def tree_version(self, loader: Loader) -> str:        """        Returns the version of the branches in `loader.branches` as rendered by this renderer, i.e. a hash of the        geometry and text of every branch along with the zoom and grid levels. Tiles rendered from the same version of        the tree are identical, see :meth:`cache_tiles`.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        :return: hex digest of the version        """        if self.__version[0] is not loader:            h = hashlib.sha1(repr((self.zoom_levels, self.grid_levels)).encode('utf-8'))            branches = loader.branches            for k in range(loader.num_branches):                h.update(repr(_branch_geometry(branches[k])).encode('utf-8'))            self.__version = (loader, h.hexdigest())        return self.__version[1]    def __load_done_tiles(self, zoom: int, saver: Loader, saver_args: dict, tree_version: str) -> dict:        # returns (img_path, json_path) of the tiles of `zoom` already rendered from `tree_version` whose files still        # exist, keyed by tile index        checkpoint = saver.load_checkpoint(zoom_level=zoom, tree_version=tree_version, **saver_args)        if checkpoint is None:            return dict()        done = dict()        for tile_index, (img_path, json_path) in checkpoint['tiles'].items():            if img_path == EMPTY_TILE or (os.path.isfile(img_path) and os.path.isfile(json_path)):                done[tile_index] = (img_path, json_path)        grid = self.grid_levels[zoom]        print('  Resuming zoom level {}, {} of {} tiles already rendered'.format(zoom, len(done), grid*grid))        return done    def build_index(self, loader: Loader):        """        Builds the spatial index over the branches of `loader.branches` that tiles are rendered and branches are looked        up with, if it has not been built yet. The index is otherwise built by the first method needing it; building it        beforehand lets several threads use the renderer for the same branches without modifying it.        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree        """        self.__get_index(loader)    def __get_index(self, loader: Loader) -> BranchIndex:        # returns spatial index over the branches of `loader`, building it if the branches have not been indexed        if self.__index[0] is not loader:            print('  Building spatial index of branches ...')            with profile.timer('index'):                self.__index = (loader, BranchIndex(loader.branches, loader.num_branches))        return self.__index[1]    @property    def max_zoom_level(self):        return len(self.zoom_levels) - 1if __name__ == "__main__":    renderer = Renderer()    renderer.render_tree(zoom=7)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import math
+from typing import TextIO
+from xml.sax.saxutils import escape
+
+import cairo
+
+from wordstree.graphics.branch import Branch, _get_depth_color
+from wordstree.graphics.loader import Loader
+from wordstree.graphics.text import layout_text
+
+# stroke width of the outline of the text on branches, as drawn by `Branch.draw()`
+TEXT_LINE_WIDTH = 0.0002
+
+
+def _color(rgb) -> str:
+    return 'rgb({:.0f},{:.0f},{:.0f})'.format(*[c * 255 for c in rgb])
+
+
+class SVGWriter:
+    """
+    Writes a SVG image of a tree to a file stream one branch at a time, instead of building the image in memory first.
+    Branches are written layer by layer, each layer as a group carrying the fill color and opacity shared by the
+    branches at that depth, followed by a group with the text drawn on the branches of the layer. Memory use does not
+    depend on the number of branches.
+
+    Coordinates of branches are normalized to the unit square, as in :class:`Branch`, and written scaled to the
+    dimensions of the image.
+    """
+
+    def __init__(self, file: TextIO, width: int, height: int):
+        """
+        :param file: file opened for writing text to
+        :param width: width of the image
+        :param height: height of the image
+        """
+        self.__file = file
+        self.__width = width
+        self.__height = height
+
+        # text is laid out with the same context settings as `Branch.draw()`
+        self.__ctx = cairo.Context(cairo.ImageSurface(cairo.Format.RGB24, 1, 1))
+        self.__ctx.select_font_face('Impact', cairo.FontSlant.NORMAL, cairo.FontWeight.BOLD)
+
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        file.write('<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">\n'.format(
+            w=width, h=height
+        ))
+        file.write('<rect width="{}" height="{}" fill="white"/>\n'.format(width, height))
+
+    def write_tree(self, loader: Loader, opacities: dict):
+        """
+        Writes the branches of `loader.branches`, layer by layer using `loader.layers`.
+
+        :param loader: :class:`Loader` instance containing the list of `Branch` objects representing the tree
+        :param opacities: map of branch depth to the opacity the branches at that depth are drawn with; layers with an
+            opacity of `0` or not in the map are left out
+        """
+        layers, branches, num_branches = loader.layers, loader.branches, loader.num_branches
+        num_layers = len(layers)
+
+        for depth in range(num_layers):
+            opacity = opacities.get(depth, 0.0)
+            if opacity <= 0.0:
+                continue
+
+            start = layers[depth]
+            end = layers[depth + 1] if depth + 1 < num_layers else num_branches
+            if start >= end:
+                continue
+            self.write_layer(depth, branches, start, end, opacity)
+
+            print('    layer {}, branch {:d} of {}, {:.0f}% \r'.format(
+                depth, end, num_branches, (end / num_branches) * 100
+            ), end='')
+        print()
+
+    def write_layer(self, depth: int, branches, start: int, end: int, opacity: float):
+        """
+        Writes the branches of one layer of the tree, followed by the text on them.
+
+        :param depth: depth of the branches in the layer
+        :param branches: list of :class:`Branch` objects containing the layer
+        :param start: index in `branches` of the first branch of the layer
+        :param end: index in `branches` past the last branch of the layer
+        :param opacity: opacity of the layer
+        """
+        file = self.__file
+        sx, sy = self.__width, self.__height
+
+        file.write('<g id="layer-{}" fill="{}" fill-opacity="{:.3f}" stroke="none">\n'.format(
+            depth, _color(_get_depth_color(depth)), opacity
+        ))
+        has_text = False
+        for k in range(start, end):
+            branch = branches[k]
+            has_text = has_text or bool(branch.text)
+            points = branch.rect.points
+            file.write('<path d="M{:.3f} {:.3f}L{:.3f} {:.3f}L{:.3f} {:.3f}L{:.3f} {:.3f}Z"/>\n'.format(
+                *[c for p in points for c in (p.x * sx, p.y * sy)]
+            ))
+        file.write('</g>\n')
+
+        if has_text:
+            file.write(
+                '<g id="text-{}" font-family="Impact" font-weight="bold" fill="white" stroke="black" '
+                'stroke-width="{:.3f}" fill-opacity="{:.3f}" stroke-opacity="{:.3f}">\n'.format(
+                    depth, TEXT_LINE_WIDTH * sx, opacity, opacity
+                )
+            )
+            for k in range(start, end):
+                if branches[k].text:
+                    self.__write_text(branches[k])
+            file.write('</g>\n')
+
+    def __write_text(self, branch: Branch):
+        # writes the text on `branch` with the same layout and placement as `Branch.draw()`
+        msg = ' '.join(branch.text.upper())
+        length, angle = branch.length, branch.angle
+        layout = layout_text(self.__ctx, msg, length, branch.width)
+        sx = self.__width
+
+        if math.pi/2 <= angle <= 3*math.pi/2:
+            rotation, dx = angle + math.pi, -length
+        else:
+            rotation, dx = angle, 0
+        dx += length/2 - layout.width/2
+
+        self.__file.write(
+            '<text font-size="{:.3f}" transform="translate({:.3f} {:.3f}) rotate({:.3f}) translate({:.3f} {:.3f})">'
+            '{}</text>\n'.format(
+                layout.font_size * sx, branch.pos.x * sx, branch.pos.y * self.__height, math.degrees(rotation),
+                dx * sx, layout.height / 2 * sx, escape(layout.text)
+            )
+        )
+
+    def write_grid(self, grid: int):
+        """
+        Writes the lines of a `grid`x`grid` grid over the image, with the coordinates of each cell if the grid is at
+        most 40 cells wide.
+        """
+        file = self.__file
+        sx, sy = self.__width, self.__height
+        dx = 1 / grid
+
+        file.write('<g stroke="red" stroke-width="{:.4f}" fill="none">\n'.format(0.0001 * sx))
+        for i in range(grid + 1):
+            x = i * dx
+            # horizontal and vertical line
+            file.write('<path d="M0 {y:.3f}H{w}M{x:.3f} 0V{h}"/>\n'.format(x=x * sx, y=x * sy, w=sx, h=sy))
+        file.write('</g>\n')
+
+        if grid > 40:
+            return
+
+        file.write('<g fill="red" font-size="{:.3f}">\n'.format(0.001 * sx))
+        for i in range(grid + 1):
+            x = i * dx
+            for j in range(grid + 1):
+                y = j * dx + dx
+                file.write('<text x="{:.3f}" y="{:.3f}">({}, {}):({:.2f}, {:.2f})</text>\n'.format(
+                    (x + 0.003) * sx, (y - 0.003) * sy, i, j, x, y
+                ))
+        file.write('</g>\n')
+
+    def close(self):
+        """
+        Ends the document. The file stream is not closed.
+        """
+        self.__file.write('</svg>\n')
@@ -0,0 +1,98 @@
+import math
+from collections import OrderedDict, namedtuple
+
+import cairo
+
+# smallest font size text on a branch is shrunk to
+MIN_FONT_SIZE = 0.0001
+# text drawn on a branch can take up at most this fraction of the length of the branch
+MAX_TEXT_RATIO = 0.6
+# text is drawn at this fraction of the width of the branch, unless it has to be shrunk to fit
+FONT_SIZE_RATIO = 0.6
+# padding repeated on both sides of text that is shorter than the branch
+FILLER = '—  '
+# maximum number of layouts kept by `layout_text()`
+MAX_CACHED_LAYOUTS = 2 ** 16
+
+TextLayout = namedtuple('TextLayout', ['font_size', 'num_fillers', 'text', 'width', 'height'])
+TextLayout.__doc__ = """
+Layout of the text drawn on a branch: the font size, the number of fillers on each side of the message, the full text
+with the fillers, and the width and height of the extents of the full text at that font size.
+"""
+
+# layouts keyed by (message, length of branch, width of branch), least recently used first
+__layouts = OrderedDict()
+
+
+def fit_font_size(ctx: cairo.Context, msg: str, font_size: float, max_width: float) -> float:
+    """
+    Returns the largest font size not larger than `font_size` at which `msg` is at most `max_width` wide, but no smaller
+    than `MIN_FONT_SIZE`. The width of text grows linearly with the font size, so the size is computed directly from the
+    width at `font_size`; a binary search corrects for the rare case where hinting makes the text slightly wider.
+    Note: leaves the font size of `ctx` set to the returned size.
+
+    :param ctx: context with the font face of the text selected
+    :param msg: text to fit
+    :param font_size: largest font size of the text
+    :param max_width: maximum width of the text
+    :return: the font size
+    """
+    ctx.set_font_size(font_size)
+    width = ctx.text_extents(msg).width
+    if width <= max_width:
+        return font_size
+
+    size = max(font_size * max_width / width, MIN_FONT_SIZE)
+    ctx.set_font_size(size)
+    if size > MIN_FONT_SIZE and ctx.text_extents(msg).width > max_width:
+        low, high = MIN_FONT_SIZE, size
+        for i in range(20):
+            size = (low + high) / 2
+            ctx.set_font_size(size)
+            if ctx.text_extents(msg).width > max_width:
+                high = size
+            else:
+                low = size
+        size = low
+        ctx.set_font_size(size)
+    return size
+
+
+def layout_text(ctx: cairo.Context, msg: str, length: float, width: float) -> TextLayout:
+    """
+    Returns the layout of message `msg` on a branch of dimensions `length` x `width`: text that does not fit within
+    `MAX_TEXT_RATIO` of the length is shrunk, shorter text is padded with fillers on both sides. Layouts are kept for
+    the most recently drawn `MAX_CACHED_LAYOUTS` messages and branch dimensions, since the same branch is drawn on every
+    tile it overlaps and at every zoom level.
+    Note: sets the font size of `ctx` to the font size of the layout.
+
+    :param ctx: context with the font face of the text selected
+    :param msg: message to draw on the branch
+    :param length: length of the branch
+    :param width: width of the branch
+    :return: :class:`TextLayout` of the message
+    """
+    key = (msg, length, width)
+    layout = __layouts.get(key, None)
+    if layout is not None:
+        __layouts.move_to_end(key)
+        ctx.set_font_size(layout.font_size)
+        return layout
+
+    max_font_size = width * FONT_SIZE_RATIO
+    ft_size = fit_font_size(ctx, msg, max_font_size, MAX_TEXT_RATIO * length)
+
+    num_fillers = 0
+    if ft_size == max_font_size:
+        msg_extents = ctx.text_extents(msg)
+        filler_extents = ctx.text_extents(FILLER)
+        num_fillers = max(math.floor((length - msg_extents.width) / filler_extents.x_advance / 2) - 2, 0)
+
+    full_msg = '{}    {}    {}'.format(FILLER * num_fillers, msg, FILLER * num_fillers).strip()
+    extents = ctx.text_extents(full_msg)
+
+    layout = TextLayout(ft_size, num_fillers, full_msg, extents.width, extents.height)
+    __layouts[key] = layout
+    if len(__layouts) > MAX_CACHED_LAYOUTS:
+        __layouts.popitem(last=False)
+    return layout
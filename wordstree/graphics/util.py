@@ -3,9 +3,12 @@ from wordstree.graphics import *
 import json
 
 from cairo import Matrix
+import numpy as np
 
 
 class JSONifiable:
+    __slots__ = ()
+
     def json_obj(self):
         pass
 
@@ -94,6 +97,7 @@ def radians(deg: float) -> float:
 class Vec(JSONifiable):
     """Represents vector in 2D. Offers overloaded `__str__` method for easier printing.
     """
+    __slots__ = ('__x', '__y')
 
     def __init__(self, x: float, y: float):
         self.__x = x
@@ -125,8 +129,10 @@ class Vec(JSONifiable):
 
 class Rect(object):
     """
-    Represents a rectangle in a plane in any orientation.
+    Represents a rectangle in a plane in any orientation. The rotation matrices and vertices of the rectangle are only
+    computed when first needed, and then kept.
     """
+    __slots__ = ('__pos', '__dx', '__dy', '__angle', '__matrix', '__inv_matrix', '__points')
 
     def __init__(self, pos: Vec, dx: float, dy: float, angle: float = 0):
         """
@@ -141,8 +147,9 @@ class Rect(object):
         self.__dx = dx
         self.__dy = dy
         self.__angle = angle
-        self.__matrix = Matrix.init_rotate(-angle)
-        self.__inv_matrix = Matrix.init_rotate(angle)
+        self.__matrix = None
+        self.__inv_matrix = None
+        self.__points = None
 
     def _to_rect_basis(self, x, y):
         """
@@ -150,6 +157,8 @@ class Rect(object):
         standard basis vectors are rotated by `self.angle` radians, and the origin shifted to `self.pos`
         (top-left corner of rectangle).
         """
+        if self.__matrix is None:
+            self.__matrix = Matrix.init_rotate(-self.__angle)
         x1, y1 = self.__matrix.transform_point(x - self.pos.x, y - self.pos.y)
         return Vec(x1, y1)
 
@@ -157,6 +166,8 @@ class Rect(object):
         """
         Inverse of `_to_rect_basis()`.
         """
+        if self.__inv_matrix is None:
+            self.__inv_matrix = Matrix.init_rotate(self.__angle)
         x1, y1 = self.__inv_matrix.transform_point(x, y)
         return Vec(x1 + self.pos.x, y1 + self.pos.y)
 
@@ -167,14 +178,27 @@ class Rect(object):
         :return: list of `Vec` objects [top-left, top-right, bottom-right, bottom-left] representing
          the vertices of the rectangle
         """
-        dx, dy = self.dx, self.dy
+        if self.__points is None:
+            dx, dy = self.dx, self.dy
+
+            top_left = self.pos
+            top_right = self._from_rect_basis(dx, 0)
+            bot_right = self._from_rect_basis(dx, dy)
+            bot_left = self._from_rect_basis(0, dy)
 
-        top_left = self.pos
-        top_right = self._from_rect_basis(dx, 0)
-        bot_right = self._from_rect_basis(dx, dy)
-        bot_left = self._from_rect_basis(0, dy)
+            self.__points = top_left, top_right, bot_right, bot_left
+        return self.__points
 
-        return top_left, top_right, bot_right, bot_left
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """
+        Returns the axis-aligned bounding box of the rectangle.
+        :return: tuple `(min_x, min_y, max_x, max_y)` of the smallest axis-aligned box containing the rectangle
+        """
+        points = self.points
+        xs = [p.x for p in points]
+        ys = [p.y for p in points]
+        return min(xs), min(ys), max(xs), max(ys)
 
     @property
     def angle(self) -> float:
@@ -247,6 +271,17 @@ def project_rectangle(angle: float, rect: Rect):
     return left, right
 
 
+def bounds_intersect(bounds1: Tuple[float, float, float, float], bounds2: Tuple[float, float, float, float]) -> bool:
+    """
+    Check whether two axis-aligned boxes, as returned by :attr:`Rect.bounds`, overlap.
+    :param bounds1: tuple `(min_x, min_y, max_x, max_y)` of one of the boxes
+    :param bounds2: tuple `(min_x, min_y, max_x, max_y)` of one of the boxes
+    :return: whether the two boxes overlap or not
+    """
+    return bounds1[0] <= bounds2[2] and bounds2[0] <= bounds1[2] and \
+        bounds1[1] <= bounds2[3] and bounds2[1] <= bounds1[3]
+
+
 def rectangle_intersect(rect1: Rect, rect2: Rect):
     """
     Check whether the two rectangles intersect or not using Seprating axis theorem. If the projection of both
@@ -260,8 +295,8 @@ def rectangle_intersect(rect1: Rect, rect2: Rect):
         left1, right1 = project_rectangle(angle, rect1)
         left2, right2 = project_rectangle(angle, rect2)
 
-        # no overlap
-        if not (left1 <= left2 <= right1 or left1 <= right2 <= right1):
+        # no overlap, either projection may contain the other
+        if not (left1 <= right2 and left2 <= right1):
             return False
         return True
 
@@ -287,3 +322,45 @@ def rectangle_intersect(rect1: Rect, rect2: Rect):
 
     # rectangles intersect
     return True
+
+
+def _project_corners(cos_theta, sin_theta, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+    # returns the (left, right) endpoints of the projections of the rectangles with corners `xs`, `ys` onto lines at
+    # the angles given by `cos_theta` and `sin_theta`, see `project_rectangle()`; the last axis of `xs` and `ys`
+    # holds the corners of each rectangle
+    projections = xs * cos_theta + ys * sin_theta
+    return projections.min(axis=-1), projections.max(axis=-1)
+
+
+def rectangles_intersect(rect: Rect, corners: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    Batch version of :func:`rectangle_intersect`: checks whether `rect` intersects each of `N` rectangles at once,
+    using the Separating axis theorem. The corners of the rectangles are projected onto the two axes of `rect` and
+    onto the two axes of each rectangle in vectorized form.
+    :param rect: `Rect` object representing the rectangle to check against every other rectangle, e.g. a tile
+    :param corners: array of shape `(N, 4, 2)` with the (x, y) of the corners of each rectangle, as in
+        :attr:`Rect.points`, e.g. returned by :meth:`BranchArray.corners`
+    :param angles: array of shape `(N,)` of the angle of each rectangle, in radians
+    :return: boolean array of shape `(N,)`, whether `rect` intersects each rectangle
+    """
+    points = rect.points
+    rect_xs = np.array([p.x for p in points])
+    rect_ys = np.array([p.y for p in points])
+    xs, ys = corners[:, :, 0], corners[:, :, 1]
+
+    mask = np.ones(len(angles), dtype=bool)
+    # axes of `rect`, the same for every rectangle
+    for angle in [rect.angle, rect.angle - HALF_PI]:
+        cos_theta, sin_theta = math.cos(angle), math.sin(angle)
+        left1, right1 = _project_corners(cos_theta, sin_theta, rect_xs, rect_ys)
+        left2, right2 = _project_corners(cos_theta, sin_theta, xs, ys)
+        mask &= (left1 <= right2) & (left2 <= right1)
+
+    # axes of each rectangle
+    for axes in [angles, angles - HALF_PI]:
+        cos_theta, sin_theta = np.cos(axes)[:, np.newaxis], np.sin(axes)[:, np.newaxis]
+        left1, right1 = _project_corners(cos_theta, sin_theta, rect_xs, rect_ys)
+        left2, right2 = _project_corners(cos_theta, sin_theta, xs, ys)
+        mask &= (left1 <= right2) & (left2 <= right1)
+
+    return mask
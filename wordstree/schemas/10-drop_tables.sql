@@ -1,6 +1,7 @@
 drop table if exists branches_ownership;
 drop table if exists branches;
 
+drop table if exists render_checkpoints;
 drop table if exists tiles;
 
 drop table if exists zoom_info;
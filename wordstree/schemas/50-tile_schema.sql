@@ -1,3 +1,4 @@
+drop table if exists render_checkpoints;
 drop table if exists tiles;
 drop table if exists zoom_info;
 
@@ -12,6 +13,7 @@ create table zoom_info (
     "image_height" real not null check ( image_height >= 0),
     "imgs_path" text not null,
     "jsons_path" text not null,
+    "archive_file" text,
     unique (zoom_level, tree_id)
 );
 
@@ -25,6 +27,19 @@ create table tiles (
     tile_row integer not null,
     tile_pos_x real not null,
     tile_pos_y real not null,
+    num_bytes integer not null default 0,
+    last_access real not null default 0,
+    content_hash text,
+    tree_version text,
     unique (zoom_id, tile_index)
+);
+
+create table render_checkpoints (
+    "zoom_id" integer primary key references zoom_info(zoom_id) on delete cascade,
+    "tree_version" text not null,
+    "num_tiles" integer not null default 0,
+    "tiles_done" integer not null default 0,
+    "finished" integer not null default 0,
+    "updated" real not null default 0
 )
 
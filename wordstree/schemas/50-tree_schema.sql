@@ -4,6 +4,7 @@ create table tree (
     tree_id integer primary key autoincrement,
     tree_name text default 'default_tree',
     full_width integer not null,
-    full_height integer not null
+    full_height integer not null,
+    seed integer default null
 );
 
@@ -110,7 +110,7 @@ class RenderJob:
     Holds information needed in order to carry out the rendering of the branches/tree. In particular, the `tree_id` and
     zoom levels.
     """
-    def __init__(self, tree_id, zoom_levels):
+    def __init__(self, tree_id, zoom_levels, branch_ids=None):
         """
         Create instance of :class:`RenderJob` with tree-id `tree_id` and zoom levels given by `zoom_levels`. Leaving
         :param:`zoom_levels` as `None` will result in all zoom levels being rendered (See :class:`Renderer`)
@@ -118,9 +118,12 @@ class RenderJob:
         :param tree_id: id of tree entry
         :param zoom_levels: list of zoom levels at which to render the branches; `None` corresponds to all possible zoom
             levels.
+        :param branch_ids: if not empty, ids of the branches that changed; only the tiles overlapped by those branches
+            are re-rendered
         """
         self.__id = None
         self.__tree_id = tree_id
+        self.__branch_ids = list(branch_ids) if branch_ids else []
 
         if zoom_levels is None:
             zoom_levels = []
@@ -139,6 +142,10 @@ class RenderJob:
     def zoom_levels(self):
         return self.__zoom_levels
 
+    @property
+    def branch_ids(self):
+        return self.__branch_ids
+
     @property
     def state(self):
         return self.__state
@@ -177,10 +184,18 @@ def _handle_render_jobs():
             zooms = ','.join(job.zoom_levels)
 
         tree_id = job.tree_id
+        args = ['-z', zooms, '-f', 'db:{}'.format(tree_id)]
+        if job.branch_ids:
+            args.extend(['--branches', ','.join([str(i) for i in job.branch_ids])])
+        if current_app.config.get('TILE_ARCHIVE', False):
+            args.append('--archive')
+        if current_app.config.get('TILE_DEDUP', False):
+            args.append('--dedup')
+        if current_app.config.get('RENDER_RESUME', False):
+            args.append('--resume')
 
         try:
-            current_app.cli.get_command(current_app.app_context(), 'render')\
-                .main(args=['-z', zooms, '-f', 'db:{}'.format(tree_id)])
+            current_app.cli.get_command(current_app.app_context(), 'render').main(args=args)
         except SystemExit as e:
             pass
 
@@ -216,12 +231,15 @@ def _start_thread():
     _set_thread(t)
 
 
-def render(zooms=None):
+def render(zooms=None, branch_ids=None):
     """
     Render the application tree (tree entry with tree-id given in application configuration under `TREE_ID`) at zoom
     levels specified in `zooms`.
     :param zooms: list of zoom levels to render the tree. Valid zoom levels can be found in `ZOOM_LEVELS` member of
         :class:`Renderer`. A value of `None` corresponds to all possible zoom levels.
+    :param branch_ids: ids of the branches that changed, eg. after a purchase. If provided, only the tiles overlapped by
+        these branches are re-rendered. Such jobs are always queued, since a job waiting in the queue may not cover the
+        same branches.
 
     :return: the job id of the resulting job. The rendering of the branches at the requested zoom levels will have
         completed once :meth:`last_render_job` returns an id greater that id of this job.
@@ -233,8 +251,8 @@ def render(zooms=None):
     size = q.qsize()
     min_job_id = _get_job_count()
 
-    if size < 2:
-        job = RenderJob(tree_id, zooms)
+    if size < 2 or branch_ids:
+        job = RenderJob(tree_id, zooms, branch_ids)
         q.put_nowait(job)
 
         # there should be only one thread doing the rendering
@@ -0,0 +1,300 @@
+import os
+import time
+from threading import Lock
+
+from flask import current_app
+
+from ..db import get_db
+from ..graphics.loader import DBLoader
+from ..graphics.records import StringTable, encode_branches
+from ..graphics.render import Renderer, EMPTY_TILE
+
+# only one tile is rendered at a time, so concurrent requests for the same missing tile render it once
+__lock = Lock()
+# the branches of a tree are read from the database and indexed once, see `_get_tree()`
+__trees_lock = Lock()
+# minimum number of seconds between two updates of the access time of a tile by `record_request()`
+REQUEST_INTERVAL = 10
+
+
+def _get_trees() -> dict:
+    """
+    Returns dictionary of tree-id and `(DBLoader, Renderer, dict)` tuples holding the branches of trees that tiles have
+    been rendered or read on request for, the renderer that keeps the spatial index over those branches, and the string
+    tables of the zoom levels of the tree keyed by zoom level. The dictionary is kept per application.
+    :return: dictionary of loader, renderer and string tables tuples, keyed by tree-id
+    """
+    return current_app.extensions.setdefault('tile_service', dict())
+
+
+def _get_tree(tree_id):
+    """
+    Returns :class:`DBLoader` instance with the branches of the tree with tree-id `tree_id` loaded and the
+    :class:`Renderer` instance to render its tiles with, reading the branches from the database the first time the tree
+    is requested. The spatial index of the renderer is built along with it, so that the renderer is not modified by
+    tiles being rendered and hit-tests at the same time.
+    :param tree_id: id of entry in `tree` table
+    :return: tuple of loader, renderer and string tables, `None` if the tree does not exist
+    """
+    with __trees_lock:
+        trees = _get_trees()
+        tree = trees.get(tree_id, None)
+        if tree is None:
+            loader = DBLoader(current_app._get_current_object())
+            try:
+                loader.load_branches(tree_id=tree_id)
+            except Exception:
+                return None
+            ren = Renderer()
+            ren.build_index(loader)
+            tree = (loader, ren, dict())
+            trees[tree_id] = tree
+        return tree
+
+
+def invalidate(tree_id):
+    """
+    Drops the branches of the tree with tree-id `tree_id` held in memory, so that they are read from the database again
+    the next time a tile of the tree has to be rendered. Should be called after the branches of the tree change.
+    :param tree_id: id of entry in `tree` table
+    """
+    with __trees_lock:
+        _get_trees().pop(int(tree_id), None)
+
+
+def render_tile(tree_id, zoom_level, row, col):
+    """
+    Renders the tile at (`row`, `col`) of zoom level `zoom_level` of the tree with tree-id `tree_id`, saves its files to
+    the cache directory and its entry to `tiles` table. Zoom level information is added to `zoom_info` table if the tree
+    has not yet been rendered at the zoom level. Once the tile is added, least recently accessed tiles other than the
+    tile itself are evicted if tiles exceed the byte budget, see :func:`evict`.
+
+    :param tree_id: id of entry in `tree` table
+    :param zoom_level: zoom level of the tile
+    :param row: zero-indexed row of the tile
+    :param col: zero-indexed column of the tile
+    :return: the entry of the tile in `tiles` table, `None` if there is no such tile
+    """
+    tree_id, zoom_level, row, col = int(tree_id), int(zoom_level), int(row), int(col)
+    ren = Renderer()
+    if not 0 <= zoom_level <= ren.max_zoom_level:
+        return None
+
+    grid = ren.grid_levels[zoom_level]
+    if not (0 <= row < grid and 0 <= col < grid):
+        return None
+
+    with __lock:
+        tree = _get_tree(tree_id)
+        if tree is None:
+            return None
+        loader, ren, _ = tree
+
+        if zoom_level not in loader.load_zoom_levels():
+            ren.save_zoom_info(zoom_level, loader)
+        ren.render_tile(loader, zoom_level, row, col, dedup=current_app.config.get('TILE_DEDUP', False))
+
+        cur = get_db().cursor()
+        cur.execute('SELECT * FROM tiles INNER JOIN zoom_info zi ON tiles.zoom_id = zi.zoom_id WHERE '
+                    'zoom_level=? AND tree_id=? AND tile_row=? AND tile_col=?', [zoom_level, tree_id, row, col])
+        tile = cur.fetchone()
+
+        touch(tile['tile_id'])
+        evict(keep=[tile['tile_id']])
+
+    return tile
+
+
+def _get_strings(tree, zoom_level) -> StringTable:
+    # returns string table of the texts of the branches of `tree` visible at `zoom_level`, built once per zoom level
+    loader, ren, tables = tree
+    strings = tables.get(zoom_level, None)
+    if strings is None:
+        max_depth = ren.zoom_levels[zoom_level]
+        branches = loader.branches
+        strings = StringTable([branches[k] for k in range(loader.num_branches) if branches[k].depth <= max_depth])
+        tables[zoom_level] = strings
+    return strings
+
+
+def tile_records(tree_id, zoom_level, row, col):
+    """
+    Returns the branches listed in the JSON file of the tile at (`row`, `col`) of zoom level `zoom_level` of the tree
+    with tree-id `tree_id` as binary records, see :func:`encode_branches`. The records are read from the branches of the
+    tree held in memory, so the tile does not need to have been rendered. The texts of the branches are given by ids
+    into the string table of the zoom level, see :func:`tile_strings`.
+
+    :param tree_id: id of entry in `tree` table
+    :param zoom_level: zoom level of the tile
+    :param row: zero-indexed row of the tile
+    :param col: zero-indexed column of the tile
+    :return: the records, `None` if there is no such tile
+    """
+    tree_id, zoom_level, row, col = int(tree_id), int(zoom_level), int(row), int(col)
+    ren = Renderer()
+    if not 0 <= zoom_level <= ren.max_zoom_level:
+        return None
+
+    grid = ren.grid_levels[zoom_level]
+    if not (0 <= row < grid and 0 <= col < grid):
+        return None
+
+    with __lock:
+        tree = _get_tree(tree_id)
+        if tree is None:
+            return None
+        loader, ren, _ = tree
+        return encode_branches(ren.tile_branches(loader, zoom_level, row, col), _get_strings(tree, zoom_level))
+
+
+def hit_test(tree_id, points, zoom_level=None):
+    """
+    Returns the topmost branch of the tree with tree-id `tree_id` at each of `points`, see :meth:`Renderer.branch_at`,
+    along with its ownership information and text. Branches are looked up in the spatial index over the branches of
+    the tree held in memory, and their ownership is read from the database, so it is always up to date. Hit-tests do
+    not wait for tiles being rendered, see :func:`render_tile`.
+
+    :param tree_id: id of entry in `tree` table
+    :param points: list of `(x, y)` points, in the unit square the tree is drawn in
+    :param zoom_level: if not `None`, only branches listed in the tiles of this zoom level are considered
+    :return: list of the same length as `points`, of dictionaries describing the branch at each point or `None` where
+        there is no branch; `None` if there is no such tree or zoom level
+    """
+    tree_id = int(tree_id)
+    if zoom_level is not None:
+        zoom_level = int(zoom_level)
+        if not 0 <= zoom_level <= Renderer().max_zoom_level:
+            return None
+
+    tree = _get_tree(tree_id)
+    if tree is None:
+        return None
+    loader, ren, _ = tree
+    # the spatial index is built along with the tree and only read afterwards, see `_get_tree()`
+    hits = [ren.branch_at(loader, x, y, zoom=zoom_level) for x, y in points]
+
+    indices = list({branch.index for branch in hits if branch is not None})
+    owners = dict()
+    if indices:
+        cur = get_db().cursor()
+        cur.execute('SELECT b.id, b.ind, bo.owner_id, bo.text, bo.price, bo.available_for_purchase, '
+                    'bo.available_for_bid FROM branches b LEFT JOIN branches_ownership bo ON b.id = bo.branch_id '
+                    'WHERE b.tree_id=? AND b.ind IN ({})'.format(', '.join('?' * len(indices))), [tree_id] + indices)
+        owners = {row['ind']: row for row in cur.fetchall()}
+
+    rv = []
+    for branch in hits:
+        if branch is None:
+            rv.append(None)
+            continue
+
+        dic = branch.json_obj()
+        owner = owners.get(branch.index, None)
+        dic['id'] = owner['id'] if owner else None
+        dic['text'] = owner['text'] if owner and owner['text'] else branch.text
+        dic['owner_id'] = owner['owner_id'] if owner else None
+        dic['price'] = owner['price'] if owner else None
+        dic['available_for_purchase'] = bool(owner['available_for_purchase']) if owner else False
+        dic['available_for_bid'] = bool(owner['available_for_bid']) if owner else False
+        rv.append(dic)
+    return rv
+
+
+def tile_strings(tree_id, zoom_level):
+    """
+    Returns the string table of zoom level `zoom_level` of the tree with tree-id `tree_id`, holding the texts of all the
+    branches visible at the zoom level, see :class:`StringTable`.
+
+    :param tree_id: id of entry in `tree` table
+    :param zoom_level: zoom level
+    :return: the string table as bytes, `None` if there is no such tree or zoom level
+    """
+    tree_id, zoom_level = int(tree_id), int(zoom_level)
+    if not 0 <= zoom_level <= Renderer().max_zoom_level:
+        return None
+
+    with __lock:
+        tree = _get_tree(tree_id)
+        if tree is None:
+            return None
+        return _get_strings(tree, zoom_level).to_bytes()
+
+
+def touch(tile_id):
+    """
+    Records the current time as the last time the tile with tile-id `tile_id` was accessed.
+    :param tile_id: id of entry in `tiles` table
+    """
+    db = get_db()
+    db.execute('UPDATE tiles SET last_access=? WHERE tile_id=?', [time.time(), tile_id])
+    db.commit()
+
+
+def record_request(tile):
+    """
+    Records that a client requested `tile`, an entry of `tiles` table, by updating its access time. Requested tiles are
+    rendered first the next time their zoom level is rendered, see :meth:`Renderer.tile_order`. The access time is
+    updated at most once every `REQUEST_INTERVAL` seconds per tile, so serving a tile rarely writes to the database.
+    :param tile: entry of `tiles` table, with at least `tile_id` and `last_access` columns
+    """
+    if time.time() - tile['last_access'] >= REQUEST_INTERVAL:
+        touch(tile['tile_id'])
+
+
+def evict(keep=None):
+    """
+    Deletes the files and `tiles` entries of the least recently accessed tiles at zoom levels of at least
+    `TILE_CACHE_MIN_ZOOM` until the total size of the files of those tiles is within `TILE_CACHE_BYTES` bytes. Tiles at
+    lower zoom levels and tiles packed into archives are never evicted. Files shared by deduplicated tiles count towards
+    the budget once, and are kept until the last tile referring to them is evicted. A budget of `None` disables
+    eviction.
+    :param keep: ids of tiles that must not be evicted, e.g. the tile just rendered, even if the budget is exceeded
+    :return: number of tiles evicted
+    """
+    budget = current_app.config.get('TILE_CACHE_BYTES', None)
+    min_zoom = current_app.config.get('TILE_CACHE_MIN_ZOOM', 0)
+    if budget is None:
+        return 0
+    keep = set(keep) if keep else set()
+
+    db = get_db()
+    cur = db.cursor()
+    # tiles saved as separate files, rather than packed into the archive of their zoom level
+    loose = '(zi.archive_file IS NULL OR tiles.img_file != zi.archive_file)'
+    # deduplicated tiles with the same contents share the same files, count those once
+    cur.execute('SELECT SUM(num_bytes) FROM (SELECT MAX(num_bytes) AS num_bytes FROM tiles INNER JOIN zoom_info zi '
+                'ON tiles.zoom_id = zi.zoom_id WHERE zoom_level>=? AND ' + loose + ' GROUP BY img_file)', [min_zoom])
+    total = cur.fetchone()[0] or 0
+    if total <= budget:
+        return 0
+
+    cur.execute('SELECT tile_id, img_file, json_file, num_bytes FROM tiles INNER JOIN zoom_info zi ON '
+                'tiles.zoom_id = zi.zoom_id WHERE zoom_level>=? AND ' + loose + ' ORDER BY last_access ASC',
+                [min_zoom])
+    evicted = 0
+    for tile in cur.fetchall():
+        if total <= budget:
+            break
+        if tile['tile_id'] in keep:
+            continue
+
+        db.execute('DELETE FROM tiles WHERE tile_id=?', [tile['tile_id']])
+        shared = False
+        for path in [tile['img_file'], tile['json_file']]:
+            if path == EMPTY_TILE:
+                continue
+            cur.execute('SELECT tile_id FROM tiles WHERE img_file=? OR json_file=? LIMIT 1', [path, path])
+            if cur.fetchone() is not None:
+                shared = True
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        # files still referred to by other tiles take up as much space as before
+        if not shared:
+            total -= tile['num_bytes']
+        evicted += 1
+
+    db.commit()
+    return evicted